@@ -0,0 +1,50 @@
+"""Cost of calling the Python builtins from python.2 mal code
+
+Times loops that call the arithmetic and comparison builtins with one, two
+and four arguments, and a recursive fib, which is mostly such calls. Four
+arguments are passed by nesting (+ (+ (+ a b) c) d), which works whether or
+not + is variadic.
+
+    python3 benchmarks/bench_builtin_calls.py [N]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stepA_mal  # noqa: E402
+
+SETUP = """
+(do
+  (def! loop (fn* [i n f] (if (< i n) (do (f i) (loop (+ i 1) n f)) nil)))
+  (def! fib (fn* [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))
+  nil)
+"""
+
+CASES = [
+    ("empty loop", "(loop 0 %d (fn* [i] i))"),
+    ("(count xs)", "(loop 0 %d (fn* [i] (count [i])))"),
+    ("(+ a b)", "(loop 0 %d (fn* [i] (+ i 1)))"),
+    ("(< a b)", "(loop 0 %d (fn* [i] (< i 1)))"),
+    ("nested +", "(loop 0 %d (fn* [i] (+ (+ (+ i 1) 2) 3)))"),
+    ("fib 20", "(fib 20)"),
+]
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    env = stepA_mal.init_repl_env()
+    stepA_mal.rep(SETUP, env)
+    for name, source in CASES:
+        form = source % n if "%d" in source else source
+        start = time.perf_counter()
+        stepA_mal.rep(form, env)
+        elapsed = time.perf_counter() - start
+        print("%-12s %8.1f ms" % (name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    main()
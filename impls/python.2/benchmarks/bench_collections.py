@@ -0,0 +1,52 @@
+"""Collection update costs in python.2
+
+Times mal loops that walk a list with rest, build one with cons, rotate one
+with concat, grow a vector with conj and grow a hash-map with assoc. Each of
+these copied the whole collection on every step before lists shared their
+tails and vectors and maps became persistent.
+
+    python3 benchmarks/bench_collections.py [N]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stepA_mal  # noqa: E402
+
+SETUP = """
+(do
+  (def! walk (fn* [xs acc] (if (empty? xs) acc (walk (rest xs) (+ acc (first xs))))))
+  (def! build (fn* [n acc] (if (= n 0) acc (build (- n 1) (cons n acc)))))
+  (def! rotate (fn* [n xs] (if (= n 0) xs (rotate (- n 1) (concat (rest xs) (list (first xs)))))))
+  (def! grow (fn* [n v] (if (= n 0) v (grow (- n 1) (conj v n)))))
+  (def! fill (fn* [n m] (if (= n 0) m (fill (- n 1) (assoc m (str n) n)))))
+  (def! numbers (build %d ())))
+"""
+
+CASES = [
+    ("rest walk", "(walk numbers 0)"),
+    ("cons build", "(count (build %d ()))"),
+    ("concat rotate", "(count (rotate %d numbers))"),
+    ("conj vector", "(count (grow %d []))"),
+    ("assoc map", '(get (fill %d {}) "1")'),
+]
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    env = stepA_mal.init_repl_env()
+    stepA_mal.rep(SETUP % n, env)
+    for name, source in CASES:
+        form = source % n if "%d" in source else source
+        start = time.perf_counter()
+        stepA_mal.rep(form, env)
+        elapsed = time.perf_counter() - start
+        print("%-14s n=%d: %8.1f ms" % (name, n, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    main()
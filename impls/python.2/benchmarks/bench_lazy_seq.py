@@ -0,0 +1,64 @@
+"""Lazy sequences in python.2
+
+Times taking the first element of a map over a long list, which maps every
+element, against the same map over the list wrapped in lazy-seq, which maps
+one. Then runs a map/take pipeline over (range) and reports its peak memory
+next to that of the same pipeline over a list built up front.
+
+    python3 benchmarks/bench_lazy_seq.py [N]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stepA_mal  # noqa: E402
+
+SETUP = """
+(do
+  (def! square (fn* [x] (* x x)))
+  (def! sum (fn* [xs acc] (if (empty? xs) acc (sum (rest xs) (+ acc (first xs))))))
+  (def! numbers (vec (range %d)))
+  nil)
+"""
+
+TIMED = [
+    ("first of map", "(first (map square numbers))"),
+    ("first of lazy map", "(first (map square (lazy-seq numbers)))"),
+]
+
+PIPELINES = [
+    ("eager pipeline", "(sum (take %d (map square (apply list (vec (range %d))))) 0)"),
+    ("lazy pipeline", "(sum (take %d (map square (range))) 0)"),
+]
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    env = stepA_mal.init_repl_env()
+    stepA_mal.rep(SETUP % n, env)
+    for name, source in TIMED:
+        start = time.perf_counter()
+        stepA_mal.rep(source, env)
+        elapsed = time.perf_counter() - start
+        print("%-18s n=%d: %8.2f ms" % (name, n, elapsed * 1000))
+    for name, source in PIPELINES:
+        form = source % ((n, n) if source.count("%d") == 2 else n)
+        tracemalloc.start()
+        start = time.perf_counter()
+        stepA_mal.rep(form, env)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            "%-18s n=%d: %8.2f ms, peak %6.1f MB"
+            % (name, n, elapsed * 1000, peak / 1e6)
+        )
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    main()
@@ -0,0 +1,67 @@
+"""load-file memory and latency in python.2
+
+Loads a generated file of many top-level definitions twice: as load-file did
+before, by reading the whole file as one (do ...) form and evaluating it, and
+with the streaming load-file, which evaluates each form as it is read.
+Reports the peak memory of each and how long it took for the first form to
+be evaluated.
+
+    python3 benchmarks/bench_load_file.py [FORMS]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reader  # noqa: E402
+import stepA_mal  # noqa: E402
+from mal_types import MalFunctionCompiled, NIL  # noqa: E402
+
+FORM = '(def! f%d (fn* [x] (if (> x 0) (+ x %d) {"name" "f%d" "body" [x x x]})))\n'
+
+
+def measure(name: str, load) -> None:
+    env = stepA_mal.init_repl_env()
+    first = []
+    env.set(
+        "mark",
+        MalFunctionCompiled(lambda args: first.append(time.perf_counter()) or NIL),
+    )
+    tracemalloc.start()
+    start = time.perf_counter()
+    load(env)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        "%-10s first form %8.1f ms, total %8.1f ms, peak %6.1f MB"
+        % (name, (first[0] - start) * 1000, elapsed * 1000, peak / 1e6)
+    )
+
+
+def main() -> None:
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.NamedTemporaryFile("w", suffix=".mal") as the_file:
+        the_file.write("(mark)\n")
+        for i in range(forms):
+            the_file.write(FORM % (i, i, i))
+        the_file.flush()
+
+        def whole(env):
+            with open(the_file.name, "r") as source:
+                text = source.read()
+            stepA_mal.EVAL(reader.read("(do " + text + "\nnil)"), env)
+
+        def streaming(env):
+            stepA_mal.rep('(load-file "%s")' % the_file.name, env)
+
+        measure("whole", whole)
+        measure("streaming", streaming)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Cost of the macro-call check in python.2
+
+step8 and step9 ask whether every form they evaluate is a macro call.
+is_macro_call used to find out by trying: it raised and caught an exception
+for every symbol, number and special form, and for every list whose head was
+not bound. This times that version, kept below, against macro_for, which
+macroexpand now uses, for each kind of form, and then times a whole step9
+evaluation of fib.
+
+    python3 benchmarks/bench_macro_call.py [N]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import step9_try  # noqa: E402
+from env import Env  # noqa: E402
+from mal_types import (  # noqa: E402
+    MalExpression,
+    MalFunctionCompiled,
+    MalFunctionRaw,
+    MalUnknownSymbolException,
+)
+
+FORMS = [
+    ("symbol", "fib"),
+    ("number", "1"),
+    ("special form", "(if true 1 2)"),
+    ("function call", "(fib 1)"),
+    ("macro call", "(cond true 1)"),
+]
+
+FIB = "(def! fib (fn* [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))"
+
+
+def is_macro_call_with_exceptions(ast: MalExpression, env: Env) -> bool:
+    try:
+        x = env.get(ast.native()[0].native())
+        try:
+            assert isinstance(x, MalFunctionRaw) or isinstance(x, MalFunctionCompiled)
+        except AssertionError:
+            return False
+        return x.is_macro()  # type: ignore
+    except TypeError:
+        return False
+    except MalUnknownSymbolException:
+        return False
+    except AttributeError:
+        return False
+    except IndexError:
+        return False
+
+
+def per_call(check, ast: MalExpression, env: Env, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        check(ast, env)
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    env = step9_try.init_repl_env()
+    step9_try.rep(FIB, env)
+    print("%-14s %12s %12s" % ("form", "exceptions", "lookup"))
+    for name, source in FORMS:
+        ast = step9_try.READ(source)
+        before = per_call(is_macro_call_with_exceptions, ast, env, n)
+        after = per_call(step9_try.macro_for, ast, env, n)
+        print("%-14s %9.0f ns %9.0f ns" % (name, before, after))
+
+    start = time.perf_counter()
+    step9_try.rep("(fib 15)", env)
+    print("step9 (fib 15): %.0f ms" % ((time.perf_counter() - start) * 1000))
+
+
+if __name__ == "__main__":
+    main()
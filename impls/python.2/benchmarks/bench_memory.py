@@ -0,0 +1,68 @@
+"""Memory footprint of python.2 Mal values
+
+Reads a mal data file and reports how much memory the values read from it
+hold, per node. Without an argument, a generated file of nested vectors,
+maps, strings, keywords and integers is used.
+
+    python3 benchmarks/bench_memory.py [FILE]
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reader  # noqa: E402
+from mal_types import MalExpression, MalHash_map, MalList, MalVector  # noqa: E402
+
+
+def generate(records: int) -> str:
+    lines = []
+    for i in range(records):
+        lines.append(
+            '{"id" %d "name" "record-%d" "tags" [:a :b %d] "data" (%d %d (%d))}'
+            % (i, i, i % 7, i, i * 3, i * 1000)
+        )
+    return "[" + "\n".join(lines) + "]"
+
+
+def count_nodes(ast: MalExpression) -> int:
+    count = 1
+    if isinstance(ast, MalList) or isinstance(ast, MalVector):
+        for x in ast.native():
+            count += count_nodes(x)
+    elif isinstance(ast, MalHash_map):
+        for k, v in ast.native().items():
+            count += count_nodes(k) + count_nodes(v)
+    return count
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r") as the_file:
+            text = "[" + the_file.read() + "\n]"
+    else:
+        with tempfile.TemporaryFile("w+") as the_file:
+            the_file.write(generate(2000))
+            the_file.seek(0)
+            text = the_file.read()
+
+    gc.collect()
+    tracemalloc.start()
+    ast = reader.read(text)
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = count_nodes(ast)
+    print("nodes:          %d" % nodes)
+    print("bytes held:     %d" % size)
+    print("bytes per node: %.1f" % (size / nodes))
+    print("peak bytes:     %d" % peak)
+
+
+if __name__ == "__main__":
+    main()
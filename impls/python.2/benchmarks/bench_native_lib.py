@@ -0,0 +1,58 @@
+"""Speed of the impls/lib helpers in python.2, as mal and as Python
+
+Loads the library files once with their mal definitions and once with the
+native ones of native_lib, and times folds, a memoized function and gensym.
+
+    python3 benchmarks/bench_native_lib.py [N]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import native_lib  # noqa: E402
+import stepA_mal  # noqa: E402
+
+LIB_FILES = ["trivial.mal", "reducers.mal", "memoize.mal"]
+
+SETUP = """
+(do
+  (def! build (fn* [n acc] (if (= n 0) acc (build (- n 1) (cons n acc)))))
+  (def! numbers (build %d ()))
+  (def! square (memoize (fn* [x] (* x x)))))
+"""
+
+CASES = [
+    ("reduce +", "(reduce + 0 numbers)"),
+    ("reduce fn*", "(reduce (fn* [acc x] (+ acc (inc x))) 0 numbers)"),
+    ("foldr cons", "(count (foldr cons () numbers))"),
+    ("memoized calls", "(reduce (fn* [acc x] (square 7)) 0 numbers)"),
+    ("gensym", "(count (map (fn* [x] (gensym)) numbers))"),
+]
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    sys.setrecursionlimit(10000)
+    envs = []
+    for native in (False, True):
+        env = stepA_mal.init_repl_env(native_lib_enabled=native)
+        for name in LIB_FILES:
+            path = os.path.join(native_lib.LIB_DIR, name)
+            stepA_mal.rep('(load-file "%s")' % path, env)
+        stepA_mal.rep(SETUP % n, env)
+        envs.append(env)
+    print("%-16s %10s %10s" % ("n = %d" % n, "mal", "native"))
+    for name, source in CASES:
+        times = []
+        for env in envs:
+            start = time.perf_counter()
+            stepA_mal.rep(source, env)
+            times.append((time.perf_counter() - start) * 1000)
+        print("%-16s %7.1f ms %7.1f ms" % (name, times[0], times[1]))
+
+
+if __name__ == "__main__":
+    main()
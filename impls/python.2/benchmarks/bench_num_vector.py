@@ -0,0 +1,67 @@
+"""Numeric vectors against vectors of MalInts in python.2
+
+Computes the sum of squares and a scaled difference of two N-element series,
+once with map and reduce over vectors and once with the bulk arithmetic of
+numeric vectors, and reports the time of each and the memory the two series
+take in either form.
+
+    python3 benchmarks/bench_num_vector.py [N]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import native_lib  # noqa: E402
+import stepA_mal  # noqa: E402
+
+SETUP = """
+(do
+  (load-file "%s")
+  (def! sq (fn* [x] (* x x)))
+  (def! diff (fn* [a b] (map (fn* [i] (* 3 (- (nth a i) (nth b i)))) (range (count a)))))
+  nil)
+"""
+
+SERIES = [
+    ("vectors", "(do (def! xs (vec (range %d))) (def! ys (vec (range 1 %d))) nil)"),
+    (
+        "num-vectors",
+        "(do (def! nxs (num-vector (range %d))) (def! nys (num-vector (range 1 %d))) nil)",
+    ),
+]
+
+CASES = [
+    ("sum of squares", "(reduce + 0 (map sq xs))", "(dot nxs nxs)"),
+    ("scaled diff", "(count (vec (diff xs ys)))", "(count (* 3 (- nxs nys)))"),
+]
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    env = stepA_mal.init_repl_env()
+    stepA_mal.rep(SETUP % os.path.join(native_lib.LIB_DIR, "reducers.mal"), env)
+    for name, source in SERIES:
+        tracemalloc.start()
+        stepA_mal.rep(source % (n, n + 1), env)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("%-12s n=%d: %6.1f bytes per element" % (name, n, size / (2 * n)))
+    print("%-16s %12s %12s" % ("", "vectors", "num-vectors"))
+    for name, boxed, unboxed in CASES:
+        times = []
+        results = set()
+        for source in (boxed, unboxed):
+            start = time.perf_counter()
+            results.add(stepA_mal.rep(source, env))
+            times.append((time.perf_counter() - start) * 1000)
+        assert len(results) == 1, results
+        print("%-16s %9.1f ms %9.1f ms" % (name, times[0], times[1]))
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    main()
@@ -0,0 +1,59 @@
+"""Reader speed in python.2
+
+Reads every .mal file under impls/mal and impls/lib, as
+load-file does, with the hand-written reader and with the Arpeggio reader it
+replaced, checks that both produce the same forms, and reports the time each
+took. Then times many short reads, as a REPL or read-string does.
+
+    python3 benchmarks/bench_reader.py
+"""
+
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reader  # noqa: E402
+import arpeggio_reader  # noqa: E402
+
+IMPLS = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LINES = ["(+ 1 2)", "(def! x [1 2 {:a 3}])", '(str "a" "b")', "(fn* (a) (* a a))"]
+
+
+def timed(read, texts):
+    start = time.perf_counter()
+    forms = [read(text) for text in texts]
+    return time.perf_counter() - start, forms
+
+
+def main() -> None:
+    paths = []
+    for directory in ("mal", "lib"):
+        paths += sorted(glob.glob(os.path.join(IMPLS, directory, "*.mal")))
+    texts = []
+    for path in paths:
+        with open(path, "r") as the_file:
+            texts.append("(do " + the_file.read() + "\nnil)")
+    size = sum(len(text) for text in texts)
+
+    new_time, new_forms = timed(reader.read, texts)
+    old_time, old_forms = timed(arpeggio_reader.read, texts)
+    for path, new, old in zip(paths, new_forms, old_forms):
+        assert new.readable_str() == old.readable_str(), path
+    print("%d files, %d characters" % (len(paths), size))
+    print("  arpeggio:     %8.1f ms" % (old_time * 1000))
+    print("  hand-written: %8.1f ms" % (new_time * 1000))
+
+    lines = LINES * 500
+    new_time, _ = timed(reader.read, lines)
+    old_time, _ = timed(arpeggio_reader.read, lines)
+    print("%d short forms" % len(lines))
+    print("  arpeggio:     %8.1f ms" % (old_time * 1000))
+    print("  hand-written: %8.1f ms" % (new_time * 1000))
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    main()
@@ -0,0 +1,81 @@
+"""Chained sequence functions against a transducer pipeline in python.2
+
+Sums the small squares of N numbers twice: with reduce over filter over map,
+which builds a list at each stage, and with transduce over (comp (map f)
+(filter p)), which runs both stages in one loop. For each it reports the
+time, how many elements were stored per input element in the Mal lists and
+vectors it made (counted with a profile hook in a separate run), and its
+peak memory per element.
+
+    python3 benchmarks/bench_transduce.py [N]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import native_lib  # noqa: E402
+import stepA_mal  # noqa: E402
+from mal_types import MalList, MalVector  # noqa: E402
+
+SETUP = """
+(do
+  (load-file "%s")
+  (def! sq (fn* [x] (* x x)))
+  (def! small? (fn* [x] (< x 1000000)))
+  (def! numbers (vec (range %d)))
+  nil)
+"""
+
+CASES = [
+    ("chained", "(reduce + 0 (filter small? (map sq numbers)))"),
+    ("transduce", "(transduce (comp (map sq) (filter small?)) + 0 numbers)"),
+]
+
+CONSTRUCTORS = {MalList.__init__.__code__, MalVector.__init__.__code__}
+
+
+def count_stored(source: str, env) -> int:
+    stored = 0
+
+    def hook(frame, event, arg) -> None:
+        nonlocal stored
+        if event == "call" and frame.f_code in CONSTRUCTORS:
+            stored += len(frame.f_locals["values"])
+
+    sys.setprofile(hook)
+    try:
+        stepA_mal.rep(source, env)
+    finally:
+        sys.setprofile(None)
+    return stored
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    env = stepA_mal.init_repl_env()
+    stepA_mal.rep(SETUP % (os.path.join(native_lib.LIB_DIR, "reducers.mal"), n), env)
+    results = set()
+    print("%-10s %10s %16s %14s" % ("n = %d" % n, "time", "stored/elt", "peak B/elt"))
+    for name, source in CASES:
+        start = time.perf_counter()
+        results.add(stepA_mal.rep(source, env))
+        elapsed = time.perf_counter() - start
+        stored = count_stored(source, env)
+        tracemalloc.start()
+        stepA_mal.rep(source, env)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            "%-10s %7.1f ms %16.2f %14.1f"
+            % (name, elapsed * 1000, stored / n, peak / n)
+        )
+    assert len(results) == 1, results
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    main()
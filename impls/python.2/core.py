@@ -1,8 +1,15 @@
+import functools
+import itertools
+import operator
 import time
-from typing import List, Union, Dict
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import reader
 from mal_types import (
+    NIL,
+    TRUE,
+    FALSE,
     MalInt,
     MalNil,
     MalList,
@@ -12,7 +19,11 @@ from mal_types import (
     MalAtom,
     MalFunctionRaw,
     MalHash_map,
+    MalLazySeq,
+    MalNumVector,
+    MalTransducer,
     MalVector,
+    Step,
 )
 from mal_types import (
     MalInvalidArgumentException,
@@ -27,7 +38,7 @@ from mal_types import (
 def prn(args: List[MalExpression]) -> MalNil:
     result_string = " ".join(map(lambda x: x.readable_str(), args))
     print(result_string)
-    return MalNil()
+    return NIL
 
 
 def pr_str(args: List[MalExpression]) -> MalString:
@@ -38,60 +49,87 @@ def pr_str(args: List[MalExpression]) -> MalString:
 def println(args: List[MalExpression]) -> MalNil:
     result_string = " ".join(map(lambda x: x.unreadable_str(), args))
     print(result_string)
-    return MalNil()
+    return NIL
 
 
 def list_q(x: MalExpression) -> MalBoolean:
     if isinstance(x, MalList):
-        return MalBoolean(True)
-    return MalBoolean(False)
+        return TRUE
+    return FALSE
 
 
 def empty_q(x: MalExpression) -> MalBoolean:
-    if sequential_q(x):
-        return MalBoolean(len(x.native()) == 0)
+    if sequential_q(x) is TRUE:
+        return TRUE if x.is_empty() else FALSE
     raise MalInvalidArgumentException(x, "not a list")
 
 
 def count(x: MalExpression) -> MalInt:
-    if isinstance(x, MalList) or isinstance(x, MalVector):
-        return MalInt(len(x.native()))
-    elif isinstance(x, MalNil):
+    if sequential_q(x) is TRUE or isinstance(x, MalNumVector):
+        return MalInt(x.count())
+    elif x is NIL:
         return MalInt(0)
     raise MalInvalidArgumentException(x, "not a list")
 
 
 def equal(a: MalExpression, b: MalExpression) -> MalBoolean:
-    if (isinstance(a, MalList) or isinstance(a, MalVector)) and (
-        isinstance(b, MalList) or isinstance(b, MalVector)
-    ):
-        a_native = a.native()
-        b_native = b.native()
-        if len(a_native) != len(b_native):
-            return MalBoolean(False)
-        for x in range(0, len(a_native)):
-            if not equal(a_native[x], b_native[x]):
-                return MalBoolean(False)
-        return MalBoolean(True)
-    if type(a) == type(b) and a.native() == b.native():
-        return MalBoolean(True)
-    return MalBoolean(False)
+    # strings, numbers and collections compare by value (see their __eq__)
+    if a == b or (type(a) == type(b) and a.native() == b.native()):
+        return TRUE
+    return FALSE
+
+
+def _not_ints(a: MalExpression, b: MalExpression) -> MalException:
+    return MalInvalidArgumentException(b if type(a) is MalInt else a, "not an int")
 
 
 def less(a: MalExpression, b: MalExpression) -> MalBoolean:
-    if not isinstance(a, MalInt):
-        raise MalInvalidArgumentException(a, "not an int")
-    if not isinstance(b, MalInt):
-        raise MalInvalidArgumentException(b, "not an int")
-    return MalBoolean(a.native() < b.native())
+    if type(a) is MalInt and type(b) is MalInt:
+        return TRUE if a.native() < b.native() else FALSE
+    raise _not_ints(a, b)
 
 
 def less_equal(a: MalExpression, b: MalExpression) -> MalBoolean:
-    if not isinstance(a, MalInt):
-        raise MalInvalidArgumentException(a, "not an int")
-    if not isinstance(b, MalInt):
-        raise MalInvalidArgumentException(b, "not an int")
-    return MalBoolean(a.native() <= b.native())
+    if type(a) is MalInt and type(b) is MalInt:
+        return TRUE if a.native() <= b.native() else FALSE
+    raise _not_ints(a, b)
+
+
+def greater(a: MalExpression, b: MalExpression) -> MalBoolean:
+    if type(a) is MalInt and type(b) is MalInt:
+        return TRUE if a.native() > b.native() else FALSE
+    raise _not_ints(a, b)
+
+
+def greater_equal(a: MalExpression, b: MalExpression) -> MalBoolean:
+    if type(a) is MalInt and type(b) is MalInt:
+        return TRUE if a.native() >= b.native() else FALSE
+    raise _not_ints(a, b)
+
+
+def comparison(
+    test: Callable[[MalExpression, MalExpression], MalBoolean],
+    ints: bool = True,
+) -> MalFunctionCompiled:
+    """Make (op x y z ...) true when (test x y), (test y z) ... all are. A
+    single argument is true, if it is an int when `ints` is set."""
+
+    def single(a: MalExpression) -> MalExpression:
+        if ints and type(a) is not MalInt:
+            raise MalInvalidArgumentException(a, "not an int")
+        return TRUE
+
+    def compare(args: List[MalExpression]) -> MalExpression:
+        if len(args) == 0:
+            raise MalInvalidArgumentException(NIL, "no arguments")
+        if len(args) == 1:
+            return single(args[0])
+        for i in range(len(args) - 1):
+            if test(args[i], args[i + 1]) is FALSE:
+                return FALSE
+        return TRUE
+
+    return MalFunctionCompiled(compare, call1=single, call2=test)
 
 
 def read_string(a: MalExpression) -> MalExpression:
@@ -127,39 +165,49 @@ def reset(atom: MalExpression, val: MalExpression) -> MalExpression:
 
 
 def vec(arg: MalExpression) -> MalExpression:
-    assert isinstance(arg, MalList) or isinstance(arg, MalVector)
+    if isinstance(arg, MalNumVector):
+        return MalVector([MalInt(x) for x in arg.native()])
+    assert sequential_q(arg) is TRUE
     return MalVector(arg.native ())
 
 
 def cons(first: MalExpression, rest: MalExpression) -> MalExpression:
-    assert isinstance(rest, MalList) or isinstance(rest, MalVector)
-    return MalList([first] + rest.native())
+    if isinstance(rest, MalVector):
+        return MalList(rest.native()).cons(first)
+    if rest is NIL:
+        return MalList([first])
+    assert isinstance(rest, MalList) or isinstance(rest, MalLazySeq)
+    return rest.cons(first)
 
 
 def concat(args: List[MalExpression]) -> MalExpression:
-    result_list: List[MalExpression] = []
-    for x in args:
-        assert isinstance(x, MalList) or isinstance(x, MalVector)
-        result_list = result_list + x.native()
-    return MalList(result_list)
+    return MalList.concat(args)
+
+
+def conj(args: List[MalExpression]) -> MalExpression:
+    coll = args[0]
+    if isinstance(coll, MalVector):
+        for x in args[1:]:
+            coll = coll.conj(x)
+        return coll
+    if not (isinstance(coll, MalList) or isinstance(coll, MalLazySeq)):
+        raise MalInvalidArgumentException(coll, "not a list or vector")
+    for x in args[1:]:
+        coll = coll.cons(x)
+    return coll
 
 
 def not_(expr: MalExpression) -> MalExpression:
-    if isinstance(expr, MalNil) or (
-        isinstance(expr, MalBoolean) and expr.native() is False
-    ):
-        return MalBoolean(True)
+    if expr is NIL or expr is FALSE:
+        return TRUE
     else:
-        return MalBoolean(False)
+        return FALSE
 
 
 def nth(list_: MalExpression, index: MalExpression) -> MalExpression:
-    assert isinstance(list_, MalList) or isinstance(list_, MalVector)
+    assert sequential_q(list_) is TRUE or isinstance(list_, MalNumVector)
     assert isinstance(index, MalInt)
-    list_native = list_.native()
-    if index.native() > len(list_native) - 1:
-        raise MalIndexError(index.native())
-    return list_native[index.native()]
+    return list_.nth(index.native())
 
 
 def apply(args: List[MalExpression]) -> MalExpression:
@@ -169,19 +217,85 @@ def apply(args: List[MalExpression]) -> MalExpression:
     for i in range(1, len(args) - 1):
         rest_args.append(args[i])
     last_arg = args[len(args) - 1]
-    assert isinstance(last_arg, MalList) or isinstance(last_arg, MalVector)
+    assert sequential_q(last_arg) is TRUE
     rest_args = rest_args + last_arg.native()
     return func.call(rest_args)
 
 
 def map_(func: MalExpression, map_list: MalExpression) -> MalExpression:
     assert isinstance(func, MalFunctionCompiled) or isinstance(func, MalFunctionRaw)
+    if isinstance(map_list, MalLazySeq):
+        # Lazy in, lazy out: f runs as the result is walked. Lists and vectors
+        # are still mapped at once, as programs rely on its side effects.
+        return MalLazySeq.from_iterator(func.call1(elem) for elem in map_list)
     assert isinstance(map_list, MalList) or isinstance(map_list, MalVector)
-    result_list: List[MalExpression] = []
-    for i in range(len(map_list.native())):
-        elem = map_list.native()[i]
-        result_list.append(func.call([elem]))
-    return MalList(result_list)
+    call = func.call1
+    return MalList([call(elem) for elem in map_list])
+
+
+def filter_(pred: MalExpression, coll: MalExpression) -> MalExpression:
+    assert isinstance(pred, MalFunctionCompiled) or isinstance(pred, MalFunctionRaw)
+
+    def keep(x: MalExpression) -> bool:
+        result = pred.call1(x)
+        return result is not NIL and result is not FALSE
+
+    if isinstance(coll, MalLazySeq):
+        return MalLazySeq.from_iterator(x for x in coll if keep(x))
+    assert isinstance(coll, MalList) or isinstance(coll, MalVector)
+    return MalList([x for x in coll if keep(x)])
+
+
+def seq(arg: MalExpression) -> MalExpression:
+    if arg is NIL:
+        return NIL
+    if isinstance(arg, MalString) and not arg.is_keyword():
+        if arg.native() == "":
+            return NIL
+        return MalList([MalString(c) for c in arg.native()])
+    if sequential_q(arg) is not TRUE:
+        raise MalInvalidArgumentException(arg, "not a sequence")
+    if arg.is_empty():
+        return NIL
+    return MalList(arg.native()) if isinstance(arg, MalVector) else arg
+
+
+def take(n: MalExpression, coll: MalExpression) -> MalExpression:
+    assert isinstance(n, MalInt)
+    count = max(n.native(), 0)
+    if isinstance(coll, MalLazySeq):
+        return MalLazySeq.from_iterator(itertools.islice(coll, count))
+    if coll is NIL:
+        return MalList([])
+    assert isinstance(coll, MalList) or isinstance(coll, MalVector)
+    return MalList(list(itertools.islice(coll, count)))
+
+
+def drop(n: MalExpression, coll: MalExpression) -> MalExpression:
+    assert isinstance(n, MalInt)
+    if coll is NIL:
+        return MalList([])
+    assert sequential_q(coll) is TRUE
+    return coll.drop(n.native())
+
+
+def range_(args: List[MalExpression]) -> MalExpression:
+    """(range), (range end), (range start end) or (range start end step)"""
+    for arg in args:
+        if not isinstance(arg, MalInt):
+            raise MalInvalidArgumentException(arg, "not an int")
+    bounds = [arg.native() for arg in args]
+    if len(bounds) == 0:
+        values: Any = itertools.count()
+    elif len(bounds) > 3:
+        raise MalInvalidArgumentException(args[3], "too many arguments")
+    else:
+        if len(bounds) == 1:
+            bounds.insert(0, 0)
+        if len(bounds) == 3 and bounds[2] == 0:
+            raise MalInvalidArgumentException(args[2], "step is zero")
+        values = range(*bounds)
+    return MalLazySeq.from_iterator(MalInt(i) for i in values)
 
 
 def throw(exception: MalExpression) -> MalExpression:
@@ -189,15 +303,15 @@ def throw(exception: MalExpression) -> MalExpression:
 
 
 def nil_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalNil))
+    return TRUE if arg is NIL else FALSE
 
 
 def true_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalBoolean) and arg.native())
+    return TRUE if arg is TRUE else FALSE
 
 
 def false_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalBoolean) and not arg.native())
+    return TRUE if arg is FALSE else FALSE
 
 
 def symbol_q(arg: MalExpression) -> MalExpression:
@@ -226,7 +340,7 @@ def readline(arg: MalExpression) -> Union[MalString, MalNil]:
         assert isinstance(arg, MalString)
         line = input(arg.native())
     except EOFError:
-        return MalNil()
+        return NIL
     return MalString(line)
 
 
@@ -235,34 +349,27 @@ def not_implemented(func: str) -> MalExpression:
 
 
 def get(map: MalExpression, key: MalExpression) -> MalExpression:
-    if isinstance(map, MalNil):
-        return MalNil()
+    if map is NIL:
+        return NIL
     if not isinstance(map, MalHash_map):
         raise MalInvalidArgumentException(map, "not a hash map")
-    if key.native() in map.native():
-        return map.native()[key.native()]
-    else:
-        return MalNil()
+    return map.native().get(key, NIL)
 
 
 def first(args: List[MalExpression]) -> MalExpression:
-    try:
-        if isinstance(args[0], MalNil):
-            return MalNil()
-        return args[0].native()[0]
-    except IndexError:
-        return MalNil()
-    except TypeError:
-        raise MalInvalidArgumentException(args[0], "not a list")
+    if args[0] is NIL:
+        return NIL
+    if sequential_q(args[0]) is TRUE:
+        return args[0].first()
+    raise MalInvalidArgumentException(args[0], "not a list")
 
 
 def rest(args: List[MalExpression]) -> MalExpression:
-    try:
-        if isinstance(args[0], MalNil):
-            return MalList([])
-        return MalList(args[0].native()[1:])
-    except TypeError:
-        raise MalInvalidArgumentException(args[0], "not a list or vector")
+    if args[0] is NIL:
+        return MalList([])
+    if sequential_q(args[0]) is TRUE:
+        return args[0].rest()
+    raise MalInvalidArgumentException(args[0], "not a list or vector")
 
 
 def vector_q(arg: MalExpression) -> MalExpression:
@@ -274,7 +381,11 @@ def map_q(arg: MalExpression) -> MalExpression:
 
 
 def sequential_q(arg: MalExpression) -> MalExpression:
-    return MalBoolean(isinstance(arg, MalList) or isinstance(arg, MalVector))
+    return MalBoolean(
+        isinstance(arg, MalList)
+        or isinstance(arg, MalVector)
+        or isinstance(arg, MalLazySeq)
+    )
 
 
 def vector(args: List[MalExpression]) -> MalExpression:
@@ -283,72 +394,62 @@ def vector(args: List[MalExpression]) -> MalExpression:
 
 def hash_map(args: List[MalExpression]) -> MalExpression:
     assert len(args) % 2 == 0
-    map_ = {}  # type: Dict[str, MalExpression]
+    map_ = {}  # type: Dict[MalExpression, MalExpression]
     for i in range(0, len(args) - 1, 2):
-        assert isinstance(args[i], MalString)
-        map_[args[i].native()] = args[i + 1]
+        map_[args[i]] = args[i + 1]
     return MalHash_map(map_)
 
 
 def assoc(args: List[MalExpression]) -> MalExpression:
     if len(args) == 0:
-        raise MalInvalidArgumentException(MalNil(), "no arguments supplied to assoc")
+        raise MalInvalidArgumentException(NIL, "no arguments supplied to assoc")
     elif len(args) == 1:
         return args[0]
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash map")
-    dict_a_copy: Dict[str, MalExpression] = args[0].native().copy()
-    dict_b: Dict[str, MalExpression] = hash_map(args[1:]).native()
-    for key in dict_b:
-        dict_a_copy[key] = dict_b[key]
-    return MalHash_map(dict_a_copy)
+    assert len(args) % 2 == 1
+    items = []
+    for i in range(1, len(args) - 1, 2):
+        items.append((args[i], args[i + 1]))
+    return args[0].assoc(items)
 
 
 def contains_q(args: List[MalExpression]) -> MalExpression:
     if len(args) < 2:
-        raise MalInvalidArgumentException(MalNil(), "contains? requires two arguments")
+        raise MalInvalidArgumentException(NIL, "contains? requires two arguments")
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash-map")
-    if not isinstance(args[1], MalString):
-        return MalBoolean(False)
-    return MalBoolean(args[1].native() in args[0].native())
+    return MalBoolean(args[1] in args[0].native())
 
 
 def keys(args: List[MalExpression]) -> MalExpression:
     if len(args) != 1:
         raise MalInvalidArgumentException(
-            MalNil(), "keys requires exactly one argument"
+            NIL, "keys requires exactly one argument"
         )
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash map")
-    return MalList([MalString(x, is_already_encoded=True) for x in args[0].native()])
+    return MalList(list(args[0].native()))
 
 
 def vals(args: List[MalExpression]) -> MalExpression:
     if len(args) != 1:
         raise MalInvalidArgumentException(
-            MalNil(), "vals requires exactly one argument"
+            NIL, "vals requires exactly one argument"
         )
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash map")
-    return MalList([args[0].native()[x] for x in args[0].native()])
+    return MalList(list(args[0].native().values()))
 
 
 def dissoc(args: List[MalExpression]) -> MalExpression:
     if len(args) == 0:
-        raise MalInvalidArgumentException(MalNil(), "no arguments supplied to dissoc")
+        raise MalInvalidArgumentException(NIL, "no arguments supplied to dissoc")
     elif len(args) == 1:
         return args[0]
     if not isinstance(args[0], MalHash_map):
         raise MalInvalidArgumentException(args[0], "not a hash map")
-    dict_a_copy: Dict[str, MalExpression] = args[0].native().copy()
-    list_b: List[MalExpression] = MalList(args[1:]).native()
-    for key in list_b:
-        try:
-            del dict_a_copy[key.unreadable_str()]
-        except KeyError:
-            pass
-    return MalHash_map(dict_a_copy)
+    return args[0].dissoc(args[1:])
 
 
 def swap(args: List[MalExpression]) -> MalExpression:
@@ -360,13 +461,424 @@ def swap(args: List[MalExpression]) -> MalExpression:
     return atom.native()
 
 
+class MalMemoized(MalFunctionCompiled):
+    """A function that keeps the results of the function it wraps, keyed by
+    its arguments, which hash and compare by value. With max_size, the least recently used result
+    is dropped to make room; with ttl_ms, results older than that are dropped
+    when they are next looked up, or when a result is stored and they are the
+    least recently used."""
+
+    __slots__ = (
+        "_f",
+        "_cache",
+        "_max_size",
+        "_ttl",
+        "hits",
+        "misses",
+        "evictions",
+    )
+
+    def __init__(
+        self, f: MalExpression, max_size: Optional[int], ttl_ms: Optional[int]
+    ) -> None:
+        super().__init__(self._call)
+        self._f = f
+        # key -> (result, time it expires)
+        self._cache: "OrderedDict[Any, Tuple[MalExpression, float]]" = OrderedDict()
+        self._max_size = max_size
+        self._ttl = None if ttl_ms is None else ttl_ms / 1000
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _call(self, args: List[MalExpression]) -> MalExpression:
+        key = tuple(args)
+        cached = self._cache.get(key)
+        if cached is not None:
+            if self._ttl is None or cached[1] > time.monotonic():
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return cached[0]
+            del self._cache[key]
+            self.evictions += 1
+        self.misses += 1
+        result = self._f.call(args)  # type: ignore
+        expires = 0.0 if self._ttl is None else time.monotonic() + self._ttl
+        self._cache[key] = (result, expires)
+        if self._max_size is not None and len(self._cache) > self._max_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        if self._ttl is not None:
+            self._drop_expired()
+        return result
+
+    def _drop_expired(self) -> None:
+        """Drop the expired results at the least recently used end. They all
+        live equally long, so the oldest expire first and the walk stops at
+        the first one still live; one that was used again since it was
+        stored is dropped once it reaches that end."""
+        now = time.monotonic()
+        while self._cache:
+            _, expires = next(iter(self._cache.values()))
+            if expires > now:
+                break
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> MalHash_map:
+        counts = [
+            ("hits", self.hits),
+            ("misses", self.misses),
+            ("evictions", self.evictions),
+            ("size", len(self._cache)),
+        ]
+        return MalHash_map({MalString(k, keyword=True): MalInt(v) for k, v in counts})
+
+
+def memoize(args: List[MalExpression]) -> MalExpression:
+    """(memoize f & {:max-size n :ttl-ms n})"""
+    if len(args) % 2 != 1:
+        raise MalInvalidArgumentException(MalList(args), "expected f and options")
+    f = args[0]
+    if not (isinstance(f, MalFunctionCompiled) or isinstance(f, MalFunctionRaw)):
+        raise MalInvalidArgumentException(f, "not a function")
+    options: Dict[str, Optional[int]] = {"max-size": None, "ttl-ms": None}
+    for i in range(1, len(args), 2):
+        option, value = args[i], args[i + 1]
+        if not (isinstance(option, MalString) and option.is_keyword()):
+            raise MalInvalidArgumentException(option, "not a keyword")
+        name = option.native()[1:]
+        if name not in options:
+            raise MalInvalidArgumentException(option, "unknown memoize option")
+        if not isinstance(value, MalInt) or value.native() <= 0:
+            raise MalInvalidArgumentException(value, "not a positive int")
+        options[name] = value.native()
+    return MalMemoized(f, options["max-size"], options["ttl-ms"])
+
+
+def memoize_stats(arg: MalExpression) -> MalExpression:
+    if not isinstance(arg, MalMemoized):
+        raise MalInvalidArgumentException(arg, "not a memoized function")
+    return arg.stats()
+
+
+# Transducers
+
+
+class Reduced(object):
+    """Returned by a step to end the reduction early with `value`."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+
+def reduce_with(step: Step, acc: Any, coll: MalExpression) -> Any:
+    """Run step over the elements of coll, without copying it."""
+    if coll is NIL:
+        return acc
+    if sequential_q(coll) is not TRUE:
+        raise MalInvalidArgumentException(coll, "not a sequence")
+    for x in coll:  # type: ignore
+        acc = step(acc, x)
+        if type(acc) is Reduced:
+            return acc.value
+    return acc
+
+
+def map_xform(f: MalExpression) -> MalTransducer:
+    assert isinstance(f, MalFunctionCompiled) or isinstance(f, MalFunctionRaw)
+    call = f.call1
+
+    def xform(step: Step) -> Step:
+        return lambda acc, x: step(acc, call(x))
+
+    return MalTransducer(xform)
+
+
+def filter_xform(pred: MalExpression) -> MalTransducer:
+    assert isinstance(pred, MalFunctionCompiled) or isinstance(pred, MalFunctionRaw)
+    call = pred.call1
+
+    def xform(step: Step) -> Step:
+        def filter_step(acc: Any, x: MalExpression) -> Any:
+            result = call(x)
+            if result is NIL or result is FALSE:
+                return acc
+            return step(acc, x)
+
+        return filter_step
+
+    return MalTransducer(xform)
+
+
+def take_xform(n: MalExpression) -> MalTransducer:
+    assert isinstance(n, MalInt)
+
+    def xform(step: Step) -> Step:
+        remaining = n.native()
+
+        def take_step(acc: Any, x: MalExpression) -> Any:
+            nonlocal remaining
+            if remaining <= 0:
+                return Reduced(acc)
+            remaining -= 1
+            acc = step(acc, x)
+            if remaining == 0 and type(acc) is not Reduced:
+                return Reduced(acc)
+            return acc
+
+        return take_step
+
+    return MalTransducer(xform)
+
+
+def drop_xform(n: MalExpression) -> MalTransducer:
+    assert isinstance(n, MalInt)
+
+    def xform(step: Step) -> Step:
+        remaining = n.native()
+
+        def drop_step(acc: Any, x: MalExpression) -> Any:
+            nonlocal remaining
+            if remaining > 0:
+                remaining -= 1
+                return acc
+            return step(acc, x)
+
+        return drop_step
+
+    return MalTransducer(xform)
+
+
+def comp(args: List[MalExpression]) -> MalExpression:
+    """(comp xf ...) feeds the output of each transducer to the next one;
+    (comp f g ...) makes the function that calls g and then f on its result."""
+    if any(isinstance(x, MalTransducer) for x in args):
+        for x in args:
+            if not isinstance(x, MalTransducer):
+                raise MalInvalidArgumentException(x, "not a transducer")
+        return functools.reduce(MalTransducer.then, args)  # type: ignore
+    for x in args:
+        if not (isinstance(x, MalFunctionCompiled) or isinstance(x, MalFunctionRaw)):
+            raise MalInvalidArgumentException(x, "not a function")
+    calls = [x.call for x in reversed(args)]  # type: ignore
+    if len(calls) == 0:
+        return MalFunctionCompiled(lambda args: args[0])
+
+    def composed(args: List[MalExpression]) -> MalExpression:
+        result = calls[0](args)
+        for call in calls[1:]:
+            result = call([result])
+        return result
+
+    return MalFunctionCompiled(composed)
+
+
+def transduce(args: List[MalExpression]) -> MalExpression:
+    """(transduce xform f init coll)"""
+    if len(args) != 4:
+        raise MalInvalidArgumentException(NIL, "transduce requires four arguments")
+    xform, f, init, coll = args
+    if not isinstance(xform, MalTransducer):
+        raise MalInvalidArgumentException(xform, "not a transducer")
+    assert isinstance(f, MalFunctionCompiled) or isinstance(f, MalFunctionRaw)
+    return reduce_with(xform.native()(f.call2), init, coll)
+
+
+def into(args: List[MalExpression]) -> MalExpression:
+    """(into to from) or (into to xform from) conjs the elements of from, or
+    of the pipeline over from, onto to, which may be a list, vector or map."""
+    if len(args) == 2:
+        to, xform, coll = args[0], None, args[1]
+    elif len(args) == 3:
+        to, xform, coll = args
+        if not isinstance(xform, MalTransducer):
+            raise MalInvalidArgumentException(xform, "not a transducer")
+    else:
+        raise MalInvalidArgumentException(NIL, "into requires two or three arguments")
+
+    def append(acc: List[MalExpression], x: MalExpression) -> List[MalExpression]:
+        acc.append(x)
+        return acc
+
+    step = append if xform is None else xform.native()(append)
+    items = reduce_with(step, [], coll)
+    if isinstance(to, MalHash_map):
+        pairs = []
+        for entry in items:
+            if sequential_q(entry) is not TRUE or entry.count() != 2:
+                raise MalInvalidArgumentException(entry, "not a key and value pair")
+            pairs.append((entry.nth(0), entry.nth(1)))
+        return to.assoc(pairs)
+    return conj([MalList([]) if to is NIL else to] + items)
+
+
+# Arithmetic. The functions of two arguments are the ones called from call
+# sites with two arguments; the variadic ones fold them over their arguments.
+# Two ints take the first branch; numeric vectors are worked on element by
+# element, with an int on either side applied to every element.
+
+
+def add2(a: MalExpression, b: MalExpression) -> MalExpression:
+    if type(a) is MalInt and type(b) is MalInt:
+        return MalInt(a.native() + b.native())
+    return num_vector_op(operator.add, a, b)
+
+
+def subtract2(a: MalExpression, b: MalExpression) -> MalExpression:
+    if type(a) is MalInt and type(b) is MalInt:
+        return MalInt(a.native() - b.native())
+    return num_vector_op(operator.sub, a, b)
+
+
+def multiply2(a: MalExpression, b: MalExpression) -> MalExpression:
+    if type(a) is MalInt and type(b) is MalInt:
+        return MalInt(a.native() * b.native())
+    return num_vector_op(operator.mul, a, b)
+
+
+def _divide(a: int, b: int) -> int:
+    return int(a / b)
+
+
+def divide2(a: MalExpression, b: MalExpression) -> MalExpression:
+    if type(a) is MalInt and type(b) is MalInt:
+        return MalInt(_divide(a.native(), b.native()))
+    return num_vector_op(_divide, a, b)
+
+
+def add(args: List[MalExpression]) -> MalExpression:
+    """(+ x ...), 0 without arguments"""
+    return functools.reduce(add2, args, MalInt(0))
+
+
+def multiply(args: List[MalExpression]) -> MalExpression:
+    """(* x ...), 1 without arguments"""
+    return functools.reduce(multiply2, args, MalInt(1))
+
+
+def subtract(args: List[MalExpression]) -> MalExpression:
+    """(- x y ...) subtracts the rest from x; (- x) is the negation of x."""
+    if len(args) == 0:
+        raise MalInvalidArgumentException(NIL, "- requires an argument")
+    if len(args) == 1:
+        return subtract2(MalInt(0), args[0])
+    return functools.reduce(subtract2, args[1:], args[0])
+
+
+def divide(args: List[MalExpression]) -> MalExpression:
+    """(/ x y ...) divides x by the rest; (/ x) is 1 divided by x."""
+    if len(args) == 0:
+        raise MalInvalidArgumentException(NIL, "/ requires an argument")
+    if len(args) == 1:
+        return divide2(MalInt(1), args[0])
+    return functools.reduce(divide2, args[1:], args[0])
+
+
+# Numeric vectors
+
+
+def _num_vector(values: Iterable[int]) -> MalNumVector:
+    try:
+        return MalNumVector(values)
+    except OverflowError:
+        raise MalException(MalString("integer overflow in numeric vector"))
+
+
+def num_vector(arg: MalExpression) -> MalExpression:
+    """(num-vector coll) copies the ints of a list, vector or lazy sequence
+    into a numeric vector."""
+    if isinstance(arg, MalNumVector):
+        return arg
+    if sequential_q(arg) is not TRUE:
+        raise MalInvalidArgumentException(arg, "not a sequence")
+    values = []
+    for x in arg:  # type: ignore
+        if type(x) is not MalInt:
+            raise MalInvalidArgumentException(x, "not an int")
+        values.append(x.native())
+    return _num_vector(values)
+
+
+def num_vector_op(
+    op: Callable[[int, int], int], a: MalExpression, b: MalExpression
+) -> MalExpression:
+    if isinstance(a, MalNumVector):
+        if isinstance(b, MalNumVector):
+            if a.count() != b.count():
+                raise MalInvalidArgumentException(b, "not the same length")
+            return _num_vector(map(op, a.native(), b.native()))
+        if type(b) is MalInt:
+            return _num_vector(map(op, a.native(), itertools.repeat(b.native())))
+        raise MalInvalidArgumentException(b, "not an int or numeric vector")
+    if type(a) is MalInt and isinstance(b, MalNumVector):
+        return _num_vector(map(op, itertools.repeat(a.native()), b.native()))
+    if type(a) is not MalInt:
+        raise MalInvalidArgumentException(a, "not an int or numeric vector")
+    raise MalInvalidArgumentException(b, "not an int or numeric vector")
+
+
+def _ints(args: List[MalExpression]) -> Iterable[int]:
+    """The ints of a single numeric vector or sequence argument, or else of
+    the arguments themselves."""
+    if len(args) == 1 and isinstance(args[0], MalNumVector):
+        return args[0].native()
+    if len(args) == 1 and sequential_q(args[0]) is TRUE:
+        args = args[0].native()
+    for x in args:
+        if type(x) is not MalInt:
+            raise MalInvalidArgumentException(x, "not an int")
+    return [x.native() for x in args]
+
+
+def sum_(args: List[MalExpression]) -> MalExpression:
+    """(sum xs) or (sum x y ...)"""
+    return MalInt(sum(_ints(args)))
+
+
+def min_max(
+    args: List[MalExpression], pick: Callable[[Iterable[int]], int]
+) -> MalExpression:
+    values = _ints(args)
+    if len(values) == 0:  # type: ignore
+        raise MalInvalidArgumentException(NIL, "no values")
+    return MalInt(pick(values))
+
+
+def dot(a: MalExpression, b: MalExpression) -> MalExpression:
+    for x in (a, b):
+        if not isinstance(x, MalNumVector):
+            raise MalInvalidArgumentException(x, "not a numeric vector")
+    if a.count() != b.count():
+        raise MalInvalidArgumentException(b, "not the same length")
+    return MalInt(sum(map(operator.mul, a.native(), b.native())))
+
+
+def subvec(args: List[MalExpression]) -> MalExpression:
+    """(subvec v start) or (subvec v start end), of a vector or numeric
+    vector. A numeric vector shares its elements with the result."""
+    v = args[0]
+    if not (isinstance(v, MalVector) or isinstance(v, MalNumVector)):
+        raise MalInvalidArgumentException(v, "not a vector")
+    for x in args[1:]:
+        if type(x) is not MalInt:
+            raise MalInvalidArgumentException(x, "not an int")
+    start = args[1].native()
+    end = args[2].native() if len(args) > 2 else v.count()
+    if not 0 <= start <= end <= v.count():
+        raise MalIndexError(end if start <= end else start)
+    if isinstance(v, MalNumVector):
+        return v.slice(start, end)
+    return MalVector(v.native()[start:end])
+
+
 ns = {
-    "+": MalFunctionCompiled(lambda args: MalInt(args[0].native() + args[1].native())),
-    "-": MalFunctionCompiled(lambda args: MalInt(args[0].native() - args[1].native())),
-    "*": MalFunctionCompiled(lambda args: MalInt(args[0].native() * args[1].native())),
-    "/": MalFunctionCompiled(
-        lambda args: MalInt(int(args[0].native() / args[1].native()))
-    ),
+    "+": MalFunctionCompiled(add, call2=add2),
+    "-": MalFunctionCompiled(subtract, call2=subtract2),
+    "*": MalFunctionCompiled(multiply, call2=multiply2),
+    "/": MalFunctionCompiled(divide, call2=divide2),
     "prn": MalFunctionCompiled(lambda args: prn(args)),
     "pr-str": MalFunctionCompiled(lambda args: pr_str(args)),
     "println": MalFunctionCompiled(lambda args: println(args)),
@@ -374,11 +886,11 @@ ns = {
     "list?": MalFunctionCompiled(lambda args: list_q(args[0])),
     "empty?": MalFunctionCompiled(lambda args: empty_q(args[0])),
     "count": MalFunctionCompiled(lambda args: count(args[0])),
-    "=": MalFunctionCompiled(lambda args: equal(args[0], args[1])),
-    "<": MalFunctionCompiled(lambda args: less(args[0], args[1])),
-    "<=": MalFunctionCompiled(lambda args: less_equal(args[0], args[1])),
-    ">": MalFunctionCompiled(lambda args: less(args[1], args[0])),
-    ">=": MalFunctionCompiled(lambda args: less_equal(args[1], args[0])),
+    "=": comparison(equal, ints=False),
+    "<": comparison(less),
+    "<=": comparison(less_equal),
+    ">": comparison(greater),
+    ">=": comparison(greater_equal),
     "read-string": MalFunctionCompiled(lambda args: read_string(args[0])),
     "slurp": MalFunctionCompiled(lambda args: slurp(args[0])),
     "str": MalFunctionCompiled(lambda args: core_str(args)),
@@ -392,7 +904,9 @@ ns = {
     "not": MalFunctionCompiled(lambda args: not_(args[0])),
     "nth": MalFunctionCompiled(lambda args: nth(args[0], args[1])),
     "apply": MalFunctionCompiled(lambda args: apply(args)),
-    "map": MalFunctionCompiled(lambda args: map_(args[0], args[1])),
+    "map": MalFunctionCompiled(
+        lambda args: map_xform(args[0]) if len(args) == 1 else map_(args[0], args[1])
+    ),
     "throw": MalFunctionCompiled(lambda args: throw(args[0])),
     "nil?": MalFunctionCompiled(lambda args: nil_q(args[0])),
     "true?": MalFunctionCompiled(lambda args: true_q(args[0])),
@@ -406,8 +920,32 @@ ns = {
     "fn?": MalFunctionCompiled(lambda args: not_implemented("fn?")),
     "string?": MalFunctionCompiled(lambda args: not_implemented("string?")),
     "number?": MalFunctionCompiled(lambda args: not_implemented("number?")),
-    "seq": MalFunctionCompiled(lambda args: not_implemented("seq")),
-    "conj": MalFunctionCompiled(lambda args: not_implemented("conj")),
+    "seq": MalFunctionCompiled(lambda args: seq(args[0])),
+    "take": MalFunctionCompiled(
+        lambda args: take_xform(args[0]) if len(args) == 1 else take(args[0], args[1])
+    ),
+    "drop": MalFunctionCompiled(
+        lambda args: drop_xform(args[0]) if len(args) == 1 else drop(args[0], args[1])
+    ),
+    "filter": MalFunctionCompiled(
+        lambda args: (
+            filter_xform(args[0]) if len(args) == 1 else filter_(args[0], args[1])
+        )
+    ),
+    "comp": MalFunctionCompiled(comp),
+    "transduce": MalFunctionCompiled(transduce),
+    "into": MalFunctionCompiled(into),
+    "num-vector": MalFunctionCompiled(lambda args: num_vector(args[0])),
+    "num-vector?": MalFunctionCompiled(
+        lambda args: MalBoolean(isinstance(args[0], MalNumVector))
+    ),
+    "sum": MalFunctionCompiled(sum_),
+    "min": MalFunctionCompiled(lambda args: min_max(args, min)),
+    "max": MalFunctionCompiled(lambda args: min_max(args, max)),
+    "dot": MalFunctionCompiled(lambda args: dot(args[0], args[1])),
+    "subvec": MalFunctionCompiled(subvec),
+    "range": MalFunctionCompiled(range_),
+    "conj": MalFunctionCompiled(conj),
     "get": MalFunctionCompiled(lambda args: get(args[0], args[1])),
     "first": MalFunctionCompiled(lambda args: first(args)),
     "rest": MalFunctionCompiled(lambda args: rest(args)),
@@ -424,4 +962,6 @@ ns = {
     "vals": MalFunctionCompiled(lambda args: vals(args)),
     "dissoc": MalFunctionCompiled(lambda args: dissoc(args)),
     "swap!": MalFunctionCompiled(lambda args: swap(args)),
+    "memoize": MalFunctionCompiled(memoize),
+    "memoize-stats": MalFunctionCompiled(lambda args: memoize_stats(args[0])),
 }
@@ -1,6 +1,6 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Tuple
 
-from mal_types import MalExpression, MalSymbol, MalList, MalUnknownSymbolException
+from mal_types import MalExpression, MalList, MalUnknownSymbolException
 
 
 class Env(object):
@@ -15,34 +15,45 @@ class Env(object):
         self._outer = outer
         self._data: Dict[str, MalExpression] = {}
         if binds is not None and exprs is not None:
-            for x in range(0, len(binds)):
-                assert isinstance(binds[x], MalSymbol)
-                if binds[x].native() == "&":
-                    self.set(str(binds[x + 1]), MalList(exprs[x:]))
+            data = self._data
+            for x, bind in enumerate(binds):
+                name = bind.native()
+                if name == "&":
+                    data[binds[x + 1].native()] = MalList(exprs[x:])
                     break
-                else:
-                    self.set(str(binds[x]), exprs[x])
+                data[name] = exprs[x]
 
     def set(self, key: str, value: MalExpression) -> MalExpression:
         self._data[key] = value
         return value
 
     def find(self, key: MalExpression) -> Optional["Env"]:
-        if str(key) in self._data:
-            return self
-        if self._outer is not None:
-            return self._outer.find(key)
+        strkey = key if type(key) is str else str(key)
+        env: Optional[Env] = self
+        while env is not None:
+            if strkey in env._data:
+                return env
+            env = env._outer
         return None
 
-    def get(self, key: MalExpression) -> MalExpression:
-        strkey = str(key)
-        if strkey in self._data:
-            return self._data[strkey]
+    def lookup_or_none(self, key: str) -> Optional[MalExpression]:
+        """Like get, but return None rather than raise for unbound names."""
+        env: Optional[Env] = self
+        while env is not None:
+            value = env._data.get(key)
+            if value is not None:
+                return value
+            env = env._outer
+        return None
 
-        location = self.find(key)
-        if location is None:
-            raise MalUnknownSymbolException(strkey)
-        return location.get(key)
+    def get(self, key: MalExpression) -> MalExpression:
+        strkey = key if type(key) is str else str(key)
+        env: Optional[Env] = self
+        while env is not None:
+            if strkey in env._data:
+                return env._data[strkey]
+            env = env._outer
+        raise MalUnknownSymbolException(strkey)
 
     def __repr__(self) -> str:
         env_str = "{"
@@ -50,3 +61,54 @@ class Env(object):
             env_str += str(d) + ": " + str(self._data[d]) + ", "
         env_str += "}"
         return f"environment: (data: {env_str} outer: {repr(self._outer) if self._outer is not None else 'None'})"
+
+
+class Scope(object):
+    """Compile-time view of a local environment, used by stepA_mal.analyze
+
+    Locals live in frames: plain lists whose item 0 is the enclosing frame
+    (or the global Env) and whose other items are the values, addressed by
+    slot. A Scope maps the names bound by a fn* to slots of its frame, so
+    that lookups become (depth, slot) index operations. let* and catch* open
+    nested scopes that share the frame of the enclosing fn*."""
+
+    def __init__(self, outer: Optional["Scope"], new_frame: bool = True) -> None:
+        self._outer = outer
+        self._slots: Dict[str, int] = {}
+        self._defined: Set[str] = set()
+        self._frame: Scope = self if new_frame or outer is None else outer._frame
+        self._size = 1
+
+    def is_frame(self) -> bool:
+        return self._frame is self
+
+    def size(self) -> int:
+        """Number of items a frame for this scope needs."""
+        return self._frame._size
+
+    def bind(self, name: str) -> int:
+        if name in self._slots:
+            return self._slots[name]
+        frame = self._frame
+        slot = frame._size
+        frame._size += 1
+        self._slots[name] = slot
+        return slot
+
+    def define(self, name: str) -> int:
+        """Bind a name for def!, whose slot may still be empty when read."""
+        if name not in self._slots:
+            self._defined.add(name)
+        return self.bind(name)
+
+    def resolve(self, name: str) -> Optional[Tuple[int, int, bool]]:
+        """Return (depth, slot, maybe_empty), or None if name is not local."""
+        depth = 0
+        scope: Optional[Scope] = self
+        while scope is not None:
+            if name in scope._slots:
+                return depth, scope._slots[name], name in scope._defined
+            if scope._frame is scope:
+                depth += 1
+            scope = scope._outer
+        return None
@@ -1,7 +1,24 @@
-from typing import Callable, Dict, List, Any
+import weakref
+from array import array
+from itertools import islice, zip_longest
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Any,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from persistent import PersistentHashMap, PersistentVector
 
 
 class MalExpression(object):
+    __slots__ = ()
+
     def __init__(self):
         assert False  # cannot instantiate
 
@@ -24,6 +41,8 @@ class MalExpression(object):
 
 
 class MalString(MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(
         self, input_value: str, is_already_encoded: bool = False, keyword: bool = False
     ) -> None:
@@ -59,31 +78,202 @@ class MalString(MalExpression):
     def is_keyword(self) -> bool:
         return len(self._value) > 1 and self._value[0] == "\u029e"
 
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is MalString and other._value == self._value
+
+    def __hash__(self) -> int:
+        return hash(self._value)
+
 
 class MalList(MalExpression):
+    """A list. The elements are `_values[_start:]` followed by the elements of
+    `_next`, if any, so rest, cons and concat can share structure with their
+    arguments instead of copying them. native() flattens a shared list into a
+    single Python list the first time it is called.
+
+    A list that is a macro call can also hold its expansion, so that the
+    macro is run once per call site rather than every time the form is
+    evaluated.
+
+    Lists are equal to lists and vectors with equal elements, and hash alike.
+    The hash is kept once computed, as the elements never change."""
+
+    __slots__ = ("_values", "_start", "_next", "_expansion", "_hash", "__weakref__")
+
     def __init__(self, values: List[MalExpression]) -> None:
-        for x in values:
-            assert isinstance(x, MalExpression)
         self._values = values
+        self._start = 0
+        self._next: Optional[MalList] = None
+        self._expansion: Optional[Tuple[MalExpression, MalExpression]] = None
+        self._hash: Optional[int] = None
+
+    @staticmethod
+    def _view(
+        values: List[MalExpression], start: int, next_: Optional["MalList"]
+    ) -> "MalList":
+        result = MalList.__new__(MalList)
+        result._values = values
+        result._start = start
+        result._next = next_
+        result._expansion = None
+        result._hash = None
+        return result
 
     def readable_str(self) -> str:
-        return "(" + " ".join(map(lambda x: x.readable_str(), self._values)) + ")"
+        return "(" + " ".join(map(lambda x: x.readable_str(), self)) + ")"
 
     def unreadable_str(self) -> str:
-        return "(" + " ".join(map(lambda x: x.unreadable_str(), self._values)) + ")"
+        return "(" + " ".join(map(lambda x: x.unreadable_str(), self)) + ")"
+
+    def __eq__(self, other: Any) -> bool:
+        return _equal_sequences(self, other)
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def expansion(self, macro: MalExpression) -> Optional[MalExpression]:
+        """Return the expansion of this form stored by set_expansion, if it was
+        made by `macro`. A macro redefined with defmacro! is a new function, so
+        the forms it expanded before are expanded again."""
+        expansion = self._expansion
+        if expansion is not None and expansion[0] is macro:
+            return expansion[1]
+        return None
+
+    def set_expansion(self, macro: MalExpression, expanded: MalExpression) -> None:
+        self._expansion = (macro, expanded)
 
     def native(self) -> List[MalExpression]:
-        return self._values
+        if self._start == 0 and self._next is None:
+            return self._values
+        values: List[MalExpression] = []
+        node: Optional[MalList] = self
+        while node is not None:
+            values += node._values[node._start :] if node._start else node._values
+            node = node._next
+        self._values = values
+        self._start = 0
+        self._next = None
+        return values
+
+    def __iter__(self) -> Iterator[MalExpression]:
+        if self._next is None:
+            if self._start == 0:
+                return iter(self._values)
+            return islice(self._values, self._start, None)
+        return self._iter_chain()
+
+    def _iter_chain(self) -> Iterator[MalExpression]:
+        node: Optional[MalList] = self
+        while node is not None:
+            yield from islice(node._values, node._start, None)
+            node = node._next
+
+    def count(self) -> int:
+        result = 0
+        node: Optional[MalList] = self
+        while node is not None:
+            result += len(node._values) - node._start
+            node = node._next
+        return result
+
+    def is_empty(self) -> bool:
+        return self._next is None and self._start >= len(self._values)
+
+    def first(self) -> MalExpression:
+        if self.is_empty():
+            return NIL
+        return self._values[self._start]
+
+    def rest(self) -> "MalList":
+        """Return the list without its first element, sharing its storage."""
+        start = self._start + 1
+        if start < len(self._values):
+            return MalList._view(self._values, start, self._next)
+        if self._next is not None:
+            return self._next
+        return MalList([])
+
+    def nth(self, index: int) -> MalExpression:
+        if index < 0:
+            raise MalIndexError(index)
+        node: Optional[MalList] = self
+        position = index
+        while node is not None:
+            if node._start + position < len(node._values):
+                return node._values[node._start + position]
+            position -= len(node._values) - node._start
+            node = node._next
+        raise MalIndexError(index)
+
+    def drop(self, n: int) -> "MalList":
+        """Return the list without its first n elements, sharing its storage."""
+        node: Optional[MalList] = self
+        while node is not None:
+            remaining = len(node._values) - node._start
+            if n < remaining:
+                return MalList._view(node._values, node._start + max(n, 0), node._next)
+            n -= remaining
+            node = node._next
+        return MalList([])
+
+    def cons(self, value: MalExpression) -> "MalList":
+        """Return a new list with `value` in front, sharing this list."""
+        return MalList._view([value], 0, None if self.is_empty() else self)
+
+    @staticmethod
+    def concat(seqs: List["MalExpression"]) -> "MalList":
+        """Concatenate lists, vectors and lazy sequences. The last list is shared rather than
+        copied, and a flat list is linked to the next one without copying."""
+        result: Optional[MalList] = None
+        for seq in reversed(seqs):
+            if isinstance(seq, MalVector) or isinstance(seq, MalLazySeq):
+                values = seq.native()
+                start = 0
+            else:
+                assert isinstance(seq, MalList)
+                if seq.is_empty():
+                    continue
+                if result is None:
+                    result = seq
+                    continue
+                if seq._next is None:
+                    values, start = seq._values, seq._start
+                else:
+                    values, start = seq.native(), 0
+            if start < len(values):
+                result = MalList._view(values, start, result)
+        return MalList([]) if result is None else result
 
 
 class MalSymbol(MalExpression):
-    def __init__(self, value: str) -> None:
-        assert type(value) is str
+    """A symbol. Symbols are interned: MalSymbol(name) always returns the same
+    instance for the same name, so symbols can be compared with `is` and
+    hashed by identity. The intern table holds symbols weakly, so those no
+    longer used, such as the symbols made by gensym, are collected."""
+
+    __slots__ = ("_value", "__weakref__")
+
+    _interned: "weakref.WeakValueDictionary[str, MalSymbol]" = (
+        weakref.WeakValueDictionary()
+    )
+
+    def __new__(cls, value: str) -> "MalSymbol":
+        symbol = MalSymbol._interned.get(value)
+        if symbol is None:
+            assert type(value) is str
+            symbol = super().__new__(cls)
+            symbol._value = value
+            MalSymbol._interned[value] = symbol
+        return symbol
 
-        self._value = str(value)
+    def __init__(self, value: str) -> None:
+        pass
 
     def readable_str(self) -> str:
-        return str(self._value)
+        return self._value
 
     def eval(self, environment) -> MalExpression:
         # print("Evaluating: " + repr(self))
@@ -96,6 +286,7 @@ class MalSymbol(MalExpression):
 class MalException(Exception, MalExpression):
     def __init__(self, value: MalExpression) -> None:
         self._value = value
+        self._positions: Optional[List[Tuple[str, int, int]]] = None
 
     def readable_str(self) -> str:
         return str(self._value)
@@ -103,6 +294,16 @@ class MalException(Exception, MalExpression):
     def native(self) -> MalExpression:
         return self._value
 
+    def add_position(self, position: Tuple[str, int, int]) -> None:
+        """Record a (file, line, column) the exception propagated through."""
+        if self._positions is None:
+            self._positions = []
+        self._positions.append(position)
+
+    def positions(self) -> List[Tuple[str, int, int]]:
+        """The positions the exception propagated through, innermost first."""
+        return self._positions or []
+
 
 class MalIndexError(MalException):
     def __init__(self, index: int) -> None:
@@ -138,11 +339,27 @@ class MalNotImplementedException(MalException):
 
 
 class MalFunctionCompiled(MalExpression):
+    """A function implemented in Python, taking its arguments as a list.
+
+    call0, call1 and call2 call it with that many arguments given directly,
+    so that callers which know how many they pass need not build a list.
+    They run the Python functions given for them, if any, and otherwise the
+    list version."""
+
+    __slots__ = ("_native_function", "_is_macro", "call0", "call1", "call2")
+
     def __init__(
-        self, native_function: Callable[[List[MalExpression]], MalExpression]
+        self,
+        native_function: Callable[[List[MalExpression]], MalExpression],
+        call0: Optional[Callable[[], MalExpression]] = None,
+        call1: Optional[Callable[[MalExpression], MalExpression]] = None,
+        call2: Optional[Callable[[MalExpression, MalExpression], MalExpression]] = None,
     ) -> None:
         self._native_function = native_function
         self._is_macro = False
+        self.call0 = call0 or (lambda: native_function([]))
+        self.call1 = call1 or (lambda a: native_function([a]))
+        self.call2 = call2 or (lambda a, b: native_function([a, b]))
 
     def readable_str(self):
         return "#<macro>" if self._is_macro else "#<function>"
@@ -162,18 +379,31 @@ class MalFunctionCompiled(MalExpression):
 
 
 class MalFunctionRaw(MalExpression):
+    __slots__ = (
+        "_ast",
+        "_params",
+        "_env",
+        "_native_function",
+        "_entry",
+        "_is_macro",
+        "_name",
+    )
+
     def __init__(
         self,
         fn: Callable[[List[MalExpression]], MalExpression],
         ast: MalExpression,
         params: MalList,
         env,
+        entry: Optional[Callable[[List[MalExpression]], Any]] = None,
     ) -> None:
         self._ast = ast
         self._params = params
         self._env = env
         self._native_function = fn
+        self._entry = entry
         self._is_macro = False
+        self._name: Optional[str] = None
 
     def readable_str(self):
         return "#<macro>" if self._is_macro else "#<function>"
@@ -187,23 +417,90 @@ class MalFunctionRaw(MalExpression):
     def env(self):
         return self._env
 
+    def entry(self) -> Optional[Callable[[List[MalExpression]], Any]]:
+        """Return the tail-call entry point, if the function was compiled.
+
+        Unlike call(), the entry point may return a pending tail call instead
+        of a value; see stepA_mal.analyze."""
+        return self._entry
+
     def native(self) -> Callable[[List[MalExpression]], MalExpression]:
         return self._native_function
 
     def call(self, args: List[MalExpression]) -> MalExpression:
         return self._native_function(args)
 
+    # The same calls as MalFunctionCompiled's call0, call1 and call2
+    def call0(self) -> MalExpression:
+        return self._native_function([])
+
+    def call1(self, a: MalExpression) -> MalExpression:
+        return self._native_function([a])
+
+    def call2(self, a: MalExpression, b: MalExpression) -> MalExpression:
+        return self._native_function([a, b])
+
     def is_macro(self) -> bool:
         return self._is_macro
 
     def make_macro(self) -> None:
         self._is_macro = True
 
+    def name(self) -> Optional[str]:
+        """The name the function was first defined as with def!, if any."""
+        return self._name
+
+    def set_name(self, name: str) -> None:
+        if self._name is None:
+            self._name = name
+
+
+# A step of a transducer pipeline: takes the value accumulated so far and an
+# element, and returns the new accumulated value (or core.Reduced to stop).
+Step = Callable[[Any, MalExpression], Any]
+
+
+class MalTransducer(MalExpression):
+    """A stage of a transduce or into pipeline, such as (map f) or (take n).
+
+    It holds a function from the step that takes the stage's output to the
+    step that takes its input. Stages composed with comp make a single step,
+    so a pipeline runs as one loop with no collection between its stages."""
+
+    __slots__ = ("_xform",)
+
+    def __init__(self, xform: Callable[[Step], Step]) -> None:
+        self._xform = xform
+
+    def readable_str(self) -> str:
+        return "#<transducer>"
+
+    def native(self) -> Callable[[Step], Step]:
+        return self._xform
+
+    def then(self, other: "MalTransducer") -> "MalTransducer":
+        """Return the stage that feeds the output of this one to `other`."""
+        first, second = self._xform, other._xform
+        return MalTransducer(lambda step: first(second(step)))
+
 
 class MalInt(MalExpression):
-    def __init__(self, value: int) -> None:
+    """An integer. Like CPython, small integers are preallocated and shared:
+    MalInt(n) returns the cached instance for SMALL_INT_MIN <= n < SMALL_INT_MAX.
+    """
+
+    __slots__ = ("_value",)
+
+    def __new__(cls, value: int) -> "MalInt":
         assert type(value) is int
-        self._value = value
+        if SMALL_INT_MIN <= value < SMALL_INT_MAX:
+            return _small_ints[value - SMALL_INT_MIN]
+        mal_int = super().__new__(cls)
+        mal_int._value = value
+        return mal_int
+
+    def __init__(self, value: int) -> None:
+        pass
 
     def readable_str(self) -> str:
         return str(self._value)
@@ -211,44 +508,390 @@ class MalInt(MalExpression):
     def native(self) -> int:
         return self._value
 
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is MalInt and other._value == self._value
+
+    def __hash__(self) -> int:
+        return hash(self._value)
+
 
 class MalVector(MalExpression):
-    def __init__(self, values: List[MalExpression]) -> None:
-        self._values = values
+    """A vector, backed by a PersistentVector so that conj shares structure.
+    Equal and hashed as a list with the same elements."""
+
+    __slots__ = ("_vector", "_hash")
+
+    def __init__(self, values: Union[List[MalExpression], PersistentVector]) -> None:
+        if isinstance(values, PersistentVector):
+            self._vector = values
+        else:
+            self._vector = PersistentVector.from_list(values)
+        self._hash: Optional[int] = None
+
+    def __eq__(self, other: Any) -> bool:
+        return _equal_sequences(self, other)
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(tuple(self._vector))
+        return self._hash
 
     def readable_str(self) -> str:
-        return "[" + " ".join(map(lambda x: x.readable_str(), self._values)) + "]"
+        return "[" + " ".join(map(lambda x: x.readable_str(), self._vector)) + "]"
 
     def unreadable_str(self) -> str:
-        return "[" + " ".join(map(lambda x: x.unreadable_str(), self._values)) + "]"
+        return "[" + " ".join(map(lambda x: x.unreadable_str(), self._vector)) + "]"
 
     def native(self) -> List[MalExpression]:
-        return self._values
+        return self._vector.to_list()
+
+    def __iter__(self) -> Iterator[MalExpression]:
+        return iter(self._vector)
+
+    def count(self) -> int:
+        return len(self._vector)
+
+    def is_empty(self) -> bool:
+        return len(self._vector) == 0
+
+    def first(self) -> MalExpression:
+        if len(self._vector) == 0:
+            return NIL
+        return self._vector[0]
+
+    def rest(self) -> MalList:
+        if len(self._vector) < 2:
+            return MalList([])
+        return MalList._view(self._vector.to_list(), 1, None)
+
+    def nth(self, index: int) -> MalExpression:
+        if index < 0 or index >= len(self._vector):
+            raise MalIndexError(index)
+        return self._vector[index]
+
+    def conj(self, value: MalExpression) -> "MalVector":
+        """Return a new vector with `value` appended, sharing this vector."""
+        return MalVector(self._vector.conj(value))
+
+    def drop(self, n: int) -> MalList:
+        return MalList._view(self._vector.to_list(), min(max(n, 0), self.count()), None)
+
+
+class MalNumVector(MalExpression):
+    """A vector of 64-bit integers, stored unboxed in an array.array for bulk
+    arithmetic. The elements are reached through a memoryview of the array,
+    so subvec shares them instead of copying; they are boxed as MalInts only
+    when read one at a time. Numeric vectors are made from and turned back
+    into vectors explicitly, with num-vector and vec."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, values: Union[memoryview, array, Iterable[int]]) -> None:
+        """Raises OverflowError if a value does not fit in 64 bits."""
+        if isinstance(values, memoryview):
+            self._data = values
+        else:
+            if not isinstance(values, array):
+                values = array("q", values)
+            self._data = memoryview(values)
+
+    def readable_str(self) -> str:
+        return "(num-vector [" + " ".join(map(str, self._data)) + "])"
+
+    def native(self) -> memoryview:
+        return self._data
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is MalNumVector and self._data == other._data
+
+    def __hash__(self) -> int:
+        return hash(self._data.tobytes())
+
+    def count(self) -> int:
+        return len(self._data)
+
+    def nth(self, index: int) -> MalExpression:
+        if index < 0 or index >= len(self._data):
+            raise MalIndexError(index)
+        return MalInt(self._data[index])
+
+    def slice(self, start: int, end: int) -> "MalNumVector":
+        return MalNumVector(self._data[start:end])
+
+
+class MalLazySeq(MalExpression):
+    """A sequence whose elements are computed as they are asked for.
+
+    A lazy sequence is a cell that runs its thunk the first time its first
+    element or its rest is needed, and keeps the result. The thunk returns the
+    sequence the cell stands for: nil or an empty collection at the end, or a
+    list, vector or other lazy sequence, whose rest is usually another lazy
+    sequence that has not run yet. So walking a lazy sequence computes one
+    element at a time, and only the cells still referenced stay in memory.
+
+    Lazy sequences print, compare and hash as lists with the same elements."""
+
+    __slots__ = ("_thunk", "_first", "_rest", "_hash")
+
+    def __init__(self, thunk: Callable[[], MalExpression]) -> None:
+        self._thunk: Optional[Callable[[], MalExpression]] = thunk
+        self._first: MalExpression = NIL
+        # None once realised if the sequence is empty
+        self._rest: Optional[MalExpression] = None
+        self._hash: Optional[int] = None
+
+    @staticmethod
+    def cell(first: MalExpression, rest: MalExpression) -> "MalLazySeq":
+        """Return a realised sequence of `first` followed by `rest`."""
+        result = MalLazySeq.__new__(MalLazySeq)
+        result._thunk = None
+        result._first = first
+        result._rest = rest
+        result._hash = None
+        return result
+
+    @staticmethod
+    def from_iterator(values: Iterator[MalExpression]) -> "MalLazySeq":
+        """Return a lazy sequence of the values, which are taken from the
+        iterator one at a time as the sequence is walked."""
+
+        def thunk() -> MalExpression:
+            for value in values:
+                return MalLazySeq.cell(value, MalLazySeq(thunk))
+            return NIL
+
+        return MalLazySeq(thunk)
+
+    def _realise(self) -> None:
+        if self._thunk is None:
+            return
+        # A thunk that returns an unrealised lazy sequence, as a recursive
+        # (lazy-seq (if ... (recur-fn ...))) does while skipping elements,
+        # is followed in a loop so that skipping does not nest.
+        pending = [self]
+        seq = self._thunk()
+        while isinstance(seq, MalLazySeq) and seq._thunk is not None:
+            pending.append(seq)
+            seq = seq._thunk()
+        first: MalExpression = NIL
+        rest: Optional[MalExpression] = None
+        if isinstance(seq, MalLazySeq):
+            first, rest = seq._first, seq._rest
+        elif isinstance(seq, MalList) or isinstance(seq, MalVector):
+            if not seq.is_empty():
+                first, rest = seq.first(), seq.rest()
+        elif seq is not NIL:
+            raise MalInvalidArgumentException(seq, "not a sequence")
+        for cell in pending:
+            cell._first, cell._rest, cell._thunk = first, rest, None
+
+    def readable_str(self) -> str:
+        return "(" + " ".join(map(lambda x: x.readable_str(), self)) + ")"
+
+    def unreadable_str(self) -> str:
+        return "(" + " ".join(map(lambda x: x.unreadable_str(), self)) + ")"
+
+    def __eq__(self, other: Any) -> bool:
+        return _equal_sequences(self, other)
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def native(self) -> List[MalExpression]:
+        return list(self)
+
+    def __iter__(self) -> Iterator[MalExpression]:
+        return _iter_seq(self)
+
+    def count(self) -> int:
+        result = 0
+        for _ in self:
+            result += 1
+        return result
+
+    def is_empty(self) -> bool:
+        self._realise()
+        return self._rest is None
+
+    def first(self) -> MalExpression:
+        self._realise()
+        return self._first
+
+    def rest(self) -> MalExpression:
+        self._realise()
+        return MalList([]) if self._rest is None else self._rest
+
+    def nth(self, index: int) -> MalExpression:
+        if index >= 0:
+            for i, value in enumerate(self):
+                if i == index:
+                    return value
+        raise MalIndexError(index)
+
+    def cons(self, value: MalExpression) -> "MalLazySeq":
+        return MalLazySeq.cell(value, self)
+
+    def drop(self, n: int) -> "MalLazySeq":
+        """Return the sequence without its first n elements. Nothing is
+        computed until the result is walked."""
+
+        def thunk() -> MalExpression:
+            seq: MalExpression = self
+            for _ in range(n):
+                if seq.is_empty():  # type: ignore
+                    break
+                seq = seq.rest()  # type: ignore
+            return seq
+
+        return MalLazySeq(thunk)
+
+
+def _iter_seq(seq: MalExpression) -> Iterator[MalExpression]:
+    # Not a method, so that the generator does not keep the head of the
+    # sequence alive while it walks it.
+    while isinstance(seq, MalLazySeq):
+        seq._realise()
+        if seq._rest is None:
+            return
+        yield seq._first
+        seq = seq._rest
+    yield from seq  # type: ignore
+
+
+# Hash maps with at most this many entries are stored in a dict and copied
+# on update; larger ones are stored in a PersistentHashMap. Below roughly this
+# size copying a dict is cheaper than a trie update, and lookups stay fast.
+MAX_DICT_SIZE = 512
+
+_MISSING = object()
+
+
+def _equal_sequences(a: Any, b: Any) -> bool:
+    """Equality of a list, vector or lazy sequence `a` with `b`, used by all
+    three types. Lazy sequences are only walked as far as they differ."""
+    if a is b:
+        return True
+    if not (
+        isinstance(b, MalList) or isinstance(b, MalVector) or isinstance(b, MalLazySeq)
+    ):
+        return False
+    if a._hash is not None and b._hash is not None and a._hash != b._hash:
+        return False
+    if isinstance(a, MalLazySeq) or isinstance(b, MalLazySeq):
+        for x, y in zip_longest(a, b, fillvalue=_MISSING):
+            if x != y:
+                return False
+        return True
+    if a.count() != b.count():
+        return False
+    for x, y in zip(a, b):
+        if x != y:
+            return False
+    return True
+
+
+MalMapping = Union[Dict[MalExpression, MalExpression], PersistentHashMap]
 
 
 class MalHash_map(MalExpression):
-    def __init__(self, values: Dict[str, MalExpression]) -> None:
-        self._dict = values.copy()
+    """A hash-map. Any value can be a key: keys are found by their hash and
+    equality, which for strings, numbers and collections are structural.
+    Maps are equal when they hold equal keys and values; their hash is kept
+    once computed."""
+
+    __slots__ = ("_dict", "_hash")
+
+    def __init__(self, values: MalMapping) -> None:
+        if isinstance(values, PersistentHashMap):
+            self._dict: MalMapping = values
+        elif len(values) > MAX_DICT_SIZE:
+            self._dict = PersistentHashMap.from_items(values.items())
+        else:
+            self._dict = values.copy()
+        self._hash: Optional[int] = None
+
+    @staticmethod
+    def _wrap(values: MalMapping) -> "MalHash_map":
+        result = MalHash_map.__new__(MalHash_map)
+        result._dict = values
+        result._hash = None
+        return result
 
     def readable_str(self) -> str:
         result_list: List[str] = []
-        for x in self._dict:
-            result_list.append(MalString(x).readable_str())
-            result_list.append(self._dict[x].readable_str())
+        for key, value in self._dict.items():
+            result_list.append(key.readable_str())
+            result_list.append(value.readable_str())
         return "{" + " ".join(result_list) + "}"
 
     def unreadable_str(self) -> str:
         result_list: List[str] = []
-        for x in self._dict:
-            result_list.append(MalString(x, is_already_encoded=True).unreadable_str())
-            result_list.append(self._dict[x].unreadable_str())
+        for key, value in self._dict.items():
+            result_list.append(key.unreadable_str())
+            result_list.append(value.unreadable_str())
         return "{" + " ".join(result_list) + "}"
 
-    def native(self) -> Dict[str, MalExpression]:
+    def native(self) -> MalMapping:
         return self._dict
 
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if type(other) is not MalHash_map or len(other._dict) != len(self._dict):
+            return False
+        if (
+            self._hash is not None
+            and other._hash is not None
+            and self._hash != other._hash
+        ):
+            return False
+        other_dict = other._dict
+        for key, value in self._dict.items():
+            if other_dict.get(key, _MISSING) != value:
+                return False
+        return True
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(frozenset(self._dict.items()))
+        return self._hash
+
+    def assoc(self, items: List[Tuple[MalExpression, MalExpression]]) -> "MalHash_map":
+        """Return a new map with the given key/value pairs added."""
+        values = self._dict
+        if isinstance(values, dict):
+            if len(values) + len(items) <= MAX_DICT_SIZE:
+                values = values.copy()
+                values.update(items)
+                return MalHash_map._wrap(values)
+            values = PersistentHashMap.from_items(values.items())
+        for key, value in items:
+            values = values.assoc(key, value)
+        return MalHash_map._wrap(values)
+
+    def dissoc(self, keys: List[MalExpression]) -> "MalHash_map":
+        """Return a new map without the given keys."""
+        values = self._dict
+        if isinstance(values, dict):
+            values = values.copy()
+            for key in keys:
+                values.pop(key, None)
+            return MalHash_map._wrap(values)
+        for key in keys:
+            values = values.dissoc(key)
+        return MalHash_map._wrap(values)
+
 
 class MalNil(MalExpression):
+    """nil. MalNil() always returns the NIL singleton."""
+
+    __slots__ = ()
+
+    def __new__(cls) -> "MalNil":
+        return NIL
+
     def __init__(self) -> None:
         pass
 
@@ -263,8 +906,15 @@ class MalNil(MalExpression):
 
 
 class MalBoolean(MalExpression):
+    """true or false. MalBoolean(x) always returns the TRUE or FALSE singleton."""
+
+    __slots__ = ("_value",)
+
+    def __new__(cls, value: bool) -> "MalBoolean":
+        return TRUE if value else FALSE
+
     def __init__(self, value: bool) -> None:
-        self._value = value
+        pass
 
     def readable_str(self) -> str:
         if self._value:
@@ -275,7 +925,26 @@ class MalBoolean(MalExpression):
         return self._value
 
 
+# The singletons are made before any MalNil() or MalBoolean() call can run,
+# so nil, true and false can be tested for with `is`.
+NIL: MalNil = MalExpression.__new__(MalNil)
+TRUE: MalBoolean = MalExpression.__new__(MalBoolean)
+TRUE._value = True
+FALSE: MalBoolean = MalExpression.__new__(MalBoolean)
+FALSE._value = False
+
+SMALL_INT_MIN = -128
+SMALL_INT_MAX = 1024
+_small_ints: List[MalInt] = []
+for _i in range(SMALL_INT_MIN, SMALL_INT_MAX):
+    _small_ints.append(MalExpression.__new__(MalInt))
+    _small_ints[-1]._value = _i
+del _i
+
+
 class MalAtom(MalExpression):
+    __slots__ = ("_value",)
+
     def __init__(self, value: MalExpression) -> None:
         self._value = value
 
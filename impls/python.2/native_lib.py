@@ -0,0 +1,132 @@
+"""Python implementations of helpers from impls/lib.
+
+When stepA's load-file loads one of the library files listed in LIBS, the
+definitions that the file made are replaced with these. They behave as the
+mal versions do, including their errors, but run as single Python calls
+rather than as interpreted mal, so folds and memoized calls no longer go
+through the evaluator for every element. The one difference is memoize,
+which becomes core's: it tells arguments apart by value rather than by how
+they print, so "1" and 1 are no longer the same arguments."""
+
+import itertools
+import os
+from typing import Callable, Dict, List
+
+import core
+from env import Env
+from mal_types import (
+    MalExpression,
+    MalFunctionCompiled,
+    MalFunctionRaw,
+    MalInt,
+    MalInvalidArgumentException,
+    MalList,
+    MalSymbol,
+)
+
+LIB_DIR = os.path.realpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib")
+)
+
+
+def _function(f: MalExpression) -> None:
+    if not isinstance(f, (MalFunctionCompiled, MalFunctionRaw)):
+        raise MalInvalidArgumentException(f, "not a function")
+
+
+def reduce_(args: List[MalExpression]) -> MalExpression:
+    f, acc, xs = args[:3]
+    if core.empty_q(xs).native():
+        return acc
+    _function(f)
+    call = f.call2
+    for x in xs:  # type: ignore
+        acc = call(acc, x)
+    return acc
+
+
+def foldr(args: List[MalExpression]) -> MalExpression:
+    f, acc, xs = args[:3]
+    if core.count(xs).native() == 0:
+        return acc
+    _function(f)
+    call = f.call2
+    for x in reversed(xs.native()):
+        acc = call(x, acc)
+    return acc
+
+
+def _thread(args: List[MalExpression], last: bool) -> MalExpression:
+    acc = args[0]
+    for form in args[1:]:
+        if isinstance(form, MalList):
+            head = core.first([form])
+            tail = list(form.rest())
+            acc = MalList([head] + tail + [acc] if last else [head, acc] + tail)
+        else:
+            acc = MalList([form, acc])
+    return acc
+
+
+def _gensym() -> MalFunctionCompiled:
+    counter = itertools.count(1)
+    return MalFunctionCompiled(lambda args: MalSymbol("G__%d" % next(counter)))
+
+
+def _fn(
+    arity: int, f: Callable[[List[MalExpression]], MalExpression]
+) -> MalFunctionCompiled:
+    """A function of `arity` parameters. Like the fn* it replaces, it
+    reports too few arguments and ignores extra ones."""
+
+    def call(args: List[MalExpression]) -> MalExpression:
+        if len(args) < arity:
+            raise MalInvalidArgumentException(result, "too few arguments")
+        return f(args)
+
+    result = MalFunctionCompiled(call)
+    return result
+
+
+def _macro(
+    arity: int, f: Callable[[List[MalExpression]], MalExpression]
+) -> MalFunctionCompiled:
+    result = _fn(arity, f)
+    result.make_macro()
+    return result
+
+
+# The definitions to replace for each library file. Files that keep state,
+# such as the counter of gensym, start again when loaded again, so each load
+# gets new functions.
+LIBS: Dict[str, Callable[[], Dict[str, MalExpression]]] = {
+    "reducers.mal": lambda: {
+        "reduce": _fn(3, reduce_),
+        "foldr": _fn(3, foldr),
+    },
+    "threading.mal": lambda: {
+        "->": _macro(1, lambda args: _thread(args, False)),
+        "->>": _macro(1, lambda args: _thread(args, True)),
+    },
+    "memoize.mal": lambda: {"memoize": core.ns["memoize"]},
+    "trivial.mal": lambda: {
+        "inc": _fn(1, lambda args: core.add2(args[0], MalInt(1))),
+        "dec": _fn(1, lambda args: core.subtract2(args[0], MalInt(1))),
+        "zero?": _fn(1, lambda args: core.equal(MalInt(0), args[0])),
+        "identity": _fn(1, lambda args: args[0]),
+        "gensym": _gensym(),
+    },
+}
+
+
+def register(filename: str, env: Env) -> None:
+    """Replace the definitions made by loading `filename` with their Python
+    implementations, if it is one of the library files in LIBS."""
+    path = os.path.realpath(filename)
+    if os.path.dirname(path) != LIB_DIR:
+        return
+    make = LIBS.get(os.path.basename(path))
+    if make is None:
+        return
+    for name, value in make().items():
+        env.set(name, value)
@@ -0,0 +1,307 @@
+"""Persistent (immutable, structurally shared) collections backing the Mal
+vector and hash-map types.
+
+PersistentVector is a 32-way trie with a tail buffer, as in Clojure: vectors
+of up to 32 elements live entirely in the tail, which is a plain Python list.
+PersistentHashMap is a hash array mapped trie (HAMT). Both return new
+instances from their update methods and never modify existing ones."""
+
+from typing import Any, Iterator, List, Optional, Tuple
+from collections.abc import Mapping
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class PersistentVector(object):
+    __slots__ = ("_count", "_shift", "_root", "_tail")
+
+    def __init__(self, count: int, shift: int, root: List[Any], tail: List[Any]):
+        self._count = count
+        self._shift = shift
+        self._root = root
+        self._tail = tail
+
+    @staticmethod
+    def from_list(values: List[Any]) -> "PersistentVector":
+        """Build a vector holding `values`. Lists of up to 32 elements are used
+        as the tail as is, so the caller must not modify them afterwards."""
+        count = len(values)
+        if count <= WIDTH:
+            return PersistentVector(count, BITS, [], values)
+        tail_offset = (count - 1) & ~MASK
+        nodes = [values[i : i + WIDTH] for i in range(0, tail_offset, WIDTH)]
+        shift = BITS
+        while len(nodes) > WIDTH:
+            nodes = [nodes[i : i + WIDTH] for i in range(0, len(nodes), WIDTH)]
+            shift += BITS
+        return PersistentVector(count, shift, nodes, values[tail_offset:])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _tail_offset(self) -> int:
+        return self._count - len(self._tail)
+
+    def _leaf_for(self, index: int) -> List[Any]:
+        if index >= self._count - len(self._tail):
+            return self._tail
+        node = self._root
+        level = self._shift
+        while level > 0:
+            node = node[(index >> level) & MASK]
+            level -= BITS
+        return node
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError(index)
+        return self._leaf_for(index)[index & MASK]
+
+    def __iter__(self) -> Iterator[Any]:
+        tail_offset = self._tail_offset()
+        for i in range(0, tail_offset, WIDTH):
+            yield from self._leaf_for(i)
+        yield from self._tail
+
+    def to_list(self) -> List[Any]:
+        """Return the elements as a list. For vectors of up to 32 elements
+        this is the tail itself, which must not be modified."""
+        if not self._root:
+            return self._tail
+        return list(self)
+
+    def conj(self, value: Any) -> "PersistentVector":
+        """Return a new vector with `value` appended."""
+        if len(self._tail) < WIDTH:
+            return PersistentVector(
+                self._count + 1, self._shift, self._root, self._tail + [value]
+            )
+        shift = self._shift
+        if (self._count >> BITS) > (1 << shift):
+            root = [self._root, _new_path(shift, self._tail)]
+            shift += BITS
+        else:
+            root = self._push_tail(shift, self._root, self._tail)
+        return PersistentVector(self._count + 1, shift, root, [value])
+
+    def _push_tail(self, level: int, parent: List[Any], tail: List[Any]) -> List[Any]:
+        index = ((self._count - 1) >> level) & MASK
+        result = parent[:]
+        if level == BITS:
+            node = tail
+        elif index < len(parent):
+            node = self._push_tail(level - BITS, parent[index], tail)
+        else:
+            node = _new_path(level - BITS, tail)
+        if index < len(result):
+            result[index] = node
+        else:
+            result.append(node)
+        return result
+
+
+def _new_path(level: int, node: List[Any]) -> List[Any]:
+    while level > 0:
+        node = [node]
+        level -= BITS
+    return node
+
+
+def _hash(key: Any) -> int:
+    return hash(key) & 0xFFFFFFFFFFFFFFFF
+
+
+def _bit_index(bitmap: int, bit: int) -> int:
+    return bin(bitmap & (bit - 1)).count("1")
+
+
+class _BitmapNode(object):
+    """A trie node. `entries` holds one item per set bit of `bitmap`: either a
+    (key, value) tuple or a child node."""
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap: int, entries: List[Any]) -> None:
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def find(self, shift: int, key_hash: int, key: Any, default: Any) -> Any:
+        bit = 1 << ((key_hash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return default
+        entry = self.entries[_bit_index(self.bitmap, bit)]
+        if type(entry) is tuple:
+            return entry[1] if entry[0] == key else default
+        return entry.find(shift + BITS, key_hash, key, default)
+
+    def assoc(
+        self, shift: int, key_hash: int, key: Any, value: Any
+    ) -> Tuple["_BitmapNode", bool]:
+        bit = 1 << ((key_hash >> shift) & MASK)
+        index = _bit_index(self.bitmap, bit)
+        if not self.bitmap & bit:
+            entries = self.entries[:]
+            entries.insert(index, (key, value))
+            return _BitmapNode(self.bitmap | bit, entries), True
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            if entry[0] == key:
+                if entry[1] is value:
+                    return self, False
+                node, added = (key, value), False
+            else:
+                node, added = _merge(shift + BITS, entry, (key, value), key_hash), True
+        else:
+            node, added = entry.assoc(shift + BITS, key_hash, key, value)
+            if node is entry:
+                return self, False
+        entries = self.entries[:]
+        entries[index] = node
+        return _BitmapNode(self.bitmap, entries), added
+
+    def dissoc(self, shift: int, key_hash: int, key: Any) -> Optional["_BitmapNode"]:
+        bit = 1 << ((key_hash >> shift) & MASK)
+        if not self.bitmap & bit:
+            return self
+        index = _bit_index(self.bitmap, bit)
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            if entry[0] != key:
+                return self
+            node = None
+        else:
+            node = entry.dissoc(shift + BITS, key_hash, key)
+            if node is entry:
+                return self
+        entries = self.entries[:]
+        if node is not None:
+            entries[index] = node
+            return _BitmapNode(self.bitmap, entries)
+        if self.bitmap == bit:
+            return None
+        del entries[index]
+        return _BitmapNode(self.bitmap ^ bit, entries)
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        for entry in self.entries:
+            if type(entry) is tuple:
+                yield entry
+            else:
+                yield from entry.items()
+
+
+class _CollisionNode(object):
+    """Holds the (key, value) pairs of keys whose hashes are equal."""
+
+    __slots__ = ("key_hash", "pairs")
+
+    def __init__(self, key_hash: int, pairs: List[Tuple[Any, Any]]) -> None:
+        self.key_hash = key_hash
+        self.pairs = pairs
+
+    def find(self, shift: int, key_hash: int, key: Any, default: Any) -> Any:
+        for k, v in self.pairs:
+            if k == key:
+                return v
+        return default
+
+    def assoc(
+        self, shift: int, key_hash: int, key: Any, value: Any
+    ) -> Tuple[Any, bool]:
+        if key_hash != self.key_hash:
+            bit = 1 << ((self.key_hash >> shift) & MASK)
+            return _BitmapNode(bit, [self]).assoc(shift, key_hash, key, value)
+        pairs = self.pairs[:]
+        for i, (k, _) in enumerate(pairs):
+            if k == key:
+                pairs[i] = (key, value)
+                return _CollisionNode(key_hash, pairs), False
+        pairs.append((key, value))
+        return _CollisionNode(key_hash, pairs), True
+
+    def dissoc(self, shift: int, key_hash: int, key: Any) -> Any:
+        pairs = [pair for pair in self.pairs if pair[0] != key]
+        if len(pairs) == len(self.pairs):
+            return self
+        if len(pairs) == 1:
+            bit = 1 << ((self.key_hash >> shift) & MASK)
+            return _BitmapNode(bit, pairs)
+        return _CollisionNode(self.key_hash, pairs)
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        return iter(self.pairs)
+
+
+def _merge(shift: int, a: Tuple[Any, Any], b: Tuple[Any, Any], b_hash: int) -> Any:
+    a_hash = _hash(a[0])
+    if a_hash == b_hash:
+        return _CollisionNode(a_hash, [a, b])
+    a_bit = (a_hash >> shift) & MASK
+    b_bit = (b_hash >> shift) & MASK
+    if a_bit == b_bit:
+        return _BitmapNode(1 << a_bit, [_merge(shift + BITS, a, b, b_hash)])
+    entries = [a, b] if a_bit < b_bit else [b, a]
+    return _BitmapNode((1 << a_bit) | (1 << b_bit), entries)
+
+
+_EMPTY_NODE = _BitmapNode(0, [])
+_MISSING = object()
+
+
+class PersistentHashMap(Mapping):
+    __slots__ = ("_count", "_root")
+
+    def __init__(self, count: int = 0, root: _BitmapNode = _EMPTY_NODE) -> None:
+        self._count = count
+        self._root = root
+
+    @staticmethod
+    def from_items(items: Any) -> "PersistentHashMap":
+        result = PersistentHashMap()
+        for key, value in items:
+            result = result.assoc(key, value)
+        return result
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._root.find(0, _hash(key), key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self._root.find(0, _hash(key), key, default)
+
+    def __contains__(self, key: Any) -> bool:
+        return self._root.find(0, _hash(key), key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[Any]:
+        for key, _ in self._root.items():
+            yield key
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:  # type: ignore
+        return self._root.items()
+
+    def values(self) -> Iterator[Any]:  # type: ignore
+        for _, value in self._root.items():
+            yield value
+
+    def assoc(self, key: Any, value: Any) -> "PersistentHashMap":
+        """Return a new map with `key` bound to `value`."""
+        root, added = self._root.assoc(0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return PersistentHashMap(self._count + 1 if added else self._count, root)
+
+    def dissoc(self, key: Any) -> "PersistentHashMap":
+        """Return a new map without `key`."""
+        root = self._root.dissoc(0, _hash(key), key)
+        if root is self._root:
+            return self
+        return PersistentHashMap(self._count - 1, root or _EMPTY_NODE)
@@ -0,0 +1,132 @@
+"""Sampling profiler for mal programs.
+
+A SIGPROF timer interrupts the program and the profiler walks the Python
+stack for the frames of mal function bodies, so that code runs exactly as
+fast with the profiler as without it until a sample is taken. Each mal frame
+is labelled with the function's def! name and, when it was entered by a call
+read from a file, the position of that call. A tail call replaces its
+caller's frame, so it shows up in place of the caller. The samples are
+reported as collapsed stacks, which flamegraph.pl and speedscope read, and as
+a table of the self and total time of each function."""
+
+import signal
+import sys
+import time
+from collections import Counter
+from typing import IO, Any, Counter as CounterType, List, Optional, Tuple
+
+import reader
+from mal_types import MalFunctionRaw
+
+Position = Optional[Tuple[str, int, int]]
+Frame = Tuple[MalFunctionRaw, Position]
+
+
+class Profiler(object):
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.samples: CounterType[Tuple[Frame, ...]] = Counter()
+        # The timer may fire less often than asked, so each sample is also
+        # weighted by the CPU time since the one before.
+        self.times: CounterType[Tuple[Frame, ...]] = Counter()
+        self._last = 0.0
+
+    def start(self) -> None:
+        self._last = time.process_time()
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def _sample(self, signum: int, frame: Any) -> None:
+        now = time.process_time()
+        stack = mal_stack(frame)
+        self.samples[stack] += 1
+        self.times[stack] += now - self._last
+        self._last = now
+
+    def collapsed(self) -> List[str]:
+        """Return the samples as collapsed stacks, outermost frame first."""
+        counts: CounterType[str] = Counter()
+        for stack, count in self.samples.items():
+            frames = [frame_label(f, position) for f, position in stack]
+            counts[";".join(["mal"] + frames)] += count
+        return ["%s %d" % (stack, count) for stack, count in sorted(counts.items())]
+
+    def table(self, top: int = 20) -> List[str]:
+        """Return the `top` functions with the most self time, with their
+        self and total time."""
+        self_times: CounterType[str] = Counter()
+        total_times: CounterType[str] = Counter()
+        for stack, seconds in self.times.items():
+            names = [function_name(f) for f, _ in stack] or ["(top level)"]
+            self_times[names[-1]] += seconds
+            for name in set(names):
+                total_times[name] += seconds
+        total = sum(self.times.values()) or 1.0
+        lines = [
+            "%8s %6s %8s %6s  %s" % ("self ms", "self", "total ms", "total", "function")
+        ]
+        for name, seconds in self_times.most_common(top):
+            lines.append(
+                "%8.1f %5.1f%% %8.1f %5.1f%%  %s"
+                % (
+                    seconds * 1000,
+                    100 * seconds / total,
+                    total_times[name] * 1000,
+                    100 * total_times[name] / total,
+                    name,
+                )
+            )
+        return lines
+
+    def report(self, folded: IO[str], out: IO[str] = sys.stderr) -> None:
+        """Write the collapsed stacks to `folded` and the table to `out`."""
+        for line in self.collapsed():
+            folded.write(line + "\n")
+        for line in self.table():
+            out.write(line + "\n")
+
+
+def mal_stack(frame: Any) -> Tuple[Frame, ...]:
+    """Return the mal functions running in the Python stack ending at `frame`,
+    outermost first.
+
+    A mal function runs in the frame of its entry closure, which has the
+    function in its variable `f`. The call closure made by stepA's make_call
+    that entered it has the same function in `f` and the call's position in
+    `position`."""
+    stack: List[Frame] = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "entry":
+            f = frame.f_locals.get("f")
+            if isinstance(f, MalFunctionRaw) and f.entry().__code__ is code:
+                position = None
+                caller = frame.f_back
+                if caller is not None and caller.f_code.co_name == "call":
+                    caller_locals = caller.f_locals
+                    if caller_locals.get("f") is f:
+                        position = caller_locals.get("position")
+                stack.append((f, position))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def function_name(f: MalFunctionRaw) -> str:
+    name = f.name()
+    if name is not None:
+        return name
+    position = reader.SOURCE_MAP.lookup(f.ast())
+    if position is None:
+        return "(fn*)"
+    return "(fn* %s:%d)" % position[:2]
+
+
+def frame_label(f: MalFunctionRaw, position: Position) -> str:
+    if position is None:
+        return function_name(f)
+    return "%s@%s:%d" % ((function_name(f),) + position[:2])
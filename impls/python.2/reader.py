@@ -1,201 +1,390 @@
-from typing import Dict
-
-from arpeggio import (  # type: ignore
-    ParserPython,
-    PTNodeVisitor,
-    visit_parse_tree,
-    ZeroOrMore,
-)
-from arpeggio import RegExMatch as _, NoMatch  # type: ignore
+import re
+import weakref
+from array import array
+from typing import IO, Dict, Iterable, Iterator, List, Match, Optional, Tuple, Union
 
 from mal_types import (
+    NIL,
+    TRUE,
+    FALSE,
     MalExpression,
     MalInt,
     MalList,
-    MalBoolean,
-    MalNil,
     MalVector,
     MalHash_map,
 )
 from mal_types import MalSymbol, MalString, MalSyntaxException
 
-
-# Arpeggio grammar
-def mExpression():
-    return [
-        mQuotedExpression,
-        mQuasiQuotedExpression,
-        mSpliceUnquotedExpression,
-        mUnquotedExpression,
-        mDerefExpression,
-        mList,
-        mVector,
-        mHash_map,
-        mInt,
-        mString,
-        mKeyword,
-        mNil,
-        mBoolean,
-        mSymbol,
-    ]
-
-
-def mQuotedExpression():
-    return "'", mExpression
-
-
-def mQuasiQuotedExpression():
-    return "`", mExpression
-
-
-def mSpliceUnquotedExpression():
-    return "~@", mExpression
-
-
-def mUnquotedExpression():
-    return "~", mExpression
-
-
-def mDerefExpression():
-    return "@", mExpression
-
-
-def mList():
-    return "(", ZeroOrMore(mExpression), ")"
-
-
-def mVector():
-    return "[", ZeroOrMore(mExpression), "]"
-
-
-def mHash_map():
-    return ("{", ZeroOrMore(mExpression), "}")
-
-
-def mInt():
-    return _(r"-?[0123456789]+")
-
-
-def mString():
-    return _(r""""(?:\\.|[^\\"])*"?""")
-
-
-def mKeyword():
-    return _(r""":[^\s\[\]{}('"`,;)]*""")
-
-
-def mSymbol():
-    return _(r"""[^\s\[\]{}('"`,;)]*""")
-
-
-def mNil():
-    return _(r"""nil(?!\?)""")
-
-
-def mBoolean():
-    return _(r"""(true|false)(?!\?)""")
-
-
-class ReadASTVisitor(PTNodeVisitor):
-    def visit_mExpression(self, node, children) -> MalExpression:
-        return children[0]  # children should already be Mal types
-
-    def visit_mInt(self, node, children) -> MalInt:
-        return MalInt(int(node.value))
-
-    def visit_mString(self, node, children) -> MalString:
-        # node.value will have quotes, escape sequences
-        assert type(node.value) is str
-        if node.value[0] != '"':
-            raise Exception("internal error: parsed a string with no start quote")
-        val: str = node.value
-        if len(val) < 2 or val[-1] != '"':
-            raise MalSyntaxException("unbalanced string")
-        val = val[1:-1]  # remove outer quotes
-
-        # handle escaped characters
-        i = 0
-        result = ""
-        while i < len(val):
-            if val[i] == "\\":
-                if (i + 1) < len(val):
-                    if val[i + 1] == "n":
-                        result += "\n"
-                    elif val[i + 1] == "\\":
-                        result += "\\"
-                    elif val[i + 1] == '"':
-                        result += '"'
-                    i += 2
-                else:
-                    raise MalSyntaxException(
-                        "unbalanced string or invalid escape sequence"
-                    )
-            else:
-                result += val[i]
-                i += 1
-
-        return MalString(result)
-
-    def visit_mKeyword(self, node, children) -> MalString:
-        assert type(node.value) is str
-        assert len(node.value) > 1
-        return MalString(node.value[1:], keyword=True)
-
-    def visit_mList(self, node, children) -> MalList:
-        return MalList(children)
-
-    def visit_mVector(self, node, children) -> MalVector:
-        return MalVector(children)
-
-    def visit_mHash_map(self, node, children):
-        assert len(children) % 2 == 0
+# Token patterns. The reader accepts the same grammar as the Arpeggio one it
+# replaced, so these are the regular expressions of that grammar.
+WHITESPACE = re.compile(r"(?:[\t\n\r ,]+|;.*)*")
+INT = re.compile(r"-?[0123456789]+")
+STRING = re.compile(r""""(?:\\.|[^\\"])*"?""")
+KEYWORD = re.compile(r""":[^\s\[\]{}('"`,;)]*""")
+SYMBOL = re.compile(r"""[^\s\[\]{}('"`,;)]+""")
+NIL_TOKEN = re.compile(r"""nil(?!\?)""")
+BOOLEAN = re.compile(r"""(true|false)(?!\?)""")
+ESCAPE = re.compile(r"\\(.?)", re.DOTALL)
+
+ESCAPES = {"n": "\n", "\\": "\\", '"': '"'}
+
+QUOTE = MalSymbol("quote")
+QUASIQUOTE = MalSymbol("quasiquote")
+SPLICE_UNQUOTE = MalSymbol("splice-unquote")
+UNQUOTE = MalSymbol("unquote")
+DEREF = MalSymbol("deref")
+
+
+class _FormRef(weakref.ref):
+    """A weak reference to a source-mapped form that knows the form's row and
+    id, so one callback can free the row of any form."""
+
+    __slots__ = ("row", "key")
+
+
+class SourceMap(object):
+    """Where list forms read from files start, in a table beside the forms
+    rather than in them: rows are found by the id of the form. The table holds
+    its forms weakly, so the forms of a reloaded file or of a macro expansion
+    that are no longer used are not kept alive by it; a row is freed for reuse
+    when its form is collected, before the id can be reused."""
+
+    __slots__ = (
+        "_refs",
+        "_free",
+        "_collected",
+        "_files",
+        "_lines",
+        "_columns",
+        "_names",
+        "_indices",
+    )
+
+    def __init__(self) -> None:
+        self._refs: Dict[int, _FormRef] = {}
+        self._free: List[int] = []
+        self._collected = self._remove
+        self._files = array("l")
+        self._lines = array("l")
+        self._columns = array("l")
+        self._names: List[str] = []
+        self._indices: Dict[str, int] = {}
+
+    def file_index(self, name: str) -> int:
+        index = self._indices.get(name)
+        if index is None:
+            index = self._indices[name] = len(self._names)
+            self._names.append(name)
+        return index
+
+    def add(self, form: MalList, file: int, line: int, column: int) -> None:
+        ref = _FormRef(form, self._collected)
+        ref.key = id(form)
+        if self._free:
+            ref.row = row = self._free.pop()
+            self._files[row] = file
+            self._lines[row] = line
+            self._columns[row] = column
+        else:
+            ref.row = len(self._files)
+            self._files.append(file)
+            self._lines.append(line)
+            self._columns.append(column)
+        self._refs[ref.key] = ref
+
+    def _remove(self, ref: _FormRef) -> None:
+        del self._refs[ref.key]
+        self._free.append(ref.row)
+
+    def inherit(self, form: MalExpression, origin: MalExpression) -> None:
+        """Give `form`, made from `origin`, the position of `origin`. Only
+        lists have positions, so other forms are left out."""
+        ref = self._refs.get(id(origin))
+        if ref is not None and isinstance(form, MalList) and id(form) not in self._refs:
+            row = ref.row
+            self.add(form, self._files[row], self._lines[row], self._columns[row])
+
+    def lookup(self, form: MalExpression) -> Optional[Tuple[str, int, int]]:
+        ref = self._refs.get(id(form))
+        if ref is None:
+            return None
+        row = ref.row
+        return self._names[self._files[row]], self._lines[row], self._columns[row]
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+
+SOURCE_MAP = SourceMap()
+
+
+class Reader(object):
+    """Recursive-descent reader over a string.
+
+    read_form returns None when no form can be read at the current position,
+    leaving the position unchanged, so that callers can try another
+    alternative. Errors inside a form, such as a bad string, are only raised
+    once the whole form has been read, so a form that is also unbalanced
+    reports that instead.
+
+    When given a file name, the reader records where each list starts in
+    SOURCE_MAP; `line` and `column` are then those of the start of `text`."""
+
+    __slots__ = (
+        "_text",
+        "_pos",
+        "_error",
+        "_file",
+        "_origin",
+        "_line",
+        "_line_pos",
+        "_line_start",
+    )
+
+    def __init__(
+        self,
+        text: str,
+        pos: int = 0,
+        name: Optional[str] = None,
+        line: int = 1,
+        column: int = 1,
+    ) -> None:
+        self._text = text
+        self._pos = pos
+        self._error: Optional[MalSyntaxException] = None
+        self._file = None if name is None else SOURCE_MAP.file_index(name)
+        # _line is the line number at offset _line_pos, whose line starts
+        # at offset _line_start
+        self._origin = (line, 0, 1 - column)
+        self._line, self._line_pos, self._line_start = self._origin
+
+    def error(self) -> Optional[MalSyntaxException]:
+        return self._error
+
+    def position(self) -> int:
+        return self._pos
+
+    def skip_whitespace(self) -> int:
+        """Skip whitespace and comments and return the new position."""
+        self._pos = WHITESPACE.match(self._text, self._pos).end()
+        return self._pos
+
+    def read_form(self) -> Optional[MalExpression]:
+        text = self._text
+        pos = WHITESPACE.match(text, self._pos).end()
+        self._pos = pos
+        if pos == len(text):
+            return None
+        form = self._read_form_at(text, pos, text[pos])
+        if form is None:
+            self._pos = pos
+        return form
+
+    def _read_form_at(self, text: str, pos: int, char: str) -> Optional[MalExpression]:
+        if char == "(":
+            if self._file is None:
+                items = self._read_sequence(")")
+                return None if items is None else MalList(items)
+            line, column = self.location(pos)
+            items = self._read_sequence(")")
+            if items is None:
+                return None
+            form = MalList(items)
+            SOURCE_MAP.add(form, self._file, line, column)
+            return form
+        if char == "[":
+            items = self._read_sequence("]")
+            return None if items is None else MalVector(items)
+        if char == "{":
+            items = self._read_sequence("}")
+            return None if items is None else self._make_hash_map(items)
+        if char == "'":
+            return self._read_macro(pos + 1, QUOTE)
+        if char == "`":
+            return self._read_macro(pos + 1, QUASIQUOTE)
+        if char == "~":
+            form = None
+            if text.startswith("~@", pos):
+                form = self._read_macro(pos + 2, SPLICE_UNQUOTE)
+            if form is None:
+                form = self._read_macro(pos + 1, UNQUOTE)
+            return form or self._read_symbol(text, pos)
+        if char == "@":
+            return self._read_macro(pos + 1, DEREF) or self._read_symbol(text, pos)
+        if char == '"':
+            return self._read_string(text, pos)
+        if char == ":":
+            match = KEYWORD.match(text, pos)
+            self._pos = match.end()
+            if len(match.group()) == 1:
+                self._fail("empty keyword")
+            return MalString(match.group()[1:], keyword=True)
+        if char == "-" or "0" <= char <= "9":
+            match = INT.match(text, pos)
+            if match is not None:
+                self._pos = match.end()
+                return MalInt(int(match.group()))
+        elif char == "n":
+            match = NIL_TOKEN.match(text, pos)
+            if match is not None:
+                self._pos = match.end()
+                return NIL
+        elif char == "t" or char == "f":
+            match = BOOLEAN.match(text, pos)
+            if match is not None:
+                self._pos = match.end()
+                return TRUE if match.group() == "true" else FALSE
+        return self._read_symbol(text, pos)
+
+    def location(self, pos: int) -> Tuple[int, int]:
+        """Return the line and column of offset `pos`."""
+        if pos < self._line_pos:
+            # after backtracking, count again from the start
+            self._line, self._line_pos, self._line_start = self._origin
+        newlines = self._text.count("\n", self._line_pos, pos)
+        if newlines:
+            self._line += newlines
+            self._line_start = self._text.rfind("\n", self._line_pos, pos) + 1
+        self._line_pos = pos
+        return self._line, pos - self._line_start + 1
+
+    def _read_symbol(self, text: str, pos: int) -> Optional[MalSymbol]:
+        match = SYMBOL.match(text, pos)
+        if match is None:
+            return None
+        self._pos = match.end()
+        return MalSymbol(match.group())
+
+    def _read_macro(self, pos: int, symbol: MalSymbol) -> Optional[MalList]:
+        error = self._error
+        self._pos = pos
+        form = self.read_form()
+        if form is None:
+            self._error = error
+            return None
+        return MalList([symbol, form])
+
+    def _read_sequence(self, close: str) -> Optional[List[MalExpression]]:
+        self._pos += 1
+        items: List[MalExpression] = []
+        form = self.read_form()
+        while form is not None:
+            items.append(form)
+            form = self.read_form()
+        if self._text.startswith(close, self._pos):
+            self._pos += 1
+            return items
+        return None
+
+    def _make_hash_map(self, items: List[MalExpression]) -> MalHash_map:
+        if len(items) % 2 != 0:
+            self._fail("odd number of forms in hash-map")
         dict = {}  # type: Dict[MalExpression, MalExpression]
-        for i in range(0, len(children), 2):
-            assert isinstance(children[i], MalString)
-            dict[children[i].native()] = children[i + 1]
+        for i in range(0, len(items) - 1, 2):
+            dict[items[i]] = items[i + 1]
         return MalHash_map(dict)
 
-    def visit_mSymbol(self, node, children) -> MalSymbol:
-        return MalSymbol(node.value)
-
-    def visit_mBoolean(self, node, children) -> MalBoolean:
-        if node.value == "true":
-            return MalBoolean(True)
-        if node.value == "false":
-            return MalBoolean(False)
-        raise Exception("Internal reader error")
-
-    def visit_mNil(self, node, children) -> MalNil:
-        return MalNil()
-
-    def visit_mQuotedExpression(self, node, children) -> MalList:
-        return MalList([MalSymbol("quote"), children[0]])
-
-    def visit_mQuasiQuotedExpression(self, node, children) -> MalList:
-        return MalList([MalSymbol("quasiquote"), children[0]])
-
-    def visit_mSpliceUnquotedExpression(self, node, children) -> MalList:
-        return MalList([MalSymbol("splice-unquote"), children[0]])
-
-    def visit_mUnquotedExpression(self, node, children) -> MalList:
-        return MalList([MalSymbol("unquote"), children[0]])
-
-    def visit_mDerefExpression(self, node, children) -> MalList:
-        return MalList([MalSymbol("deref"), children[0]])
+    def _read_string(self, text: str, pos: int) -> MalString:
+        # the token keeps its quotes; a missing closing quote is an error
+        match = STRING.match(text, pos)
+        self._pos = match.end()
+        val = match.group()
+        if len(val) < 2 or val[-1] != '"':
+            self._fail("unbalanced string")
+            return MalString("")
+        val = val[1:-1]
+        if "\\" in val:
+            val = ESCAPE.sub(self._unescape, val)
+        return MalString(val)
 
+    def _unescape(self, match: Match[str]) -> str:
+        char = match.group(1)
+        if not char:
+            self._fail("unbalanced string or invalid escape sequence")
+        return ESCAPES.get(char, "")
 
-def comment():
-    return _(";.*")
+    def _fail(self, message: str) -> None:
+        if self._error is None:
+            self._error = MalSyntaxException(message)
 
 
 def read(x: str) -> MalExpression:
     """Parse a string into a MalExpression"""
-    reader = ParserPython(mExpression, comment_def=comment, ws="\t\n\r ,", debug=False)
-
-    try:
-        parsed = visit_parse_tree(reader.parse(x), ReadASTVisitor())
-        assert issubclass(type(parsed), MalExpression)
-        return parsed
-    except NoMatch as e:
-        # print(str(e))
+    reader = Reader(x)
+    parsed = reader.read_form()
+    if parsed is None:
         raise MalSyntaxException("invalid syntax or unexpected EOF")
+    error = reader.error()
+    if error is not None:
+        raise error
+    return parsed
+
+
+# How many characters read_forms reads from a file at a time
+CHUNK_SIZE = 65536
+
+
+def read_forms(
+    source: Union[str, IO[str], Iterable[str]], name: Optional[str] = None
+) -> Iterator[MalExpression]:
+    """Read the top-level forms of `source` one at a time.
+
+    `source` may be a string, a file object or an iterable of strings such as
+    the lines of a file; only as much of it is consumed as is needed to read
+    the next form. Syntax errors give the name, line and column where the
+    offending form starts. If `name` is given, the positions of the lists
+    read are recorded in SOURCE_MAP."""
+    if isinstance(source, str):
+        chunks: Iterator[str] = iter([source])
+    elif hasattr(source, "read"):
+        chunks = iter(lambda: source.read(CHUNK_SIZE), "")  # type: ignore
+    else:
+        chunks = iter(source)
+    text = ""
+    reader = Reader(text, 0, name)
+    exhausted = False
+    while True:
+        skipped = reader.position()
+        start = reader.skip_whitespace()
+        if start < len(text):
+            form = reader.read_form()
+            # a form that reaches the end of the text may go on in the next chunk
+            if form is not None and (reader.position() < len(text) or exhausted):
+                error = reader.error()
+                if error is not None:
+                    raise _located(error, name, reader.location(start))
+                yield form
+                continue
+            if exhausted:
+                error = MalSyntaxException("invalid syntax or unexpected EOF")
+                raise _located(error, name, reader.location(start))
+        elif exhausted:
+            return
+        else:
+            # whitespace that reaches the end of the text may end in a comment
+            # that goes on in the next chunk, so it is skipped again then
+            start = skipped
+
+        # drop what has been read and read at least as much again as is left
+        line, column = reader.location(start)
+        pending = [text[start:]]
+        size = len(pending[0])
+        while not exhausted and size <= len(pending[0]):
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+            else:
+                pending.append(chunk)
+                size += len(chunk)
+        text = "".join(pending)
+        reader = Reader(text, 0, name, line, column)
+
+
+def _located(
+    error: MalSyntaxException, name: Optional[str], location: Tuple[int, int]
+) -> MalSyntaxException:
+    message = error.native().unreadable_str()
+    line, column = location
+    return MalSyntaxException(
+        "%s (%s:%d:%d)" % (message, name or "<string>", line, column)
+    )
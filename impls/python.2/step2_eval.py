@@ -42,9 +42,9 @@ def EVAL(ast: MalExpression, env: Dict[str, MalFunctionCompiled]) -> MalExpressi
         return eval_ast(ast, env)
     if len(ast.native()) == 0:
         return ast
-    eval_result = eval_ast(ast, env)
-    f = eval_result.native()[0]
-    args = eval_result.native()[1:]
+    forms = ast.native()
+    f = EVAL(forms[0], env)
+    args = [EVAL(forms[i], env) for i in range(1, len(forms))]
     return f.call(args)
 
 
@@ -65,9 +65,8 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
             let_env.set(str(bindings_list[i]), EVAL(bindings_list[i + 1], let_env))
         expr = rest[1]
         return EVAL(expr, let_env)
-    evaled_ast = eval_ast(ast, env)
-    f = evaled_ast.native()[0]
-    args = evaled_ast.native()[1:]
+    f = EVAL(ast.native()[0], env)
+    args = [EVAL(x, env) for x in rest]
     try:
         return f.call(args)
     except AttributeError:
@@ -93,9 +93,8 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
 
         return MalFunctionCompiled(func_body)
 
-    evaled_ast = eval_ast(ast, env)
-    f = evaled_ast.native()[0]
-    args = evaled_ast.native()[1:]
+    f = EVAL(ast.native()[0], env)
+    args = [EVAL(x, env) for x in rest]
     try:
         return f.call(args)
     except AttributeError:
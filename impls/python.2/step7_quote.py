@@ -160,17 +160,11 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
             ast = quasiquote(ast_native[1])
             continue
         else:
-            evaled_ast = eval_ast(ast, env)
-            f = evaled_ast.native()[0]
-            args = evaled_ast.native()[1:]
+            f = EVAL(ast_native[0], env)
+            args = [EVAL(ast_native[i], env) for i in range(1, len(ast_native))]
             if isinstance(f, MalFunctionRaw):
                 ast = f.ast()
-
-                env = Env(
-                    outer=f.env(),
-                    binds=f.params().native(),
-                    exprs=evaled_ast.native()[1:],
-                )
+                env = Env(outer=f.env(), binds=f.params().native(), exprs=args)
                 continue
             elif isinstance(f, MalFunctionCompiled):
                 return f.call(args)
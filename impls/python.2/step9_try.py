@@ -1,7 +1,7 @@
 import functools
 import readline
 import sys
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import core
 import reader
@@ -165,17 +165,11 @@ def EVAL(ast: MalExpression, env: Env) -> MalExpression:
                 ast = catch_block.native()[2]
                 continue
         else:
-            evaled_ast = eval_ast(ast, env)
-            f = evaled_ast.native()[0]
-            args = evaled_ast.native()[1:]
+            f = EVAL(ast_native[0], env)
+            args = [EVAL(ast_native[i], env) for i in range(1, len(ast_native))]
             if isinstance(f, MalFunctionRaw):
                 ast = f.ast()
-
-                env = Env(
-                    outer=f.env(),
-                    binds=f.params().native(),
-                    exprs=evaled_ast.native()[1:],
-                )
+                env = Env(outer=f.env(), binds=f.params().native(), exprs=args)
                 continue
             elif isinstance(f, MalFunctionCompiled):
                 return f.call(args)
@@ -226,29 +220,37 @@ def init_repl_env() -> Env:
     return repl_env
 
 
+def macro_for(ast: MalExpression, env: Env) -> Optional[MalExpression]:
+    """Return the macro that ast is a call to, or None if it is not a macro
+    call. Nothing is raised on the way: this runs for every form evaluated."""
+    if not isinstance(ast, MalList):
+        return None
+    values = ast.native()
+    if not values or not isinstance(values[0], MalSymbol):
+        return None
+    x = env.lookup_or_none(values[0].native())
+    if (isinstance(x, MalFunctionRaw) or isinstance(x, MalFunctionCompiled)) and (
+        x.is_macro()
+    ):
+        return x
+    return None
+
+
 def is_macro_call(ast: MalExpression, env: Env) -> bool:
-    try:
-        x = env.get(ast.native()[0].native())
-        try:
-            assert isinstance(x, MalFunctionRaw) or isinstance(x, MalFunctionCompiled)
-        except AssertionError:
-            return False
-        return x.is_macro()  # type: ignore
-    except (TypeError, MalUnknownSymbolException, AttributeError, IndexError, KeyError):
-        return False
+    return macro_for(ast, env) is not None
 
 
 def macroexpand(ast: MalExpression, env: Env) -> MalExpression:
     while True:
-        if not is_macro_call(ast, env):
+        macro_func = macro_for(ast, env)
+        if macro_func is None:
             return ast
         assert isinstance(ast, MalList)
-        macro_func = env.get(ast.native()[0].native())
-        assert isinstance(macro_func, MalFunctionRaw) or isinstance(
-            macro_func, MalFunctionCompiled
-        )
-        ast = macro_func.call(ast.native()[1:])
-        continue
+        expanded = ast.expansion(macro_func)
+        if expanded is None:
+            expanded = macro_func.call(ast.native()[1:])
+            ast.set_expansion(macro_func, expanded)
+        ast = expanded
 
 
 def rep_handling_exceptions(line: str, repl_env: Env) -> str:
@@ -1,55 +1,55 @@
+import atexit
 import functools
+import os
 import readline
 import sys
-from typing import List, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import core
+import native_lib
+import profiler
 import reader
-from env import Env
+from env import Env, Scope
 from mal_types import (
+    NIL,
+    FALSE,
     MalExpression,
     MalSymbol,
     MalException,
     MalList,
-    MalNil,
-    MalBoolean,
     MalFunctionCompiled,
     MalFunctionRaw,
     MalVector,
     MalHash_map,
+    MalLazySeq,
     MalUnknownSymbolException,
     MalInvalidArgumentException,
     MalString,
 )
 
+# Symbols are interned, so these are compared with the forms read by identity.
+AMPERSAND = MalSymbol("&")
+CATCH = MalSymbol("catch*")
+CONCAT = MalSymbol("concat")
+CONS = MalSymbol("cons")
+IF = MalSymbol("if")
+QUOTE = MalSymbol("quote")
+SPLICE_UNQUOTE = MalSymbol("splice-unquote")
+UNQUOTE = MalSymbol("unquote")
+VEC = MalSymbol("vec")
+
 
 def READ(x: str) -> MalExpression:
     return reader.read(x)
 
 
-def eval_ast(ast: MalExpression, env: Env) -> MalExpression:
-    if isinstance(ast, MalSymbol):
-        return env.get(ast)
-    if isinstance(ast, MalList):
-        return MalList([EVAL(x, env) for x in ast.native()])
-    if isinstance(ast, MalVector):
-        return MalVector([EVAL(x, env) for x in ast.native()])
-    if isinstance(ast, MalHash_map):
-        new_dict = {}  # type: Dict[str, MalExpression]
-        for key in ast.native():
-            new_dict[key] = EVAL(ast.native()[key], env)
-        return MalHash_map(new_dict)
-    return ast
-
-
 def qq_loop(acc: MalList, elt: MalExpression) -> MalList:
     if isinstance(elt, MalList):
         lst = elt.native()
         if len(lst) == 2:
-            fst = lst[0]
-            if isinstance(fst, MalSymbol) and fst.native() == u"splice-unquote":
-                return MalList([MalSymbol(u"concat"), lst[1], acc])
-    return MalList([MalSymbol(u"cons"), quasiquote(elt), acc])
+            if lst[0] is SPLICE_UNQUOTE:
+                return MalList([CONCAT, lst[1], acc])
+    return MalList([CONS, quasiquote(elt), acc])
 
 def qq_foldr(xs: List[MalExpression]) -> MalList:
     return functools.reduce(qq_loop, reversed(xs), MalList([]))
@@ -58,133 +58,622 @@ def quasiquote(ast: MalExpression) -> MalExpression:
     if isinstance(ast, MalList):
         lst = ast.native()
         if len(lst) == 2:
-            fst = lst[0]
-            if isinstance(fst, MalSymbol) and fst.native() == u'unquote':
+            if lst[0] is UNQUOTE:
                 return lst[1]
         return qq_foldr(lst)
     elif isinstance(ast, MalVector):
-        return MalList([MalSymbol("vec"), qq_foldr(ast.native())])
+        return MalList([VEC, qq_foldr(ast.native())])
     elif isinstance(ast, MalSymbol) or isinstance(ast, MalHash_map):
-        return MalList([MalSymbol("quote"), ast])
+        return MalList([QUOTE, ast])
     else:
         return ast
 
 
-def EVAL(ast: MalExpression, env: Env) -> MalExpression:
-    while True:
-        # print("EVAL: " + str(ast))
-        ast = macroexpand(ast, env)
-        ast_native = ast.native()
-        if not isinstance(ast, MalList):
-            return eval_ast(ast, env)
-        elif len(ast_native) == 0:
-            return ast
+# The evaluator works in two stages. analyze() turns a form into a tree of
+# Python closures ("code"), with special forms, macro calls, call sites and
+# the addresses of local variables resolved once; EVAL then only has to run
+# that tree. Code is run in a frame (see env.Scope), or in the global Env
+# when it is not nested in any fn*, let* or catch*.
+#
+# Code compiled for a tail position may return a pending call instead of a
+# value: either an (entry, args) tuple for a function call, or a (code, frame)
+# tuple for the body of a let* or catch*. Whoever needs the value runs such
+# calls in a loop, as _trampoline() does, so mal tail calls do not grow the
+# Python stack. The hottest callers inline that loop to save a frame.
+Code = Callable[[Any], Any]
 
-        first_str = str(ast_native[0])
-        if first_str == "macroexpand":
-            return macroexpand(ast.native()[1], env)
-        elif first_str == "def!":
-            name: str = str(ast_native[1])
-            value: MalExpression = EVAL(ast_native[2], env)
-            return env.set(name, value)
-        if first_str == "defmacro!":
-            name = str(ast_native[1])
-            value = EVAL(ast_native[2], env)
-            assert isinstance(value, MalFunctionCompiled) or isinstance(
-                value, MalFunctionRaw
-            )
-            value.make_macro()
-            return env.set(name, value)
-        elif first_str == "let*":
-            assert len(ast_native) == 3
-            let_env = Env(env)
-            bindings: MalExpression = ast_native[1]
-            assert isinstance(bindings, MalList) or isinstance(bindings, MalVector)
-            bindings_list: List[MalExpression] = bindings.native()
-            assert len(bindings_list) % 2 == 0
-            for i in range(0, len(bindings_list), 2):
-                assert isinstance(bindings_list[i], MalSymbol)
-                assert isinstance(bindings_list[i + 1], MalExpression)
-                let_env.set(str(bindings_list[i]), EVAL(bindings_list[i + 1], let_env))
-            env = let_env
-            ast = ast_native[2]
-            continue
-        elif first_str == "do":
-            for x in range(1, len(ast_native) - 1):
-                EVAL(ast_native[x], env)
-            ast = ast_native[len(ast_native) - 1]
-            continue
-        elif first_str == "if":
-            condition = EVAL(ast_native[1], env)
-
-            if isinstance(condition, MalNil) or (
-                isinstance(condition, MalBoolean) and condition.native() is False
-            ):
-                if len(ast_native) >= 4:
-                    ast = ast_native[3]
-                    continue
-                else:
-                    return MalNil()
-            else:
-                ast = ast_native[2]
-                continue
-        elif first_str == "fn*":
-            raw_ast = ast_native[2]
-            raw_params = ast_native[1]
-
-            def fn(args: List[MalExpression]) -> MalExpression:
-                f_ast = raw_ast
-                f_env = Env(outer=env, binds=raw_params.native(), exprs=args)
-                return EVAL(f_ast, f_env)
-
-            return MalFunctionRaw(fn=fn, ast=raw_ast, params=raw_params, env=env)
-        elif first_str == "quote":
-            return (
-                MalList(ast_native[1].native())
-                if isinstance(ast_native[1], MalVector)
-                else ast_native[1]
-            )
-        elif first_str == "quasiquoteexpand":
-            return quasiquote(ast_native[1])
-        elif first_str == "quasiquote":
-            ast = quasiquote(ast_native[1])
-            continue
-        elif first_str == "try*":
+
+# Counts the defmacro!s run. Code analyzed before a defmacro! may have
+# expanded a macro that has since changed, or compiled a call to a name that
+# has since become a macro, so it compares this with the count at the time.
+macro_generation = 0
+
+
+class MacroCall(Exception):
+    """Raised instead of calling a function that has become a macro since the
+    call was analyzed; the call is then analyzed again as a macro call."""
+
+
+def _trampoline(result: Any) -> MalExpression:
+    while type(result) is tuple:
+        result = result[0](result[1])
+    return result
+
+
+def is_local(name: str, scope: Optional[Scope]) -> bool:
+    return scope is not None and scope.resolve(name) is not None
+
+
+def analyze(
+    ast: MalExpression,
+    repl_env: Env,
+    scope: Optional[Scope] = None,
+    tail: bool = False,
+) -> Code:
+    """Compile ast into code to be run in a frame for scope.
+
+    Names that are not bound in scope are looked up in repl_env, which is
+    also where macros are found at analysis time."""
+    if isinstance(ast, MalSymbol):
+        return analyze_symbol(ast.native(), repl_env, scope)
+    if isinstance(ast, MalVector):
+        codes = [analyze(x, repl_env, scope) for x in ast.native()]
+        return lambda env: MalVector([code(env) for code in codes])
+    if isinstance(ast, MalHash_map):
+        items = [(k, analyze(v, repl_env, scope)) for k, v in ast.native().items()]
+        return lambda env: MalHash_map({k: code(env) for k, code in items})
+    if isinstance(ast, MalList) and len(ast.native()) > 0:
+        return analyze_list(ast, repl_env, scope, tail)
+    return lambda env: ast
+
+
+def analyze_symbol(name: str, repl_env: Env, scope: Optional[Scope]) -> Code:
+    address = scope.resolve(name) if scope is not None else None
+    if address is None:
+        return lambda env: repl_env.get(name)
+    depth, slot, maybe_empty = address
+    if maybe_empty:
+        # Bound by a def! that may not have run yet.
+        def lookup_defined(env: Any) -> MalExpression:
+            for _ in range(depth):
+                env = env[0]
+            if env[slot] is None:
+                raise MalUnknownSymbolException(name)
+            return env[slot]
+
+        return lookup_defined
+    if depth == 0:
+        return lambda env: env[slot]
+    if depth == 1:
+        return lambda env: env[0][slot]
+    if depth == 2:
+        return lambda env: env[0][0][slot]
+
+    def lookup(env: Any) -> MalExpression:
+        for _ in range(depth):
+            env = env[0]
+        return env[slot]
+
+    return lookup
+
+
+def expand(ast: MalExpression, repl_env: Env, scope: Optional[Scope]) -> MalExpression:
+    """Expand ast for as long as it is a call to a macro bound in repl_env."""
+    while isinstance(ast, MalList) and len(ast.native()) > 0:
+        head = ast.native()[0]
+        if not isinstance(head, MalSymbol) or is_local(head.native(), scope):
+            break
+        macro = macro_for(ast, repl_env)
+        if macro is None:
+            break
+        expanded = ast.expansion(macro)
+        if expanded is None:
+            expanded = macro.call(ast.native()[1:])
+            ast.set_expansion(macro, expanded)
+        ast = expanded
+    return ast
+
+
+def is_special_form(ast: MalExpression, symbol: MalSymbol) -> bool:
+    return (
+        isinstance(ast, MalList) and len(ast.native()) > 0 and ast.native()[0] is symbol
+    )
+
+
+def analyze_list(
+    ast: MalList,
+    repl_env: Env,
+    scope: Optional[Scope],
+    tail: bool,
+    defer: bool = True,
+) -> Code:
+    expanded = expand(ast, repl_env, scope)
+    if expanded is not ast:
+        reader.SOURCE_MAP.inherit(expanded, ast)
+        return analyze(expanded, repl_env, scope, tail)
+    lst = ast.native()
+    head = lst[0]
+    if isinstance(head, MalSymbol):
+        special_form = special_forms.get(head)
+        if special_form is not None:
+            return special_form(lst, repl_env, scope, tail)
+        name = head.native()
+        if defer and not is_local(name, scope) and repl_env.find(name) is None:
+            # Unbound at analysis time: it may be a macro defined by an
+            # earlier form of the same top-level do, so analyze on first run.
+            return analyze_later(ast, repl_env, scope, tail)
+    arg_codes = [analyze(x, repl_env, scope) for x in lst[1:]]
+    position = reader.SOURCE_MAP.lookup(ast)
+    if isinstance(head, MalSymbol) and not is_local(head.native(), scope):
+        f_code = analyze_callee(head.native(), repl_env)
+        again = analyze_later(ast, repl_env, scope, tail)
+    else:
+        f_code = analyze(head, repl_env, scope)
+        again = None
+    if len(arg_codes) <= 2:
+        return make_short_call(f_code, arg_codes, tail, position, again)
+    return make_call(f_code, analyze_args(arg_codes), tail, position, again)
+
+
+def analyze_later(
+    ast: MalList, repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    """Code that analyzes the call ast when first run, with the macros
+    defined by then."""
+    code = None  # type: Optional[Code]
+
+    def later(env: Any) -> Any:
+        nonlocal code
+        if code is None:
+            code = analyze_list(ast, repl_env, scope, tail, defer=False)
+        if scope is not None and len(env) < scope.size():
+            # Frames made before the analysis lack its new slots.
+            env.extend([None] * (scope.size() - len(env)))
+        return code(env)
+
+    return later
+
+
+def analyze_callee(name: str, repl_env: Env) -> Code:
+    """Look up the global function of a call, raising MacroCall if a
+    defmacro! has made it a macro since the call was analyzed."""
+    generation = macro_generation
+
+    def callee(env: Any) -> MalExpression:
+        nonlocal generation
+        f = repl_env.get(name)
+        if generation != macro_generation:
+            if isinstance(f, (MalFunctionCompiled, MalFunctionRaw)) and f.is_macro():
+                raise MacroCall()
+            generation = macro_generation
+        return f
+
+    return callee
+
+
+def analyze_args(codes: List[Code]) -> Callable[[Any], List[MalExpression]]:
+    if len(codes) == 0:
+        return lambda env: []
+    if len(codes) == 1:
+        a0 = codes[0]
+        return lambda env: [a0(env)]
+    if len(codes) == 2:
+        a0, a1 = codes
+        return lambda env: [a0(env), a1(env)]
+    if len(codes) == 3:
+        a0, a1, a2 = codes
+        return lambda env: [a0(env), a1(env), a2(env)]
+    return lambda env: [code(env) for code in codes]
+
+
+def make_call(
+    f_code: Code,
+    args_code: Callable[[Any], List[MalExpression]],
+    tail: bool,
+    position: Optional[Tuple[str, int, int]],
+    again: Optional[Code] = None,
+) -> Code:
+    # Exceptions passing through a call read from a file are given its
+    # position; the try statements cost nothing until something is raised.
+    # A call whose function has become a macro is run as `again`, the call
+    # analyzed anew.
+    if tail:
+
+        def tail_call(env: Any) -> Any:
             try:
-                return EVAL(ast_native[1], env)
+                f = f_code(env)
+                args = args_code(env)
+                if isinstance(f, MalFunctionRaw):
+                    return f.entry(), args
+                elif isinstance(f, MalFunctionCompiled):
+                    return f.call(args)
+                raise MalInvalidArgumentException(f, "not a function")
             except MalException as e:
-                if len(ast_native) < 3:
-                    raise e
-                catch_block = ast_native[2]
-                assert (
-                    isinstance(catch_block, MalList)
-                    and isinstance(catch_block.native()[0], MalSymbol)
-                    and str(catch_block.native()[0]) == "catch*"
-                    and len(catch_block.native()) == 3
-                )
-                exception_symbol = catch_block.native()[1]
-                assert isinstance(exception_symbol, MalSymbol)
-                env = Env(env)
-                env.set(str(exception_symbol), e.native())
-                ast = catch_block.native()[2]
-                continue
-        else:
-            evaled_ast = eval_ast(ast, env)
-            f = evaled_ast.native()[0]
-            args = evaled_ast.native()[1:]
+                if position is not None:
+                    e.add_position(position)
+                raise
+            except MacroCall:
+                assert again is not None
+                return again(env)
+
+        return tail_call
+
+    def call(env: Any) -> MalExpression:
+        try:
+            f = f_code(env)
             if isinstance(f, MalFunctionRaw):
-                ast = f.ast()
-
-                env = Env(
-                    outer=f.env(),
-                    binds=f.params().native(),
-                    exprs=evaled_ast.native()[1:],
-                )
-                continue
+                # The arguments are not kept in a local here, so that a loop
+                # walking a lazy sequence passed to it can free what it has
+                # walked past.
+                result = f.entry()(args_code(env))
+                while type(result) is tuple:
+                    result = result[0](result[1])
+                return result
             elif isinstance(f, MalFunctionCompiled):
-                return f.call(args)
-            else:
+                return f.call(args_code(env))
+            args_code(env)
+            raise MalInvalidArgumentException(f, "not a function")
+        except MalException as e:
+            if position is not None:
+                e.add_position(position)
+            raise
+        except MacroCall:
+            assert again is not None
+            return again(env)
+
+    return call
+
+
+def make_short_call(
+    f_code: Code,
+    arg_codes: List[Code],
+    tail: bool,
+    position: Optional[Tuple[str, int, int]],
+    again: Optional[Code] = None,
+) -> Code:
+    """make_call for calls with at most two arguments. Functions implemented
+    in Python are given the arguments one by one, with call0, call1 or call2,
+    so no list is made for them."""
+    n = len(arg_codes)
+    a0 = arg_codes[0] if n > 0 else None
+    a1 = arg_codes[1] if n > 1 else None
+    args_code = analyze_args(arg_codes)
+    if tail:
+
+        def tail_call(env: Any) -> Any:
+            try:
+                f = f_code(env)
+                if type(f) is MalFunctionCompiled:
+                    if n == 2:
+                        return f.call2(a0(env), a1(env))
+                    if n == 1:
+                        return f.call1(a0(env))
+                    return f.call0()
+                args = args_code(env)
+                if isinstance(f, MalFunctionRaw):
+                    return f.entry(), args
+                elif isinstance(f, MalFunctionCompiled):
+                    return f.call(args)
                 raise MalInvalidArgumentException(f, "not a function")
+            except MalException as e:
+                if position is not None:
+                    e.add_position(position)
+                raise
+            except MacroCall:
+                assert again is not None
+                return again(env)
+
+        return tail_call
+
+    def call(env: Any) -> MalExpression:
+        try:
+            f = f_code(env)
+            if type(f) is MalFunctionCompiled:
+                if n == 2:
+                    return f.call2(a0(env), a1(env))
+                if n == 1:
+                    return f.call1(a0(env))
+                return f.call0()
+            if isinstance(f, MalFunctionRaw):
+                result = f.entry()(args_code(env))
+                while type(result) is tuple:
+                    result = result[0](result[1])
+                return result
+            elif isinstance(f, MalFunctionCompiled):
+                return f.call(args_code(env))
+            args_code(env)
+            raise MalInvalidArgumentException(f, "not a function")
+        except MalException as e:
+            if position is not None:
+                e.add_position(position)
+            raise
+        except MacroCall:
+            assert again is not None
+            return again(env)
+
+    return call
+
+
+def analyze_def(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    assert isinstance(lst[1], MalSymbol)
+    name = lst[1].native()
+    value_code = analyze(lst[2], repl_env, scope)
+    if scope is None:
+
+        def define_global(env: Any) -> MalExpression:
+            value = value_code(env)
+            if isinstance(value, MalFunctionRaw):
+                value.set_name(name)
+            return env.set(name, value)
+
+        return define_global
+    slot = scope.define(name)
+
+    def define(env: Any) -> MalExpression:
+        value = env[slot] = value_code(env)
+        if isinstance(value, MalFunctionRaw):
+            value.set_name(name)
+        return value
+
+    return define
+
+
+def analyze_defmacro(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    value_code = analyze_def(lst, repl_env, scope, tail)
+
+    def defmacro(env: Any) -> MalExpression:
+        value = value_code(env)
+        assert isinstance(value, MalFunctionCompiled) or isinstance(
+            value, MalFunctionRaw
+        )
+        global macro_generation
+        value.make_macro()
+        macro_generation += 1
+        return value
+
+    return defmacro
+
+
+def analyze_let(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    assert len(lst) == 3
+    bindings = lst[1]
+    assert isinstance(bindings, MalList) or isinstance(bindings, MalVector)
+    bindings_list: List[MalExpression] = bindings.native()
+    assert len(bindings_list) % 2 == 0
+    block = Scope(scope, new_frame=False)
+    pairs = []
+    for i in range(0, len(bindings_list), 2):
+        assert isinstance(bindings_list[i], MalSymbol)
+        code = analyze(bindings_list[i + 1], repl_env, block)
+        pairs.append((block.bind(bindings_list[i].native()), code))
+    body = analyze(lst[2], repl_env, block, tail)
+
+    if block.is_frame():
+
+        def let_frame(env: Any) -> Any:
+            frame = [None] * block.size()
+            frame[0] = env
+            for slot, code in pairs:
+                frame[slot] = code(frame)
+            return (body, frame) if tail else body(frame)
+
+        return let_frame
+
+    def let(env: Any) -> Any:
+        for slot, code in pairs:
+            env[slot] = code(env)
+        return (body, env) if tail else body(env)
+
+    return let
+
+
+def analyze_do(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    if len(lst) == 1:
+        return lambda env: NIL
+    codes = [analyze(x, repl_env, scope) for x in lst[1:-1]]
+    last = analyze(lst[-1], repl_env, scope, tail)
+
+    def do(env: Any) -> Any:
+        for code in codes:
+            code(env)
+        return last(env)
+
+    return do
+
+
+def analyze_lazy_seq(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    """(lazy-seq body...) runs the body, as a do, when the sequence is first
+    walked; it should return a sequence or nil."""
+    body = analyze_do(lst, repl_env, scope, True)
+    return lambda env: MalLazySeq(lambda: _trampoline(body(env)))
+
+
+def analyze_if(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    # Chains of ifs in else position, as produced by cond, are run by a
+    # single loop instead of one nested closure call per clause.
+    clauses = []  # type: List[Tuple[Code, Code]]
+    while True:
+        clauses.append(
+            (
+                analyze(lst[1], repl_env, scope),
+                analyze(lst[2], repl_env, scope, tail),
+            )
+        )
+        if len(lst) < 4:
+            else_code = lambda env: NIL  # type: Code
+            break
+        else_form = expand(lst[3], repl_env, scope)
+        if not is_special_form(else_form, IF):
+            else_code = analyze(else_form, repl_env, scope, tail)
+            break
+        lst = else_form.native()
+
+    if len(clauses) == 1:
+        condition_code, then_code = clauses[0]
+
+        def if_(env: Any) -> Any:
+            condition = condition_code(env)
+            if condition is NIL or condition is FALSE:
+                return else_code(env)
+            return then_code(env)
+
+        return if_
+
+    def if_chain(env: Any) -> Any:
+        for condition_code, then_code in clauses:
+            condition = condition_code(env)
+            if condition is not NIL and condition is not FALSE:
+                return then_code(env)
+        return else_code(env)
+
+    return if_chain
+
+
+def analyze_fn(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    raw_ast = lst[2]
+    raw_params = lst[1]
+    assert isinstance(raw_params, MalList) or isinstance(raw_params, MalVector)
+    params = raw_params.native()
+    variadic = AMPERSAND in params
+    names = [x.native() for x in params if x is not AMPERSAND]
+    arity = len(names) - 1 if variadic else len(names)
+    # The body is shared by every closure made from this form. It is
+    # analyzed on the first call, once the macros it uses are defined, and
+    # again on the first call after a defmacro!, which may change them.
+    body = None  # type: Optional[Code]
+    padding = []  # type: List[None]
+    generation = -1
+
+    def fn(env: Any) -> MalExpression:
+        def entry(args: List[MalExpression]) -> Any:
+            nonlocal body, padding, generation
+            if generation != macro_generation:
+                fn_scope = Scope(scope)
+                for name in names:
+                    fn_scope.bind(name)
+                generation = macro_generation
+                body = analyze(raw_ast, repl_env, fn_scope, True)
+                padding = [None] * (fn_scope.size() - 1 - len(names))
+            if len(args) != arity or variadic:
+                if len(args) < arity:
+                    raise MalInvalidArgumentException(f, "too few arguments")
+                if variadic:
+                    args = args[:arity] + [MalList(args[arity:])]
+                else:
+                    args = args[:arity]
+            return body([env, *args, *padding])
+
+        def call(args: List[MalExpression]) -> MalExpression:
+            result = entry(args)
+            while type(result) is tuple:
+                result = result[0](result[1])
+            return result
+
+        f = MalFunctionRaw(
+            fn=call,
+            ast=raw_ast,
+            params=raw_params,
+            env=env,
+            entry=entry,
+        )
+        return f
+
+    return fn
+
+
+def analyze_quote(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    quoted = MalList(lst[1].native()) if isinstance(lst[1], MalVector) else lst[1]
+    return lambda env: quoted
+
+
+def analyze_quasiquote(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    return analyze(quasiquote(lst[1]), repl_env, scope, tail)
+
+
+def analyze_quasiquoteexpand(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    expansion = quasiquote(lst[1])
+    return lambda env: expansion
+
+
+def analyze_macroexpand(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    form = lst[1]
+    return lambda env: macroexpand(form, repl_env)
+
+
+def analyze_try(
+    lst: List[MalExpression], repl_env: Env, scope: Optional[Scope], tail: bool
+) -> Code:
+    if len(lst) < 3:
+        return analyze(lst[1], repl_env, scope, tail)
+    # The body is not in tail position, but is compiled as if it were and
+    # run to completion here, so that its own tail forms do not nest.
+    body = analyze(lst[1], repl_env, scope, True)
+    catch_block = lst[2]
+    assert (
+        isinstance(catch_block, MalList)
+        and catch_block.native()[0] is CATCH
+        and len(catch_block.native()) == 3
+    )
+    exception_symbol = catch_block.native()[1]
+    assert isinstance(exception_symbol, MalSymbol)
+    block = Scope(scope, new_frame=False)
+    slot = block.bind(exception_symbol.native())
+    handler = analyze(catch_block.native()[2], repl_env, block, tail)
+
+    def try_(env: Any) -> Any:
+        try:
+            return _trampoline(body(env))
+        except MalException as e:
+            if block.is_frame():
+                frame = [None] * block.size()
+                frame[0] = env
+                env = frame
+            env[slot] = e.native()
+            return (handler, env) if tail else handler(env)
+
+    return try_
+
+
+special_forms = {
+    MalSymbol("def!"): analyze_def,
+    MalSymbol("defmacro!"): analyze_defmacro,
+    MalSymbol("let*"): analyze_let,
+    MalSymbol("do"): analyze_do,
+    MalSymbol("lazy-seq"): analyze_lazy_seq,
+    IF: analyze_if,
+    MalSymbol("fn*"): analyze_fn,
+    QUOTE: analyze_quote,
+    MalSymbol("quasiquote"): analyze_quasiquote,
+    MalSymbol("quasiquoteexpand"): analyze_quasiquoteexpand,
+    MalSymbol("macroexpand"): analyze_macroexpand,
+    MalSymbol("try*"): analyze_try,
+}  # type: Dict[MalSymbol, Callable[[List[MalExpression], Env, Optional[Scope], bool], Code]]
+
+
+def EVAL(ast: MalExpression, env: Env) -> MalExpression:
+    return analyze(ast, env)(env)
 
 
 def PRINT(x: MalExpression) -> str:
@@ -195,24 +684,35 @@ def rep(x: str, env: Env) -> str:
     return PRINT(EVAL(READ(x), env))
 
 
-def init_repl_env() -> Env:
+def init_repl_env(native_lib_enabled: bool = True) -> Env:
+    """Make the global environment. Unless native_lib_enabled is False,
+    loading the impls/lib files of native_lib.LIBS replaces some of their
+    definitions with Python ones."""
+
     def eval_func(args: List[MalExpression], env: Env) -> MalExpression:
         a0 = args[0]
         assert isinstance(a0, MalExpression)
         return EVAL(a0, env)
 
+    def load_file(args: List[MalExpression], env: Env) -> MalExpression:
+        # evaluate each form as soon as it has been read
+        filename = args[0]
+        assert isinstance(filename, MalString)
+        with open(filename.native(), "r") as the_file:
+            for form in reader.read_forms(the_file, filename.native()):
+                EVAL(form, env)
+        if native_lib_enabled:
+            native_lib.register(filename.native(), env)
+        return NIL
+
     env = Env(None)
     for key in core.ns:
         env.set(key, core.ns[key])
 
     env.set("eval", MalFunctionCompiled(lambda args: eval_func(args, env)))
+    env.set("load-file", MalFunctionCompiled(lambda args: load_file(args, env)))
     rep('(def! *host-language* "python.2")', env)
 
-    rep(
-        '(def! load-file (fn* (f) (eval (read-string (str "(do " (slurp f) "\nnil)")))))',
-        env,
-    )
-
     mal_argv = MalList([MalString(x) for x in sys.argv[2:]])
     env.set("*ARGV*", mal_argv)
 
@@ -224,56 +724,88 @@ def init_repl_env() -> Env:
     return env
 
 
+def macro_for(ast: MalExpression, env: Env) -> Optional[MalExpression]:
+    """Return the macro that ast is a call to, or None if it is not a macro
+    call. Nothing is raised on the way: this runs for every form evaluated."""
+    if not isinstance(ast, MalList):
+        return None
+    values = ast.native()
+    if not values or not isinstance(values[0], MalSymbol):
+        return None
+    x = env.lookup_or_none(values[0].native())
+    if (isinstance(x, MalFunctionRaw) or isinstance(x, MalFunctionCompiled)) and (
+        x.is_macro()
+    ):
+        return x
+    return None
+
+
 def is_macro_call(ast: MalExpression, env: Env) -> bool:
-    try:
-        x = env.get(ast.native()[0].native())
-        try:
-            assert isinstance(x, MalFunctionRaw) or isinstance(x, MalFunctionCompiled)
-        except AssertionError:
-            return False
-        return x.is_macro()  # type: ignore
-    except TypeError:
-        return False
-    except MalUnknownSymbolException:
-        return False
-    except AttributeError:
-        return False
-    except IndexError:
-        return False
-    except KeyError:
-        return False
+    return macro_for(ast, env) is not None
 
 
 def macroexpand(ast: MalExpression, env: Env) -> MalExpression:
     while True:
-        if not is_macro_call(ast, env):
+        macro_func = macro_for(ast, env)
+        if macro_func is None:
             return ast
         assert isinstance(ast, MalList)
-        macro_func = env.get(ast.native()[0].native())
-        assert isinstance(macro_func, MalFunctionRaw) or isinstance(
-            macro_func, MalFunctionCompiled
-        )
-        ast = macro_func.call(ast.native()[1:])
-        continue
+        expanded = ast.expansion(macro_func)
+        if expanded is None:
+            expanded = macro_func.call(ast.native()[1:])
+            ast.set_expansion(macro_func, expanded)
+        ast = expanded
 
 
 def rep_handling_exceptions(line: str, repl_env: Env) -> str:
     try:
         return rep(line, repl_env)
-    except MalUnknownSymbolException as e:
-        return "'" + e.func + "' not found"
     except MalException as e:
-        return "ERROR: " + str(e)
+        return error_message(e)
+
+
+def error_message(e: MalException) -> str:
+    if isinstance(e, MalUnknownSymbolException):
+        message = "'" + e.func + "' not found"
+    else:
+        message = "ERROR: " + str(e)
+    return message + "".join("\n  in %s:%d:%d" % p for p in e.positions())
 
 
 if __name__ == "__main__":
+    # Compiled code uses a few Python frames per non-tail mal call; make
+    # room for deeply recursive programs such as the self-hosted mal.
+    sys.setrecursionlimit(10000)
+
+    # Profile with MAL_PROFILE=1 or --profile
+    profile = os.environ.get("MAL_PROFILE", "0") != "0"
+    if len(sys.argv) >= 2 and sys.argv[1] == "--profile":
+        del sys.argv[1]
+        profile = True
+    if profile:
+        mal_profiler = profiler.Profiler()
+        mal_profiler.start()
+
+        def report_profile() -> None:
+            mal_profiler.stop()
+            path = os.environ.get("MAL_PROFILE_OUT", "mal-profile.folded")
+            with open(path, "w") as folded:
+                mal_profiler.report(folded)
+            print("collapsed stacks written to " + path, file=sys.stderr)
+
+        atexit.register(report_profile)
+
     # repl loop
     eof: bool = False
-    repl_env = init_repl_env()
+    repl_env = init_repl_env(os.environ.get("MAL_NATIVE_LIB", "1") != "0")
 
     if len(sys.argv) >= 2:
         file_str = sys.argv[1]
-        rep_handling_exceptions('(load-file "' + file_str + '")', repl_env)
+        try:
+            rep('(load-file "' + file_str + '")', repl_env)
+        except MalException as e:
+            print(error_message(e), file=sys.stderr)
+            exit(1)
         exit(0)
 
     rep('(println (str "Mal [" *host-language* "]"))', repl_env)
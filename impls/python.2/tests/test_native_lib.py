@@ -0,0 +1,116 @@
+import gc
+import os
+import unittest
+
+import native_lib
+import stepA_mal
+from mal_types import MalException, MalFunctionCompiled, MalFunctionRaw, MalSymbol
+
+LIB_FILES = ["trivial.mal", "reducers.mal", "threading.mal", "memoize.mal"]
+
+# Each is run in an environment with the mal definitions and in one with the
+# native ones, and must give the same result or the same error. Errors are
+# compared by their value, without the positions in lib files they passed
+# through.
+CASES = [
+    "(reduce + 0 (list 1 2 3 4))",
+    "(reduce + 0 [1 2 3 4])",
+    "(reduce + 7 ())",
+    "(reduce (fn* [acc x] (cons x acc)) () [1 2 3])",
+    "(reduce + 0 nil)",
+    "(reduce + 0 1)",
+    '(reduce str "" (list 1 nil "a" :b))',
+    "(foldr cons () [1 2 3])",
+    "(foldr list 0 (list 1 2 3))",
+    "(foldr + 7 nil)",
+    "(foldr + 7 [])",
+    "(foldr + 0 1)",
+    "(-> 1 (+ 2) (- 10) list)",
+    "(->> 1 (+ 2) (- 10) list)",
+    "(-> [1 2 3] rest rest first)",
+    "(macroexpand (-> x (a 1) b [c] (d)))",
+    "(macroexpand (->> x (a 1) b [c] (d)))",
+    "(macroexpand (-> x ()))",
+    "(macroexpand (-> x))",
+    "(inc 41)",
+    "(dec 43)",
+    "(zero? 0)",
+    "(zero? 1)",
+    "(zero? nil)",
+    "(identity [1 :a])",
+    "(list (gensym) (gensym) (symbol? (gensym)))",
+    "(let* [f (memoize (fn* [& xs] (apply + xs)))] (list (f 1 2) (f 1 2) (f)))",
+    "(let* [f (memoize (fn* [x] x))] (list (f 1) (f :a) (f [1 [2]]) (f 1)))",
+    "(let* [n (atom 0) f (memoize (fn* [x] (swap! n + x)))] (do (f 2) (f 2) (f 3) @n))",
+    "(do (def! fib (memoize (fn* [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))) (fib 60))",
+    "(-> 1 inc inc dec)",
+    "(reduce * 1 (map inc [1 2 3 4]))",
+    '(inc "a")',
+    "(inc nil)",
+    "(dec true)",
+    "(inc)",
+    "(inc 1 2)",
+    "(zero?)",
+    "(identity)",
+    "(reduce + 0)",
+    "(reduce)",
+    "(reduce + 0 [1] 2)",
+    '(reduce + 0 [1 "a"])',
+    "(reduce 1 0 [1])",
+    "(reduce 1 0 [])",
+    "(foldr + 0)",
+    "(foldr 1 0 [1])",
+    "(->)",
+]
+
+
+def load_libs(native: bool):
+    env = stepA_mal.init_repl_env(native_lib_enabled=native)
+    for name in LIB_FILES:
+        path = os.path.join(native_lib.LIB_DIR, name)
+        stepA_mal.rep('(load-file "%s")' % path, env)
+    return env
+
+
+def run(source: str, env) -> str:
+    try:
+        return stepA_mal.rep(source, env)
+    except MalException as e:
+        return "ERROR: " + str(e.native())
+    except Exception as e:
+        return "Python error: " + type(e).__name__
+
+
+class TestNativeLib(unittest.TestCase):
+    def test_native_definitions_are_registered(self):
+        mal_env = load_libs(False)
+        native_env = load_libs(True)
+        for make in native_lib.LIBS.values():
+            for name in make():
+                self.assertIsInstance(mal_env.get(name), MalFunctionRaw)
+                self.assertIsInstance(native_env.get(name), MalFunctionCompiled)
+                self.assertEqual(
+                    mal_env.get(name).is_macro(), native_env.get(name).is_macro()
+                )
+
+    def test_conformance(self):
+        mal_env = load_libs(False)
+        native_env = load_libs(True)
+        for source in CASES:
+            with self.subTest(source=source):
+                self.assertEqual(run(source, mal_env), run(source, native_env))
+
+    def test_other_files_are_not_replaced(self):
+        env = stepA_mal.init_repl_env()
+        stepA_mal.rep("(def! reduce (fn* [f init xs] :mine))", env)
+        native_lib.register("reducers.mal", env)
+        self.assertEqual(":mine", stepA_mal.rep("(reduce + 0 [1])", env))
+
+    def test_gensyms_are_collected(self):
+        env = load_libs(True)
+        gc.collect()
+        count = len(MalSymbol._interned)
+        for _ in range(100):
+            stepA_mal.rep("(symbol? (gensym))", env)
+        gc.collect()
+        self.assertEqual(count, len(MalSymbol._interned))
@@ -26,6 +26,14 @@ class TestStep3(unittest.TestCase):
         e = Env(None)
         self.assertEqual(None, e.find("key"))
 
+    def test_env_lookup_or_none(self):
+        outer = Env(None)
+        e = Env(outer)
+        value = MalInt(1)
+        outer.set("key", value)
+        self.assertIs(value, e.lookup_or_none("key"))
+        self.assertIsNone(e.lookup_or_none("other"))
+
     def test_env_get(self):
         env = Env(None)
         expression = MalInt(1)
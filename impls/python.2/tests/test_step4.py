@@ -175,6 +175,35 @@ class TestStep4(unittest.TestCase):
         except MalInvalidArgumentException:
             pass
 
+    def test_variadic_arithmetic(self):
+        self.assertEqual("10", step4_if_fn_do.rep("(+ 1 2 3 4)"))
+        self.assertEqual("0", step4_if_fn_do.rep("(+)"))
+        self.assertEqual("5", step4_if_fn_do.rep("(+ 5)"))
+        self.assertEqual("24", step4_if_fn_do.rep("(* 1 2 3 4)"))
+        self.assertEqual("1", step4_if_fn_do.rep("(*)"))
+        self.assertEqual("4", step4_if_fn_do.rep("(- 10 1 2 3)"))
+        self.assertEqual("-5", step4_if_fn_do.rep("(- 5)"))
+        self.assertEqual("2", step4_if_fn_do.rep("(/ 100 5 10)"))
+        self.assertEqual("0", step4_if_fn_do.rep("(/ 5)"))
+        with self.assertRaises(MalInvalidArgumentException):
+            step4_if_fn_do.rep("(+ 1 2 nil)")
+        with self.assertRaises(MalInvalidArgumentException):
+            step4_if_fn_do.rep("(-)")
+
+    def test_variadic_comparison(self):
+        self.assertEqual("true", step4_if_fn_do.rep("(< 1 2 3)"))
+        self.assertEqual("false", step4_if_fn_do.rep("(< 1 3 2)"))
+        self.assertEqual("true", step4_if_fn_do.rep("(<= 1 1 2)"))
+        self.assertEqual("true", step4_if_fn_do.rep("(> 3 2 1)"))
+        self.assertEqual("false", step4_if_fn_do.rep("(>= 3 3 4)"))
+        self.assertEqual("true", step4_if_fn_do.rep("(= 1 1 1)"))
+        self.assertEqual("false", step4_if_fn_do.rep("(= 1 1 2)"))
+        self.assertEqual("true", step4_if_fn_do.rep("(< 1)"))
+        self.assertEqual("true", step4_if_fn_do.rep('(= "a")'))
+        for source in ['(< "a")', "(< nil)", "(>= nil)", '(apply < ["a"])']:
+            with self.assertRaises(MalInvalidArgumentException):
+                step4_if_fn_do.rep(source)
+
     def test_step4_closures(self):
         self.assertEqual(
             "12", step4_if_fn_do.rep("(( (fn* (a) (fn* (b) (+ a b))) 5) 7)")
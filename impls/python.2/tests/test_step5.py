@@ -16,6 +16,13 @@ class TestStep5(unittest.TestCase):
         self.assertEqual("500500", step5_tco.rep("(def! res2 (sum2 1000 0))"))
         self.assertEqual("500500", step5_tco.rep("res2"))
 
+    def test_step5_apply_binds_params(self):
+        self.assertEqual(
+            "(1 (2 3))", step5_tco.rep("((fn* (a & more) (list a more)) 1 2 3)")
+        )
+        self.assertEqual("(1 ())", step5_tco.rep("((fn* (a & more) (list a more)) 1)"))
+        self.assertEqual("7", step5_tco.rep("((fn* (f x) (f x 4)) + 3)"))
+
 
 if __name__ == "__main__":
     unittest.main()
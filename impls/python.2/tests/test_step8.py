@@ -55,6 +55,10 @@ class TestStep8(unittest.TestCase):
         self.assertFalse(step8_macros.is_macro_call(other2, self._repl_env))
         self.assertFalse(step8_macros.is_macro_call(other3, self._repl_env))
         self.assertFalse(step8_macros.is_macro_call(other4, self._repl_env))
+        for other in ["macro", "[macro]", "()", '("macro")', "((fn* () 1))"]:
+            self.assertFalse(
+                step8_macros.is_macro_call(step8_macros.READ(other), self._repl_env)
+            )
 
     def test_step8_macroexpand(self):
         self.rep("(def! func (fn* () 1))")
@@ -66,6 +70,16 @@ class TestStep8(unittest.TestCase):
         self.rep("(defmacro! unless (fn* (pred a b) `(if ~pred ~b ~a)))")
         self.assertEqual("(if true 7 8)", self.rep("(macroexpand (unless true 8 7))"))
 
+    def test_step8_macroexpand_cached(self):
+        self.rep("(def! n (atom 0))")
+        self.rep("(defmacro! m (fn* () (do (swap! n (fn* (x) (+ x 1))) 1)))")
+        self.rep("(def! f (fn* () (m)))")
+        self.assertEqual("1", self.rep("(f)"))
+        self.assertEqual("1", self.rep("(f)"))
+        self.assertEqual("1", self.rep("@n"))
+        self.rep("(defmacro! m (fn* () 2))")
+        self.assertEqual("2", self.rep("(f)"))
+
     def test_step8_not(self):
         self.assertEqual("true", self.rep("(not (not true))"))
         self.assertEqual("true", self.rep("(not nil)"))
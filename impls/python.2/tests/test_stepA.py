@@ -1,6 +1,17 @@
+import gc
+import sys
+import tempfile
+import time
 import unittest
 
+import profiler
+import reader
 import stepA_mal
+from mal_types import MalSymbol, MalInt, MalNil, MalBoolean, NIL, TRUE, FALSE
+from mal_types import MalException, MalSyntaxException, MalFunctionCompiled
+from mal_types import MalIndexError, MalInvalidArgumentException
+from mal_types import MalUnknownSymbolException
+from persistent import PersistentHashMap
 
 
 class TestStepA(unittest.TestCase):
@@ -62,6 +73,552 @@ class TestStepA(unittest.TestCase):
         )
         self.assertEqual("(1 2 3)", self.rep('(get @e "bar")'))
 
+    def test_macro_defined_in_same_do(self):
+        self.assertEqual(
+            "7",
+            self.rep(
+                "(do (defmacro! unless2 (fn* (a b c) `(if ~a ~c ~b))) (unless2 false 7 8))"
+            ),
+        )
+
+    def test_let_shadows_macro(self):
+        self.rep("(defmacro! m (fn* () 1))")
+        self.assertEqual("2", self.rep("(let* [m (fn* () 2)] (m))"))
+
+    def test_macro_redefined_after_call(self):
+        self.rep("(defmacro! m (fn* [] 1))")
+        self.rep("(def! f (fn* [] (m)))")
+        self.assertEqual("1", self.rep("(f)"))
+        self.rep("(defmacro! m (fn* [] 2))")
+        self.assertEqual("2", self.rep("(f)"))
+
+    def test_call_becomes_macro_call(self):
+        self.rep("(def! f (fn* [] (m 1)))")
+        self.assertRaises(MalUnknownSymbolException, self.rep, "(f)")
+        self.rep("(defmacro! m (fn* [x] `(+ ~x 100)))")
+        self.assertEqual("101", self.rep("(f)"))
+        self.rep("(def! g (fn* [x] x))")
+        self.rep("(def! h (fn* [] (g 1)))")
+        self.assertEqual("1", self.rep("(h)"))
+        self.rep("(defmacro! g (fn* [x] `(+ ~x 100)))")
+        self.assertEqual("101", self.rep("(h)"))
+
+    def test_cond_chain(self):
+        self.rep('(def! f (fn* (n) (cond (= n 0) :zero (= n 1) :one "else" :many)))')
+        self.assertEqual("(:zero :one :many)", self.rep("(list (f 0) (f 1) (f 2))"))
+
+    def test_tail_calls_in_let_and_catch(self):
+        self.rep("(def! f (fn* (n) (let* [m (- n 1)] (if (= m 0) :done (f m)))))")
+        self.assertEqual(":done", self.rep("(f 10000)"))
+        self.rep(
+            "(def! g (fn* (n) (try* (throw n) (catch* e (if (= e 0) :done (g (- e 1)))))))"
+        )
+        self.assertEqual(":done", self.rep("(g 2000)"))
+
+    def test_lexical_addressing(self):
+        self.rep(
+            "(def! adder (fn* (a) (fn* (b) (let* [c 3] (fn* (d) (+ a (+ b (+ c d))))))))"
+        )
+        self.assertEqual("10", self.rep("(((adder 1) 2) 4)"))
+        self.assertEqual("(1 (2 3))", self.rep("((fn* (a & r) (list a r)) 1 2 3)"))
+        self.assertEqual("3", self.rep("(let* [x 1] (do (let* [x 2] x) (+ x 2)))"))
+
+    def test_local_def(self):
+        self.rep("(def! x 1)")
+        self.assertEqual("(1 2 2)", self.rep("((fn* () (list x (def! x 2) x)))"))
+        self.assertEqual("1", self.rep("x"))
+        self.assertEqual(
+            "\"'y' not found\"",
+            self.rep(
+                "((fn* () (do (if false (def! y 1)) (try* y (catch* e (str e))))))"
+            ),
+        )
+
+    def test_symbols_are_interned(self):
+        self.assertIs(MalSymbol("abc"), MalSymbol("abc"))
+        self.assertIs(MalSymbol("abc"), stepA_mal.READ("abc"))
+        self.assertIs(
+            stepA_mal.READ("abc"),
+            stepA_mal.EVAL(stepA_mal.READ('(symbol "abc")'), self._repl_env),
+        )
+        self.assertEqual("true", self.rep('(= \'abc (symbol "abc"))'))
+
+    def test_scalars_are_shared(self):
+        self.assertIs(NIL, MalNil())
+        self.assertIs(TRUE, MalBoolean(True))
+        self.assertIs(FALSE, MalBoolean(False))
+        self.assertIs(MalInt(7), MalInt(7))
+        self.assertEqual(100000, MalInt(100000).native())
+        self.assertIs(
+            NIL, stepA_mal.EVAL(stepA_mal.READ("(if false 1)"), self._repl_env)
+        )
+        self.assertIs(FALSE, stepA_mal.EVAL(stepA_mal.READ("(< 2 1)"), self._repl_env))
+
+    def test_nested_sequence_equality(self):
+        self.assertEqual("false", self.rep("(= [1 2] [1 3])"))
+        self.assertEqual("true", self.rep("(= [1 [2]] (list 1 (list 2)))"))
+
+    def test_shared_lists(self):
+        self.rep("(def! xs (list 1 2 3 4))")
+        self.assertEqual("(0 1 2 3 4)", self.rep("(cons 0 xs)"))
+        self.assertEqual("(3 4 1 2 3 4)", self.rep("(concat (rest (rest xs)) xs)"))
+        self.assertEqual(
+            "(3 4 1 2 1 2 3 4)", self.rep("(concat (rest (rest xs)) [1 2] xs)")
+        )
+        self.assertEqual("4", self.rep("(nth (concat (list 1) (rest xs) []) 3)"))
+        self.assertEqual("6", self.rep("(count (concat (cons 0 xs) (list 5)))"))
+        self.assertEqual("true", self.rep("(empty? (rest (rest (cons 0 (list 1)))))"))
+        self.assertEqual("(2 3 4)", self.rep("(rest xs)"))
+        self.assertEqual("(1 2 3 4)", self.rep("xs"))
+        self.assertEqual("(-1 0 1 2)", self.rep("(conj (list 1 2) 0 -1)"))
+        self.assertEqual("[1 2 3 4]", self.rep("(conj [1 2] 3 4)"))
+
+    def test_shared_lists_nth_out_of_bounds(self):
+        self.rep("(def! xs (list 1 2 3))")
+        for text, message in [
+            ("(nth (rest xs) -1)", "Index out of bounds: -1"),
+            ("(nth xs -1)", "Index out of bounds: -1"),
+            ("(nth (list 1) 5)", "Index out of bounds: 5"),
+            ("(nth (concat (rest xs) xs) 9)", "Index out of bounds: 9"),
+        ]:
+            with self.assertRaises(MalIndexError) as context:
+                self.rep(text)
+            self.assertEqual(message, context.exception.native().native())
+
+    def test_large_vector(self):
+        self.rep(
+            "(def! grow (fn* [n v] (if (= n 0) v (grow (- n 1) (conj v (count v))))))"
+        )
+        self.rep("(def! v (grow 2000 []))")
+        self.assertEqual("2000", self.rep("(count v)"))
+        self.assertEqual("1234", self.rep("(nth v 1234)"))
+        self.assertEqual("1999", self.rep("(nth (conj v 2000) 1999)"))
+        self.assertEqual("1999", self.rep("(nth (vec (rest v)) 1998)"))
+        self.assertEqual("true", self.rep("(= v (apply list v))"))
+
+    def test_large_hash_map(self):
+        self.rep(
+            "(def! fill (fn* [n m] (if (= n 0) m (fill (- n 1) (assoc m (str n) n)))))"
+        )
+        self.rep("(def! m (fill 2000 {}))")
+        self.assertEqual("2000", self.rep("(count (keys m))"))
+        self.assertEqual("1234", self.rep('(get m "1234")'))
+        self.assertEqual("nil", self.rep('(get (dissoc m "1234") "1234")'))
+        self.assertEqual("1234", self.rep('(get m "1234")'))
+        self.assertEqual("1998", self.rep('(count (keys (dissoc m "1" "2")))'))
+        self.assertEqual("true", self.rep("(contains? (assoc m :k 1) :k)"))
+
+    def test_reader_errors(self):
+        for text, message in [
+            ("(1 2", "invalid syntax or unexpected EOF"),
+            ("", "invalid syntax or unexpected EOF"),
+            ('"abc', "unbalanced string"),
+            ('(1 "abc', "invalid syntax or unexpected EOF"),
+            ('"abc\\"', "unbalanced string or invalid escape sequence"),
+        ]:
+            with self.assertRaises(MalSyntaxException) as context:
+                reader.read(text)
+            self.assertEqual(message, context.exception.native().native())
+
+    def test_reader_tokens(self):
+        self.assertEqual("nil?", self.rep("'nil?"))
+        self.assertEqual("(unquote (deref x))", self.rep("'~ @x"))
+        self.assertEqual("(~)", self.rep("'(~)"))
+        self.assertEqual('"a\\\\nb\\"c"', self.rep('"a\\\\nb\\"c"'))
+        self.assertEqual("(1 2 3)", self.rep("'(1 ,2 ; two\n 3)"))
+
+    def test_read_forms(self):
+        self.assertEqual(
+            ["(a b)", "1", '"x"'],
+            [str(x) for x in reader.read_forms('(a b)\n;c\n 1 "x" ; end')],
+        )
+        self.assertEqual(
+            ["(a b)", "cd", "[2]"],
+            [str(x) for x in reader.read_forms(iter(["(a", " b) c", "d [", "2]"]))],
+        )
+        self.assertEqual(
+            ["(a)", "(b)"],
+            [
+                str(x)
+                for x in reader.read_forms(iter(["(a) ; com", "ment ", "here\n(b)"]))
+            ],
+        )
+        with self.assertRaises(MalSyntaxException) as context:
+            list(reader.read_forms("(a)\n  (b", "f.mal"))
+        self.assertEqual(
+            "invalid syntax or unexpected EOF (f.mal:2:3)",
+            context.exception.native().native(),
+        )
+
+    def test_load_file_comment_across_chunks(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".mal") as the_file:
+            line = "(def! a 1)\n"
+            the_file.write(line * (reader.CHUNK_SIZE // len(line)))
+            the_file.write(';; boom (throw "x")\n(def! b 2)\n')
+            the_file.flush()
+            self.rep('(load-file "%s")' % the_file.name)
+        self.assertEqual("2", self.rep("b"))
+
+    def test_load_file_evaluates_forms_as_read(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".mal") as the_file:
+            the_file.write("(def! a 1)\n(defmacro! m (fn* () 2))\n(def! b (m))\n(c")
+            the_file.flush()
+            self.assertEqual(
+                '"invalid syntax or unexpected EOF (%s:4:1)"' % the_file.name,
+                self.rep('(try* (load-file "%s") (catch* e e))' % the_file.name),
+            )
+        self.assertEqual("(1 2)", self.rep("(list a b)"))
+
+    def test_source_positions(self):
+        forms = list(reader.read_forms("(a\n (b [(c)]))\n  (d)", "f.mal"))
+        self.assertEqual(("f.mal", 1, 1), reader.SOURCE_MAP.lookup(forms[0]))
+        inner = forms[0].native()[1]
+        self.assertEqual(("f.mal", 2, 2), reader.SOURCE_MAP.lookup(inner))
+        c = inner.native()[1].native()[0]
+        self.assertEqual(("f.mal", 2, 6), reader.SOURCE_MAP.lookup(c))
+        self.assertEqual(("f.mal", 3, 3), reader.SOURCE_MAP.lookup(forms[1]))
+        self.assertIsNone(reader.SOURCE_MAP.lookup(reader.read("(a)")))
+
+    def test_source_positions_are_held_weakly(self):
+        rows = len(reader.SOURCE_MAP)
+        forms = list(reader.read_forms("(a (b))\n(c)", "f.mal"))
+        self.assertEqual(rows + 3, len(reader.SOURCE_MAP))
+        del forms
+        gc.collect()
+        self.assertEqual(rows, len(reader.SOURCE_MAP))
+        forms = list(reader.read_forms("(d)", "g.mal"))
+        self.assertEqual(("g.mal", 1, 1), reader.SOURCE_MAP.lookup(forms[0]))
+
+    def test_exception_positions(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".mal") as the_file:
+            the_file.write(
+                "(def! f (fn* [x]\n  (+ 1 (g x))))\n(def! g (fn* [y] (nth [] y)))"
+            )
+            the_file.flush()
+            self.rep('(load-file "%s")' % the_file.name)
+            with self.assertRaises(MalException) as context:
+                self.rep("(f 0)")
+            self.assertEqual(
+                [(the_file.name, 3, 18), (the_file.name, 2, 8), (the_file.name, 2, 3)],
+                context.exception.positions(),
+            )
+
+    def test_def_names_functions(self):
+        self.rep("(def! f (fn* [] 1))")
+        self.rep("(def! g f)")
+        self.assertEqual("f", self._repl_env.get("g").name())
+        self.assertEqual("1", self.rep("(let* [h (fn* [] 1)] (do (def! k h) (k)))"))
+
+    def test_profiler_stack(self):
+        stacks = []
+
+        def sample(args):
+            stacks.append(profiler.mal_stack(sys._getframe()))
+            return NIL
+
+        self._repl_env.set("sample", MalFunctionCompiled(sample))
+        with tempfile.NamedTemporaryFile("w", suffix=".mal") as the_file:
+            the_file.write(
+                "(def! inner (fn* [] (sample)))\n"
+                "(def! outer (fn* [] (do (inner) nil)))\n"
+                "(def! tail (fn* [] (inner)))"
+            )
+            the_file.flush()
+            self.rep('(load-file "%s")' % the_file.name)
+            self.rep("(outer)")
+            self.rep("(tail)")
+        self.assertEqual(
+            [
+                [("outer", None), ("inner", (the_file.name, 2, 25))],
+                [("inner", None)],
+            ],
+            [[(f.name(), position) for f, position in s] for s in stacks],
+        )
+        mal_profiler = profiler.Profiler()
+        mal_profiler.samples[stacks[0]] += 2
+        self.assertEqual(
+            ["mal;outer;inner@%s:2 2" % the_file.name], mal_profiler.collapsed()
+        )
+
+    def test_memoize(self):
+        self.rep("(def! n (atom 0))")
+        self.rep("(def! f (memoize (fn* [& xs] (do (swap! n (fn* [a] (+ a 1))) xs))))")
+        self.assertEqual(
+            '(1 "1" [1] {:a (2)})', self.rep('(f 1 "1" [1] {:a (list 2)})')
+        )
+        # equal arguments, so the result of the first call
+        self.assertEqual(
+            '(1 "1" [1] {:a (2)})', self.rep('(f 1 "1" (list 1) {:a [2]})')
+        )
+        self.assertEqual('("1")', self.rep('(f "1")'))
+        self.assertEqual("(:1)", self.rep("(f :1)"))
+        self.assertEqual("3", self.rep("@n"))
+        self.assertEqual(
+            "{:hits 1 :misses 3 :evictions 0 :size 3}", self.rep("(memoize-stats f)")
+        )
+
+    def test_memoize_max_size(self):
+        self.rep("(def! f (memoize (fn* [x] x) :max-size 2))")
+        self.rep("(do (f 1) (f 2) (f 1) (f 3) (f 1) (f 2))")
+        # 2 was the least recently used when 3 came in
+        self.assertEqual(
+            "{:hits 2 :misses 4 :evictions 2 :size 2}", self.rep("(memoize-stats f)")
+        )
+
+    def test_memoize_ttl(self):
+        self.rep("(def! f (memoize (fn* [x] x) :ttl-ms 20))")
+        self.rep("(do (f 1) (f 1))")
+        time.sleep(0.03)
+        self.rep("(f 1)")
+        self.assertEqual(
+            "{:hits 1 :misses 2 :evictions 1 :size 1}", self.rep("(memoize-stats f)")
+        )
+
+    def test_memoize_ttl_drops_unrepeated_keys(self):
+        self.rep("(def! f (memoize (fn* [x] x) :ttl-ms 20))")
+        self.rep("(do (f 1) (f 2) (f 3))")
+        time.sleep(0.03)
+        self.rep("(f 4)")
+        self.assertEqual(
+            "{:hits 0 :misses 4 :evictions 3 :size 1}", self.rep("(memoize-stats f)")
+        )
+
+    def test_memoize_errors(self):
+        for source in [
+            "(memoize 1)",
+            "(memoize + :max-size)",
+            "(memoize + :max-size 0)",
+            "(memoize + :size 2)",
+            "(memoize-stats +)",
+        ]:
+            with self.assertRaises(MalException):
+                self.rep(source)
+
+    def test_hash_map_any_keys(self):
+        self.rep("(def! m {1 :int [1 2] :seq {:a 1} :map nil :nil sym :sym})")
+        self.assertEqual(":int", self.rep("(get m 1)"))
+        self.assertEqual(":seq", self.rep("(get m (list 1 2))"))
+        self.assertEqual(":map", self.rep("(get m (hash-map :a 1))"))
+        self.assertEqual(":nil", self.rep("(get m nil)"))
+        self.assertEqual(":sym", self.rep("(get m 'sym)"))
+        self.assertEqual("nil", self.rep('(get m "1")'))
+        self.assertEqual("true", self.rep("(contains? (assoc m 'x 1) 'x)"))
+        self.assertEqual("false", self.rep("(contains? (dissoc m 1) 1)"))
+        self.assertEqual("{[1] 2}", self.rep("(assoc {} [1] 1 '(1) 2)"))
+
+    def test_structural_equality(self):
+        self.assertEqual("true", self.rep("(= {:a [1 {2 3}]} {:a '(1 {2 3})})"))
+        self.assertEqual("false", self.rep("(= {:a [1 {2 3}]} {:a [1 {2 4}]})"))
+        self.assertEqual("false", self.rep("(= {:a 1} {:a 1 :b 2})"))
+        self.assertEqual("false", self.rep('(= {"a" 1} {:a 1})'))
+        self.rep("(def! m (hash-map :x [1 2]))")
+        m = self._repl_env.get("m")
+        other = reader.read("{:x (1 2)}")
+        self.assertEqual(hash(m), hash(other))
+        self.assertEqual(m, other)
+        self.assertNotEqual(m, reader.read("{:x (1 3)}"))
+
+    def test_hash_map_collisions(self):
+        class Key(str):
+            def __hash__(self) -> int:
+                return 42
+
+        keys = [Key("k%d" % i) for i in range(5)]
+        m = PersistentHashMap.from_items((k, i) for i, k in enumerate(keys))
+        m = m.assoc("other", 5)
+        self.assertEqual(6, len(m))
+        self.assertEqual(3, m[keys[3]])
+        m = m.dissoc(keys[3]).dissoc(keys[0])
+        self.assertEqual(4, len(m))
+        self.assertNotIn(keys[3], m)
+        self.assertEqual([1, 2, 4, 5], sorted(m.values()))
+
+    def test_lazy_seq(self):
+        self.rep("(def! ints (fn* [n] (lazy-seq (cons n (ints (+ n 1))))))")
+        self.assertEqual("(0 1 2)", self.rep("(take 3 (ints 0))"))
+        self.assertEqual("()", self.rep("(lazy-seq nil)"))
+        self.assertEqual("(1 2)", self.rep("(lazy-seq [1 2])"))
+        self.rep("(def! n (atom 0))")
+        self.rep("(do (def! xs (lazy-seq (do (swap! n + 1) (list 1 2)))) nil)")
+        self.assertEqual("0", self.rep("@n"))
+        self.assertEqual("(1 2 1 2)", self.rep("(concat xs xs)"))
+        self.assertEqual("1", self.rep("@n"))
+        self.assertEqual(
+            '"boom"', self.rep('(try* (first (lazy-seq (throw "boom"))) (catch* e e))')
+        )
+
+    def test_lazy_seq_skips_without_nesting(self):
+        self.rep(
+            "(def! keep (fn* [p xs] (lazy-seq (if (empty? xs) nil (if (p (first xs))"
+            " (cons (first xs) (keep p (rest xs))) (keep p (rest xs)))))))"
+        )
+        self.assertEqual(
+            "(50001 50002)", self.rep("(take 2 (keep (fn* [x] (> x 50000)) (range)))")
+        )
+
+    def test_range_take_drop(self):
+        self.assertEqual("(0 1 2)", self.rep("(range 3)"))
+        self.assertEqual("(2 3 4)", self.rep("(range 2 5)"))
+        self.assertEqual("(10 7 4 1)", self.rep("(range 10 0 -3)"))
+        self.assertEqual("(10 11 12)", self.rep("(take 3 (drop 10 (range)))"))
+        self.assertEqual("100", self.rep("(nth (range) 100)"))
+        self.assertEqual("(3 4)", self.rep("(drop 2 [1 2 3 4])"))
+        self.assertEqual("(2 3 4)", self.rep("(drop 1 (concat [1 2] [3 4]))"))
+        self.assertEqual("()", self.rep("(drop 7 (list 1 2))"))
+        self.assertEqual("(1 2)", self.rep("(take 2 [1 2 3])"))
+        self.assertEqual("()", self.rep("(take 2 nil)"))
+        self.assertEqual("100000", self.rep("(count (range 100000))"))
+
+    def test_lazy_map(self):
+        self.assertEqual("1", self.rep("(first (map (fn* [x] (+ x 1)) (range)))"))
+        self.rep("(def! n (atom 0))")
+        self.rep("(do (def! big (lazy-seq (range 100000))) nil)")
+        self.rep("(def! f (fn* [x] (do (swap! n + 1) x)))")
+        self.assertEqual("0", self.rep("(first (map f big))"))
+        self.assertEqual("1", self.rep("@n"))
+        # Lists and vectors are still mapped at once.
+        self.rep("(map f [1 2 3])")
+        self.assertEqual("4", self.rep("@n"))
+
+    def test_lazy_seq_as_sequence(self):
+        self.assertEqual("true", self.rep("(= (range 3) (list 0 1 2))"))
+        self.assertEqual("true", self.rep("(= [0 1 2] (range 3))"))
+        self.assertEqual("false", self.rep("(= (range 3) (range 4))"))
+        self.assertEqual("false", self.rep("(= (range) [0 2])"))
+        self.assertEqual(":a", self.rep("(get (hash-map (range 2) :a) [0 1])"))
+        self.assertEqual("true", self.rep("(empty? (range 0))"))
+        self.assertEqual("true", self.rep("(sequential? (range 1))"))
+        self.assertEqual("false", self.rep("(list? (range 1))"))
+        self.assertEqual("(1 0 1)", self.rep("(cons 1 (range 2))"))
+        self.assertEqual("(9 0 1)", self.rep("(conj (range 2) 9)"))
+        self.assertEqual("[0 1 2]", self.rep("(vec (range 3))"))
+        self.assertEqual("(0 1 5)", self.rep("(concat (range 2) [5])"))
+        self.assertEqual("5", self.rep("(apply + (range 2 4))"))
+
+    def test_seq(self):
+        self.assertEqual("nil", self.rep("(seq [])"))
+        self.assertEqual("nil", self.rep("(seq nil)"))
+        self.assertEqual("nil", self.rep("(seq (range 0))"))
+        self.assertEqual('("a" "b")', self.rep('(seq "ab")'))
+        self.assertEqual("(1 2)", self.rep("(seq [1 2])"))
+        self.assertEqual("true", self.rep("(list? (seq [1 2]))"))
+        self.assertEqual("(0 1)", self.rep("(seq (range 2))"))
+
+    def test_transduce(self):
+        self.rep("(def! sq (fn* [x] (* x x)))")
+        self.rep("(def! small? (fn* [x] (< x 50)))")
+        self.rep("(def! xf (comp (map sq) (filter small?)))")
+        self.assertEqual("#<transducer>", self.rep("xf"))
+        self.assertEqual("140", self.rep("(transduce xf + 0 [1 2 3 4 5 6 7 8])"))
+        self.assertEqual("0", self.rep("(transduce xf + 0 nil)"))
+        self.assertEqual(
+            "3", self.rep("(transduce (comp (take 3) (take 5)) + 0 (range))")
+        )
+        self.assertEqual("0", self.rep("(transduce (take 0) + 0 (range))"))
+        self.assertEqual("(1 3)", self.rep("(filter small? [1 60 3])"))
+        self.assertEqual(
+            "(0 1 4)", self.rep("(take 3 (filter small? (map sq (range))))")
+        )
+
+    def test_transduce_runs_stages_per_element(self):
+        self.rep("(def! seen (atom []))")
+        self.rep("(def! log (fn* [tag] (fn* [x] (do (swap! seen conj [tag x]) x))))")
+        self.rep("(transduce (comp (map (log :a)) (map (log :b))) + 0 [1 2])")
+        self.assertEqual("[[:a 1] [:b 1] [:a 2] [:b 2]]", self.rep("@seen"))
+
+    def test_into(self):
+        self.assertEqual(
+            "[0 1 4]", self.rep("(into [] (map (fn* [x] (* x x))) (range 3))")
+        )
+        self.assertEqual("(2 1 0 9)", self.rep("(into (list 9) (take 3) (range))"))
+        self.assertEqual(
+            "[1 3 4]", self.rep("(into [1] (comp (drop 2) (take 2)) [1 2 3 4 5])")
+        )
+        self.assertEqual("{1 2}", self.rep("(into {} [[1 2]])"))
+        self.assertEqual("(2 1)", self.rep("(into nil [1 2])"))
+        self.assertEqual("[1 2]", self.rep("(into [] (list 1 2))"))
+        with self.assertRaises(MalInvalidArgumentException):
+            self.rep("(into {} [1])")
+
+    def test_comp(self):
+        self.rep("(def! sq (fn* [x] (* x x)))")
+        self.assertEqual("16", self.rep("((comp sq sq (fn* [a b] (+ a b))) 1 1)"))
+        self.assertEqual("5", self.rep("((comp) 5)"))
+        with self.assertRaises(MalInvalidArgumentException):
+            self.rep("(comp (map sq) sq)")
+
+    def test_num_vector(self):
+        self.rep("(def! a (num-vector [1 2 3 4]))")
+        self.assertEqual("(num-vector [1 2 3 4])", self.rep("a"))
+        self.assertEqual("true", self.rep("(num-vector? a)"))
+        self.assertEqual("false", self.rep("(num-vector? [1])"))
+        self.assertEqual("4", self.rep("(count a)"))
+        self.assertEqual("3", self.rep("(nth a 2)"))
+        self.assertEqual("[1 2 3 4]", self.rep("(vec a)"))
+        self.assertEqual("true", self.rep("(= a (num-vector (range 1 5)))"))
+        self.assertEqual("false", self.rep("(= a [1 2 3 4])"))
+        with self.assertRaises(MalInvalidArgumentException):
+            self.rep("(num-vector [1 :a])")
+        with self.assertRaises(MalException):
+            self.rep("(num-vector [9223372036854775808])")
+
+    def test_num_vector_arithmetic(self):
+        self.rep("(def! a (num-vector [1 2 3 4]))")
+        self.assertEqual(
+            "(num-vector [1 3 5 7])", self.rep("(+ a (num-vector (range 4)))")
+        )
+        self.assertEqual("(num-vector [0 1 2 3])", self.rep("(- a 1)"))
+        self.assertEqual("(num-vector [2 4 6 8])", self.rep("(* 2 a)"))
+        self.assertEqual("(num-vector [3 -3])", self.rep("(/ (num-vector [7 -7]) 2)"))
+        self.assertEqual("10", self.rep("(sum a)"))
+        self.assertEqual("6", self.rep("(sum [1 2 3])"))
+        self.assertEqual("1", self.rep("(min a)"))
+        self.assertEqual("4", self.rep("(max a)"))
+        self.assertEqual("2", self.rep("(max 1 2)"))
+        self.assertEqual("30", self.rep("(dot a a)"))
+        with self.assertRaises(MalInvalidArgumentException):
+            self.rep("(+ a (num-vector [1 2]))")
+        with self.assertRaises(MalInvalidArgumentException):
+            self.rep("(+ a [1 2 3 4])")
+        with self.assertRaises(MalException):
+            self.rep("(* (num-vector [4611686018427387904]) 2)")
+
+    def test_subvec(self):
+        self.rep("(def! a (num-vector [1 2 3 4]))")
+        self.assertEqual("(num-vector [2 3])", self.rep("(subvec a 1 3)"))
+        self.assertEqual("(num-vector [3 4])", self.rep("(subvec a 2)"))
+        self.assertEqual("[2 3]", self.rep("(subvec [1 2 3] 1)"))
+        self.assertIs(
+            self._repl_env.get("a").native().obj,
+            stepA_mal.EVAL(reader.read("(subvec a 1)"), self._repl_env).native().obj,
+        )
+        with self.assertRaises(MalException):
+            self.rep("(subvec a 3 2)")
+
+    def test_short_calls(self):
+        calls = []
+        f = MalFunctionCompiled(
+            lambda args: calls.append(("list", len(args))) or NIL,
+            call1=lambda a: calls.append(("call1", a.native())) or NIL,
+            call2=lambda a, b: calls.append(("call2", a.native() + b.native())) or NIL,
+        )
+        self._repl_env.set("f", f)
+        self.rep("(do (f) (f 1) (f 1 2) (f 1 2 3) nil)")
+        self.rep("((fn* [] (f 3 4)))")
+        self.assertEqual(
+            [("list", 0), ("call1", 1), ("call2", 3), ("list", 3), ("call2", 7)],
+            calls,
+        )
+        self.assertEqual("6", self.rep("(let* [g (fn* [a b] (+ a b))] (g 2 4))"))
+        self.rep("(def! h (memoize (fn* [a b] (+ a b))))")
+        self.assertEqual("(3 3)", self.rep("(list (h 1 2) (h 1 2))"))
+        self.assertEqual(
+            "{:hits 1 :misses 1 :evictions 0 :size 1}", self.rep("(memoize-stats h)")
+        )
+        with self.assertRaises(MalException) as cm:
+            self.rep('(1 (throw "evaluated first"))')
+        self.assertEqual("evaluated first", cm.exception.native().native())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -6,7 +6,7 @@ from mal_types import (throw_str,
                        MalType, MalMeta, nil, true, false,
                        MalInt, MalSym, MalStr,
                        MalList, MalVector, MalHashMap,
-                       MalAtom, MalFunc)
+                       MalAtom, MalFunc, MalMemoized, MemoCache)
 import mal_readline
 import reader
 import printer
@@ -16,14 +16,26 @@ def wrap_tf(tf):
     if tf: return true
     else:  return false
 
-def do_equal(args): return wrap_tf(types._equal_Q(args[0], args[1]))
+# Builtins of one or two arguments are written as functions of those
+# arguments, so that MalFunc.apply1 and apply2 can call them without making
+# a list. ns gets them wrapped to take the argument list, as MalFunc.apply
+# does, and ns1 and ns2 list them unwrapped.
+def args1(f):
+    def apply_list(args): return f(args[0])
+    return apply_list
+
+def args2(f):
+    def apply_list(args): return f(args[0], args[1])
+    return apply_list
+
+def do_equal(a, b): return wrap_tf(types._equal_Q(a, b))
 
 # Errors/Exceptions
 def throw(args):
     raise types.MalException(args[0])
 
 # Scalar functions
-def nil_Q(args): return wrap_tf(types._nil_Q(args[0]))
+def nil_Q(a): return wrap_tf(types._nil_Q(a))
 def true_Q(args): return wrap_tf(types._true_Q(args[0]))
 def false_Q(args): return wrap_tf(types._false_Q(args[0]))
 def string_Q(args): return wrap_tf(types._string_Q(args[0]))
@@ -46,23 +58,23 @@ def macro_Q(args): return wrap_tf(types._function_Q(args[0]) and args[0].ismacro
 # String functions
 def pr_str(args):
     parts = []
-    for exp in args.values: parts.append(printer._pr_str(exp, True))
+    for exp in args.items(): parts.append(printer._pr_str(exp, True))
     return MalStr(u" ".join(parts))
 
 def do_str(args):
     parts = []
-    for exp in args.values: parts.append(printer._pr_str(exp, False))
+    for exp in args.items(): parts.append(printer._pr_str(exp, False))
     return MalStr(u"".join(parts))
 
 def prn(args):
     parts = []
-    for exp in args.values: parts.append(printer._pr_str(exp, True))
+    for exp in args.items(): parts.append(printer._pr_str(exp, True))
     print(u" ".join(parts))
     return nil
 
 def println(args):
     parts = []
-    for exp in args.values: parts.append(printer._pr_str(exp, False))
+    for exp in args.items(): parts.append(printer._pr_str(exp, False))
     print(u" ".join(parts))
     return nil
 
@@ -88,49 +100,41 @@ def slurp(args):
     return MalStr(unicode(open(str(a0.value)).read()))
 
 # Number functions
-def lt(args):
-    a, b = args[0], args[1]
+def lt(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("< called on non-integer")
     return wrap_tf(a.value < b.value)
-def lte(args):
-    a, b = args[0], args[1]
+def lte(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("<= called on non-integer")
     return wrap_tf(a.value <= b.value)
-def gt(args):
-    a, b = args[0], args[1]
+def gt(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("> called on non-integer")
     return wrap_tf(a.value > b.value)
-def gte(args):
-    a, b = args[0], args[1]
+def gte(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str(">= called on non-integer")
     return wrap_tf(a.value >= b.value)
 
-def plus(args):
-    a, b = args[0], args[1]
+def plus(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("+ called on non-integer")
-    return MalInt(a.value+b.value)
-def minus(args):
-    a, b = args[0], args[1]
+    return types._int(a.value+b.value)
+def minus(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("- called on non-integer")
-    return MalInt(a.value-b.value)
-def multiply(args):
-    a, b = args[0], args[1]
+    return types._int(a.value-b.value)
+def multiply(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("* called on non-integer")
-    return MalInt(a.value*b.value)
-def divide(args):
-    a, b = args[0], args[1]
+    return types._int(a.value*b.value)
+def divide(a, b):
     if not isinstance(a, MalInt) or not isinstance(b, MalInt):
         throw_str("/ called on non-integer")
     if b.value == 0:
         throw_str("divide by zero")
-    return MalInt(int(a.value/b.value))
+    return types._int(int(a.value/b.value))
 
 def time_ms(args):
     return MalInt(int(time.time() * 1000))
@@ -138,7 +142,7 @@ def time_ms(args):
 
 # Hash map functions
 def do_hash_map(ml):
-    return types._hash_mapl(ml.values)
+    return types._hash_mapl(ml.items())
 
 def hash_map_Q(args):
     return wrap_tf(types._hash_map_Q(args[0]))
@@ -147,51 +151,36 @@ def assoc(args):
     src_hm, key_vals = args[0], args.rest()
     new_dct = src_hm.dct.copy()
     for i in range(0,len(key_vals),2):
-        k = key_vals[i]
-        if not isinstance(k, MalStr):
-            throw_str("assoc called with non-string/non-keyword key")
-        new_dct[k.value] = key_vals[i+1]
+        new_dct[key_vals[i]] = key_vals[i+1]
     return MalHashMap(new_dct)
 
 def dissoc(args):
     src_hm, keys = args[0], args.rest()
     new_dct = src_hm.dct.copy()
-    for k in keys.values:
-        if not isinstance(k, MalStr):
-            throw_str("dissoc called with non-string/non-keyword key")
-        if k.value in new_dct:
-            del new_dct[k.value]
+    for k in keys.items():
+        if k in new_dct:
+            del new_dct[k]
     return MalHashMap(new_dct)
 
-def get(args):
-    obj, key = args[0], args[1]
+def get(obj, key):
     if obj is nil:
         return nil
     elif isinstance(obj, MalHashMap):
-        if not isinstance(key, MalStr):
-            throw_str("get called on hash-map with non-string/non-keyword key")
-        if obj and key.value in obj.dct:
-            return obj.dct[key.value]
-        else:
-            return nil
+        return obj.dct.get(key, nil)
     elif isinstance(obj, MalList):
         if not isinstance(key, MalInt):
             throw_str("get called on list/vector with non-string/non-keyword key")
-        return obj.values[key.value]
+        return obj[key.value]
     else:
         throw_str("get called on invalid type")
 
 def contains_Q(args):
     hm, key = args[0], args[1]
-    if not isinstance(key, MalStr):
-        throw_str("contains? called on hash-map with non-string/non-keyword key")
-    return wrap_tf(key.value in hm.dct)
+    return wrap_tf(key in hm.dct)
 
 def keys(args):
     hm = args[0]
-    keys = []
-    for k in hm.dct.keys(): keys.append(MalStr(k))
-    return MalList(keys)
+    return MalList(hm.dct.keys())
 
 def vals(args):
     hm = args[0]
@@ -206,13 +195,12 @@ def list_Q(args):
     return wrap_tf(types._list_Q(args[0]))
 
 def do_vector(ml):
-    return MalVector(ml.values)
+    return MalVector(ml.items())
 
 def vector_Q(args):
     return wrap_tf(types._vector_Q(args[0]))
 
-def empty_Q(args):
-    seq = args[0]
+def empty_Q(seq):
     if isinstance(seq, MalList):
         return wrap_tf(len(seq) == 0)
     elif seq is nil:
@@ -220,12 +208,11 @@ def empty_Q(args):
     else:
         throw_str("empty? called on non-sequence")
 
-def count(args):
-    seq = args[0]
+def count(seq):
     if isinstance(seq, MalList):
-        return MalInt(len(seq))
+        return types._int(len(seq))
     elif seq is nil:
-        return MalInt(0)
+        return types._int(0)
     else:
         throw_str("count called on non-sequence")
 
@@ -235,26 +222,24 @@ def sequential_Q(args):
 def vec(args):
     seq = args[0]
     if isinstance(seq, MalList):
-        return MalVector(seq.values)
+        return MalVector(seq.items())
     else:
         throw_str("vec called on non-sequence")
 
-def cons(args):
-    x, seq = args[0], args[1]
+def cons(x, seq):
     if not isinstance(seq, MalList):
         throw_str("cons called with non-list/non-vector")
-    return MalList([x] + seq.values)
+    return MalList([x] + seq.items())
 
 def concat(args):
     new_lst = []
-    for l in args.values:
+    for l in args.items():
         if not isinstance(l, MalList):
             throw_str("concat called with non-list/non-vector")
-        new_lst = new_lst + l.values
+        new_lst = new_lst + l.items()
     return MalList(new_lst)
 
-def nth(args):
-    lst, idx = args[0], args[1]
+def nth(lst, idx):
     if not isinstance(lst, MalList):
         throw_str("nth called with non-list/non-vector")
     if not isinstance(idx, MalInt):
@@ -262,8 +247,7 @@ def nth(args):
     if idx.value < len(lst): return lst[idx.value]
     else: throw_str("nth: index out of range")
 
-def first(args):
-    a0 = args[0]
+def first(a0):
     if a0 is nil:
         return nil
     elif not isinstance(a0, MalList):
@@ -271,8 +255,7 @@ def first(args):
     if len(a0) == 0: return nil
     else:            return a0[0]
 
-def rest(args):
-    a0 = args[0]
+def rest(a0):
     if a0 is nil:
         return MalList([])
     elif not isinstance(a0, MalList):
@@ -282,10 +265,10 @@ def rest(args):
 
 def apply(args):
     f, fargs = args[0], args.rest()
-    last_arg = fargs.values[-1]
+    last_arg = fargs[-1]
     if not isinstance(last_arg, MalList):
         throw_str("map called with non-list")
-    all_args = fargs.values[0:-1] + last_arg.values
+    all_args = fargs.items()[0:-1] + last_arg.items()
     return f.apply(MalList(all_args))
 
 def mapf(args):
@@ -293,8 +276,8 @@ def mapf(args):
     if not isinstance(lst, MalList):
         throw_str("map called with non-list")
     res = []
-    for a in lst.values:
-        res.append(f.apply(MalList([a])))
+    for a in lst.items():
+        res.append(f.apply1(a))
     return MalList(res)
 
 # retains metadata
@@ -302,11 +285,11 @@ def conj(args):
     lst, args = args[0], args.rest()
     new_lst = None
     if types._list_Q(lst):
-        vals = args.values[:]
+        vals = args.items()[:]
         vals.reverse()
-        new_lst = MalList(vals + lst.values)
+        new_lst = MalList(vals + lst.items())
     elif types._vector_Q(lst):
-        new_lst = MalVector(lst.values + list(args.values))
+        new_lst = MalVector(lst.items() + list(args.items()))
     else:
         throw_str("conj on non-list/non-vector")
     new_lst.meta = lst.meta
@@ -316,7 +299,7 @@ def seq(args):
     a0 = args[0]
     if isinstance(a0, MalVector):
         if len(a0) == 0: return nil
-        return MalList(a0.values)
+        return MalList(a0.items())
     elif isinstance(a0, MalList):
         if len(a0) == 0: return nil
         return a0
@@ -352,8 +335,7 @@ def do_atom(args):
     return MalAtom(args[0])
 def atom_Q(args):
     return wrap_tf(types._atom_Q(args[0]))
-def deref(args):
-    atm = args[0]
+def deref(atm):
     if not isinstance(atm, MalAtom):
         throw_str("deref called on non-atom")
     return atm.value
@@ -364,20 +346,58 @@ def reset_BANG(args):
     atm.value = val
     return atm.value
 def swap_BANG(args):
-    atm, f, fargs = args[0], args[1], args.slice(2)
+    atm, f = args[0], args[1]
     if not isinstance(atm, MalAtom):
         throw_str("swap! called on non-atom")
     if not isinstance(f, MalFunc):
         throw_str("swap! called with non-function")
-    all_args = [atm.value] + fargs.values
-    atm.value = f.apply(MalList(all_args))
+    if len(args) == 2:
+        atm.value = f.apply1(atm.value)
+    elif len(args) == 3:
+        atm.value = f.apply2(atm.value, args[2])
+    else:
+        atm.value = f.apply(MalList([atm.value] + args.items()[2:]))
     return atm.value
 
 
+# Memoization functions
+# (memoize f & {:max-size n :ttl-ms n})
+def memoize(args):
+    f, opts = args[0], args.rest()
+    if not isinstance(f, MalFunc):
+        throw_str("memoize called with non-function")
+    if len(opts) % 2 != 0:
+        throw_str("memoize called with odd number of options")
+    max_size, ttl_ms = 0, 0
+    for i in range(0, len(opts), 2):
+        k, v = opts[i], opts[i+1]
+        if not isinstance(v, MalInt) or v.value <= 0:
+            throw_str("memoize option value must be a positive integer")
+        if not isinstance(k, MalStr):
+            throw_str("memoize option must be a keyword")
+        if k.value == u"\u029emax-size":
+            max_size = v.value
+        elif k.value == u"\u029ettl-ms":
+            ttl_ms = v.value
+        else:
+            throw_str("unknown memoize option")
+    return MalMemoized(f, MemoCache(max_size, ttl_ms))
+
+def memoize_stats(args):
+    f = args[0]
+    if not isinstance(f, MalMemoized):
+        throw_str("memoize-stats called on non-memoized function")
+    cache = f.cache
+    return types._hash_mapl([types._keywordu(u"hits"), MalInt(cache.hits),
+                             types._keywordu(u"misses"), MalInt(cache.misses),
+                             types._keywordu(u"evictions"), MalInt(cache.evictions),
+                             types._keywordu(u"size"), MalInt(len(cache.entries))])
+
+
 ns = {
-        '=': do_equal,
+        '=': args2(do_equal),
         'throw': throw,
-        'nil?': nil_Q,
+        'nil?': args1(nil_Q),
         'true?': true_Q,
         'false?': false_Q,
         'string?': string_Q,
@@ -396,14 +416,14 @@ ns = {
         'readline': do_readline,
         'read-string': read_str,
         'slurp': slurp,
-        '<':  lt,
-        '<=': lte,
-        '>':  gt,
-        '>=': gte,
-        '+':  plus,
-        '-':  minus,
-        '*':  multiply,
-        '/':  divide,
+        '<':  args2(lt),
+        '<=': args2(lte),
+        '>':  args2(gt),
+        '>=': args2(gte),
+        '+':  args2(plus),
+        '-':  args2(minus),
+        '*':  args2(multiply),
+        '/':  args2(divide),
         'time-ms': time_ms,
 
         'list': do_list,
@@ -414,20 +434,20 @@ ns = {
         'map?': hash_map_Q,
         'assoc': assoc,
         'dissoc': dissoc,
-        'get': get,
+        'get': args2(get),
         'contains?': contains_Q,
         'keys': keys,
         'vals': vals,
 
         'sequential?': sequential_Q,
         'vec': vec,
-        'cons': cons,
+        'cons': args2(cons),
         'concat': concat,
-        'nth': nth,
-        'first': first,
-        'rest': rest,
-        'empty?': empty_Q,
-        'count': count,
+        'nth': args2(nth),
+        'first': args1(first),
+        'rest': args1(rest),
+        'empty?': args1(empty_Q),
+        'count': args1(count),
         'apply': apply,
         'map': mapf,
 
@@ -438,8 +458,34 @@ ns = {
         'meta': meta,
         'atom': do_atom,
         'atom?': atom_Q,
-        'deref': deref,
+        'deref': args1(deref),
         'reset!': reset_BANG,
-        'swap!': swap_BANG
+        'swap!': swap_BANG,
+
+        'memoize': memoize,
+        'memoize-stats': memoize_stats,
+    }
+
+ns1 = {
+        'nil?': nil_Q,
+        'empty?': empty_Q,
+        'count': count,
+        'first': first,
+        'rest': rest,
+        'deref': deref,
     }
 
+ns2 = {
+        '=': do_equal,
+        '<':  lt,
+        '<=': lte,
+        '>':  gt,
+        '>=': gte,
+        '+':  plus,
+        '-':  minus,
+        '*':  multiply,
+        '/':  divide,
+        'get': get,
+        'cons': cons,
+        'nth': nth,
+    }
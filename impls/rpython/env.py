@@ -1,40 +1,151 @@
-from mal_types import MalType, MalSym, MalList, throw_str
+from mal_types import (MalType, MalSym, MalList, throw_str, promote, elidable,
+                       unroll_safe)
+
+# Environment shapes. A shape maps the names an environment binds to the
+# indices of their values, and environments that bind the same names in the
+# same order share one: every call of a function gets the shape of its
+# parameters. The JIT can then resolve a name to an index once per shape.
+class EnvShape(object):
+    def __init__(self, indices):
+        self.indices = indices
+        self.transitions = {}
+
+    @elidable
+    def lookup(self, name):
+        return self.indices.get(name, -1)
+
+    # the shape with one more name, made once and then reused
+    @elidable
+    def add(self, name):
+        shape = self.transitions.get(name, None)
+        if shape is None:
+            indices = self.indices.copy()
+            indices[name] = len(indices)
+            shape = EnvShape(indices)
+            self.transitions[name] = shape
+        return shape
+
+empty_shape = EnvShape({})
+
+# How a fn* binds its arguments: the shape of its frames, the number of
+# fixed parameters and whether the last parameter takes the rest
+class Params(object):
+    _immutable_fields_ = ['shape', 'count', 'variadic']
+    def __init__(self, binds):
+        assert isinstance(binds, MalList)
+        shape = empty_shape
+        count = 0
+        variadic = False
+        for i in range(len(binds)):
+            bind = binds[i]
+            if not isinstance(bind, MalSym):
+                throw_str("env bind value is not a symbol")
+            if bind.value == u"&":
+                bind = binds[i+1]
+                if not isinstance(bind, MalSym):
+                    throw_str("env bind value is not a symbol")
+                shape = shape.add(bind.value)
+                variadic = True
+                break
+            shape = shape.add(bind.value)
+            count += 1
+        self.shape = shape
+        self.count = count
+        self.variadic = variadic
+
+# Changes whenever the global environment binds a name, so that a trace can
+# read a global once and depend on it not changing
+class Version(object):
+    pass
 
 # Environment
 class Env():
+    _immutable_fields_ = ['outer', 'data', 'version?']
     def __init__(self, outer=None, binds=None, exprs=None):
-        self.data = {}
         self.outer = outer or None
+        self.shape = empty_shape
+        self.values = []
+        # the global environment binds too many names to give each set of
+        # them a shape, so it keeps a dict instead
+        if self.outer is None:
+            self.data = {}
+            self.version = Version()
+        else:
+            self.data = None
+            self.version = None
 
         if binds:
-            assert isinstance(binds, MalList) and isinstance(exprs, MalList)
-            for i in range(len(binds)):
-                bind = binds[i]
-                if not isinstance(bind, MalSym):
-                    throw_str("env bind value is not a symbol")
-                if bind.value == u"&":
-                    bind = binds[i+1]
-                    if not isinstance(bind, MalSym):
-                        throw_str("env bind value is not a symbol")
-                    self.data[bind.value] = exprs.slice(i)
-                    break
-                else:
-                    self.data[bind.value] = exprs[i]
+            assert isinstance(binds, MalList) and exprs is not None
+            self.bind(Params(binds), exprs)
 
+    # exprs is a list of the values, not a MalList, so a call need not make
+    # one
+    def bind(self, params, exprs):
+        count = params.count
+        if len(exprs) < count:
+            throw_str("too few arguments")
+        values = exprs[:count]
+        if params.variadic:
+            values.append(MalList(exprs[count:]))
+        self.shape = params.shape
+        self.values = values
+
+    # the environments looked through are as many as the scopes around the
+    # code, so the JIT can unroll the walk
+    @unroll_safe
     def find(self, key):
         assert isinstance(key, MalSym)
-        if key.value in self.data: return self
-        elif self.outer:           return self.outer.find(key)
-        else:                      return None
+        # the symbols looked up come from the code, so the JIT can treat
+        # their names as constants
+        key = promote(key)
+        env = self
+        while env.data is None:
+            if promote(env.shape).lookup(key.value) >= 0:
+                return env
+            env = env.outer
+            assert env is not None
+        if env.global_lookup(key.value) is None: return None
+        return env
 
     def set(self, key, value):
         assert isinstance(key, MalSym)
         assert isinstance(value, MalType)
-        self.data[key.value] = value
+        if self.data is not None:
+            self.data[key.value] = value
+            self.version = Version()
+            return value
+        shape = promote(self.shape)
+        i = shape.lookup(key.value)
+        if i >= 0:
+            self.values[i] = value
+        else:
+            self.shape = shape.add(key.value)
+            self.values.append(value)
         return value
 
     def get(self, key):
         assert isinstance(key, MalSym)
-        env = self.find(key)
-        if not env: throw_str("'" + str(key.value) + "' not found")
-        return env.data[key.value]
+        key = promote(key)
+        value = self.lookup(key.value)
+        if value is None: throw_str("'" + str(key.value) + "' not found")
+        return value
+
+    @unroll_safe
+    def lookup(self, name):
+        env = self
+        while env.data is None:
+            i = promote(env.shape).lookup(name)
+            if i >= 0: return env.values[i]
+            env = env.outer
+            assert env is not None
+        return env.global_lookup(name)
+
+    # there is one global environment, and a trace that reads a global is
+    # thrown away when the global environment changes
+    def global_lookup(self, name):
+        env = promote(self)
+        return env._global_lookup(env.version, name)
+
+    @elidable
+    def _global_lookup(self, version, name):
+        return self.data.get(name, None)
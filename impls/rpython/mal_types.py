@@ -1,21 +1,66 @@
-import sys, copy, types as pytypes
+import sys, copy, time, types as pytypes
 IS_RPYTHON = sys.argv[0].endswith('rpython')
 
 if IS_RPYTHON:
-    from rpython.rlib.listsort import TimSort
+    from rpython.rlib.objectmodel import r_dict, compute_hash, compute_identity_hash
+    from rpython.rlib.rarithmetic import intmask
+    from rpython.rlib.jit import JitDriver, elidable, promote, unroll_safe
 else:
     import re
 
-# General functions
+    # Untranslated versions of the rlib helpers above. r_dict compares and
+    # hashes its keys with the given functions.
+    class _RKey(object):
+        def __init__(self, key, eq, hash):
+            self.key, self.eq, self.hash = key, eq, hash
+        def __eq__(self, other): return self.eq(self.key, other.key)
+        def __ne__(self, other): return not self.eq(self.key, other.key)
+        def __hash__(self): return self.hash(self.key)
+    class r_dict(object):
+        def __init__(self, eq, hash):
+            self.eq, self.hash, self.d = eq, hash, {}
+        def _key(self, key): return _RKey(key, self.eq, self.hash)
+        def __len__(self): return len(self.d)
+        def __contains__(self, key): return self._key(key) in self.d
+        def __getitem__(self, key): return self.d[self._key(key)]
+        def __setitem__(self, key, value): self.d[self._key(key)] = value
+        def __delitem__(self, key): del self.d[self._key(key)]
+        def get(self, key, default=None): return self.d.get(self._key(key), default)
+        def keys(self): return [k.key for k in self.d]
+        def values(self): return list(self.d.values())
+        def items(self): return [(k.key, v) for k, v in self.d.items()]
+        def copy(self):
+            new = r_dict(self.eq, self.hash)
+            new.d = self.d.copy()
+            return new
+    def compute_hash(x): return hash(x)
+    def compute_identity_hash(x): return id(x)
+    def intmask(n):
+        n &= 2 * sys.maxint + 1
+        if n > sys.maxint: n -= 2 * (sys.maxint + 1)
+        return int(n)
+
+    # JIT hints do nothing when running untranslated
+    class JitDriver(object):
+        def __init__(self, **kwargs): pass
+        def jit_merge_point(self, **kwargs): pass
+        def can_enter_jit(self, **kwargs): pass
+    def elidable(f): return f
+    def promote(x): return x
+    def unroll_safe(f): return f
 
-class StringSort(TimSort):
-    def lt(self, a, b):
-        assert isinstance(a, unicode)
-        assert isinstance(b, unicode)
-        return a < b
+from profiler import PROFILER
 
+# General functions
+
+# Values are compared and hashed by structure: lists and vectors with equal
+# elements are equal, as are hash-maps with equal keys and values. Other types
+# (functions, atoms) are only equal to themselves. Any value can be a hash-map
+# key or a memoize argument.
 def _equal_Q(a, b):
     assert isinstance(a, MalType) and isinstance(b, MalType)
+    if a is b:
+        return True
     ota, otb = a.__class__, b.__class__
     if not (ota is otb or (_sequential_Q(a) and _sequential_Q(b))):
         return False
@@ -25,41 +70,62 @@ def _equal_Q(a, b):
         return a.value == b.value
     elif isinstance(a, MalInt) and isinstance(b, MalInt):
         return a.value == b.value
-    elif _list_Q(a) or _vector_Q(a):
+    elif isinstance(a, MalList) and isinstance(b, MalList):
         if len(a) != len(b): return False
+        if a.hash and b.hash and a.hash != b.hash: return False
         for i in range(len(a)):
             if not _equal_Q(a[i], b[i]): return False
         return True
-    elif _hash_map_Q(a):
-        assert isinstance(a, MalHashMap)
-        assert isinstance(b, MalHashMap)
-        akeys = a.dct.keys()
-        bkeys = b.dct.keys()
-        if len(akeys) != len(bkeys): return False
-
-        StringSort(akeys).sort()
-        StringSort(bkeys).sort()
-        for i in range(len(akeys)):
-            ak, bk = akeys[i], bkeys[i]
-            assert isinstance(ak, unicode)
-            assert isinstance(bk, unicode)
-            if ak != bk: return False
-            av, bv = a.dct[ak], b.dct[bk]
-            if not _equal_Q(av, bv): return False
-        return True
-    elif a is b:
+    elif isinstance(a, MalHashMap) and isinstance(b, MalHashMap):
+        if len(a.dct) != len(b.dct): return False
+        if a.hash and b.hash and a.hash != b.hash: return False
+        for k, v in a.dct.items():
+            bv = b.dct.get(k, None)
+            if bv is None or not _equal_Q(v, bv): return False
         return True
     else:
-        throw_str("no = op defined for %s" % a.__class__.__name__)
+        return False
+
+def _hash(a):
+    if isinstance(a, MalInt):
+        return a.value
+    elif isinstance(a, MalStr):
+        return compute_hash(a.value)
+    elif isinstance(a, MalSym):
+        return compute_hash(a.value)
+    elif isinstance(a, MalList):
+        # cached: 0 means not computed yet
+        if a.hash == 0:
+            h = 0x345678
+            for x in a.items():
+                h = intmask((h ^ _hash(x)) * 1000003)
+            a.hash = h
+        return a.hash
+    elif isinstance(a, MalHashMap):
+        if a.hash == 0:
+            h = 0
+            for k, v in a.dct.items():  # in any order
+                h ^= intmask(_hash(k) * 31 + _hash(v))
+            a.hash = h
+        return a.hash
+    else:
+        return compute_identity_hash(a)
+
+def _new_dct():
+    return r_dict(_equal_Q, _hash)
 
 def _sequential_Q(seq): return _list_Q(seq) or _vector_Q(seq)
 
 def _clone(obj):
-    if isinstance(obj, MalFunc):
-        return MalFunc(obj.fn, obj.ast, obj.env, obj.params,
-                 obj.EvalFunc, obj.ismacro)
+    if isinstance(obj, MalMemoized):
+        return MalMemoized(obj.f, obj.cache)
+    elif isinstance(obj, MalFunc):
+        new = MalFunc(obj.fn, obj.ast, obj.env, obj.params,
+                      obj.EvalFunc, obj.ismacro, obj.fn1, obj.fn2)
+        new.name = obj.name
+        return new
     elif isinstance(obj, MalList):
-        return obj.__class__(obj.values)
+        return obj.__class__(obj.values, obj.start)
     elif isinstance(obj, MalHashMap):
         return MalHashMap(obj.dct)
     elif isinstance(obj, MalAtom):
@@ -117,6 +183,7 @@ def _false_Q(exp):
 
 # Numbers
 class MalInt(MalType):
+    _immutable_fields_ = ['value']
     def __init__(self, value):
         assert isinstance(value, int)
         self.value = value
@@ -124,6 +191,16 @@ def _int_Q(exp):
     assert isinstance(exp, MalType)
     return exp.__class__ is MalInt
 
+# Small ints are made once and shared, so loops that count do not make a
+# new MalInt for each step
+SMALL_INT_MIN = -128
+SMALL_INT_MAX = 1023
+_small_ints = [MalInt(i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+def _int(value):
+    if SMALL_INT_MIN <= value and value <= SMALL_INT_MAX:
+        return _small_ints[value - SMALL_INT_MIN]
+    return MalInt(value)
+
 # String
 class MalStr(MalType):
     def __init__(self, value):
@@ -157,6 +234,7 @@ def _keyword_Q(exp):
 
 # Symbols
 class MalSym(MalMeta):
+    _immutable_fields_ = ['value']
     def __init__(self, value):
         assert isinstance(value, unicode)
         self.value = value
@@ -169,25 +247,45 @@ def _symbol_Q(exp):
     return exp.__class__ is MalSym
 
 # lists
+# The elements of a list are values[start:], so rest and slice can return
+# a view that shares values instead of copying them. Use items() or
+# indexing rather than reading values directly.
 class MalList(MalMeta):
-    def __init__(self, vals):
+    # a macro call keeps its expansion and the macro that made it, which
+    # change only when the macro is redefined
+    _immutable_fields_ = ['values', 'start', 'expanded_by?', 'expansion?']
+    def __init__(self, vals, start=0):
         assert isinstance(vals, list)
+        assert start >= 0
         self.values = vals
+        self.start = start
         self.meta = nil
+        self.hash = 0
+        self.expanded_by = None
+        self.expansion = None
+    # only for lists being built, which are not shared with views yet
     def append(self, val):
         self.values.append(val)
+        self.hash = 0
+    def items(self):
+        if self.start == 0:
+            return self.values
+        return self.values[self.start:]
     def rest(self):
-        return MalList(self.values[1:])
+        return self.slice(1)
     def __len__(self):
-        return len(self.values)
+        return len(self.values) - self.start
     def __getitem__(self, i):
         assert isinstance(i, int)
-        return self.values[i]
+        if i < 0:
+            i += len(self)
+        return self.values[self.start + i]
     def slice(self, start):
-        return MalList(self.values[start:len(self.values)])
+        start = min(self.start + start, len(self.values))
+        return MalList(self.values, start)
     def slice2(self, start, end):
         assert end >= 0
-        return MalList(self.values[start:end])
+        return MalList(self.values[self.start + start:self.start + end])
 def _list(*vals): return MalList(list(vals))
 def _listl(lst): return MalList(lst)
 def _list_Q(exp):
@@ -208,27 +306,20 @@ class MalHashMap(MalMeta):
     def __init__(self, dct):
         self.dct = dct
         self.meta = nil
-    def append(self, val):
-        self.dct.append(val)
+        self.hash = 0
     def __getitem__(self, k):
-        assert isinstance(k, unicode)
-        if not isinstance(k, unicode):
-            throw_str("hash-map lookup by non-string/non-keyword")
+        assert isinstance(k, MalType)
         return self.dct[k]
     def __setitem__(self, k, v):
-        if not isinstance(k, unicode):
-            throw_str("hash-map key must be string or keyword")
+        assert isinstance(k, MalType)
         assert isinstance(v, MalType)
         self.dct[k] = v
+        self.hash = 0
         return v
 def _hash_mapl(kvs):
-    dct = {}
+    dct = _new_dct()
     for i in range(0, len(kvs), 2):
-        k = kvs[i]
-        if not isinstance(k, MalStr):
-            throw_str("hash-map key must be string or keyword")
-        v = kvs[i+1]
-        dct[k.value] = v
+        dct[kvs[i]] = kvs[i+1]
     return MalHashMap(dct)
 def _hash_map_Q(exp):
     assert isinstance(exp, MalType)
@@ -237,29 +328,132 @@ def _hash_map_Q(exp):
 # Functions
 # env import must happen after MalSym and MalList definitions to allow
 # circular dependency
-from env import Env
+from env import Env, Params
 class MalFunc(MalMeta):
+    # ismacro is set by defmacro!, the rest is fixed once created
+    _immutable_fields_ = ['fn', 'ast', 'env', 'params', 'EvalFunc',
+                          'fn1', 'fn2', 'bound']
     def __init__(self, fn, ast=None, env=None, params=None,
-                 EvalFunc=None, ismacro=False):
+                 EvalFunc=None, ismacro=False, fn1=None, fn2=None):
         if fn is None and EvalFunc is None:
             throw_str("MalFunc requires either fn or EvalFunc")
         self.fn = fn
+        # builtins of one or two arguments can also be called with the
+        # arguments themselves, see core.ns1 and core.ns2
+        self.fn1 = fn1
+        self.fn2 = fn2
         self.ast = ast
         self.env = env
         self.params = params
+        # how calls bind their arguments, worked out once
+        if params is not None:
+            self.bound = Params(params)
+        else:
+            self.bound = None
         self.EvalFunc = EvalFunc
         self.ismacro = ismacro
         self.meta = nil
+        # the name of the first def! of the function, for the profiler
+        self.name = None
     def apply(self, args):
         if self.EvalFunc:
-            return self.EvalFunc(self.ast, self.gen_env(args))
+            if PROFILER.enabled:
+                PROFILER.calling = self
+            return self.EvalFunc(self.ast, self.gen_env(args.items()))
         else:
             return self.fn(args)
+    def apply1(self, a):
+        if self.fn1 is not None:
+            return self.fn1(a)
+        return self.apply(MalList([a]))
+    def apply2(self, a, b):
+        if self.fn2 is not None:
+            return self.fn2(a, b)
+        return self.apply(MalList([a, b]))
     def gen_env(self, args):
-        return Env(self.env, self.params, args)
+        env = Env(self.env)
+        env.bind(self.bound, args)
+        return env
 def _function_Q(exp):
     assert isinstance(exp, MalType)
-    return exp.__class__ is MalFunc
+    return exp.__class__ is MalFunc or exp.__class__ is MalMemoized
+
+# Memoized functions
+class MemoEntry(object):
+    def __init__(self, key, value, expires):
+        self.key = key
+        self.value = value
+        self.expires = expires
+        self.prev = None
+        self.next = None
+
+# The memo cache is keyed by argument lists and holds MemoEntrys, so its
+# dict needs key functions of its own: RPython types each r_dict by them
+def _memo_eq(a, b): return _equal_Q(a, b)
+def _memo_hash(a): return _hash(a)
+
+class MemoCache(object):
+    """Results by arguments, in a list from least to most recently used.
+    A max_size or ttl_ms of 0 means no limit."""
+    def __init__(self, max_size, ttl_ms):
+        self.entries = r_dict(_memo_eq, _memo_hash)
+        self.oldest = MemoEntry(None, None, 0) # sentinel; oldest.next is oldest
+        self.oldest.prev = self.oldest.next = self.oldest
+        self.max_size = max_size
+        self.ttl_ms = ttl_ms
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    def _unlink(self, entry):
+        entry.prev.next = entry.next
+        entry.next.prev = entry.prev
+    def _push(self, entry):
+        entry.prev = self.oldest.prev
+        entry.next = self.oldest
+        self.oldest.prev.next = entry
+        self.oldest.prev = entry
+    def _evict(self, entry):
+        self._unlink(entry)
+        del self.entries[entry.key]
+        self.evictions += 1
+    def lookup(self, args, now):
+        entry = self.entries.get(args, None)
+        if entry is None:
+            return None
+        if self.ttl_ms > 0 and entry.expires <= now:
+            self._evict(entry)
+            return None
+        self._unlink(entry)
+        self._push(entry)
+        return entry.value
+    def store(self, args, value, now):
+        entry = MemoEntry(args, value, now + self.ttl_ms)
+        self.entries[args] = entry
+        self._push(entry)
+        if self.max_size > 0 and len(self.entries) > self.max_size:
+            self._evict(self.oldest.next)
+        # entries all live as long, so the expired ones are at the old end;
+        # one used again since it was stored goes once it gets there
+        if self.ttl_ms > 0:
+            while (self.oldest.next is not self.oldest and
+                   self.oldest.next.expires <= now):
+                self._evict(self.oldest.next)
+
+class MalMemoized(MalFunc):
+    def __init__(self, f, cache):
+        MalFunc.__init__(self, f.fn, EvalFunc=f.EvalFunc)
+        self.f = f
+        self.cache = cache
+    def apply(self, args):
+        now = int(time.time() * 1000)
+        value = self.cache.lookup(args, now)
+        if value is not None:
+            self.cache.hits += 1
+            return value
+        self.cache.misses += 1
+        value = self.f.apply(args)
+        self.cache.store(args, value, now)
+        return value
 
 
 # atoms
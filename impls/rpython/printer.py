@@ -25,18 +25,18 @@ def _pr_str(obj, print_readably=True):
     _r = print_readably
     if types._list_Q(obj):
         res = []
-        for e in obj.values:
+        for e in obj.items():
             res.append(_pr_str(e,_r))
         return u"(" + u" ".join(res) + u")"
     elif types._vector_Q(obj):
         res = []
-        for e in obj.values:
+        for e in obj.items():
             res.append(_pr_str(e,_r))
         return u"[" + u" ".join(res) + u"]"
     elif types._hash_map_Q(obj):
         ret = []
         for k in obj.dct.keys():
-            ret.append(_pr_a_str(k,_r))
+            ret.append(_pr_str(k,_r))
             ret.append(_pr_str(obj.dct[k],_r))
         return u"{" + u" ".join(ret) + u"}"
     elif isinstance(obj, MalStr):
@@ -0,0 +1,125 @@
+"""Sampling profiler for mal programs, reporting like python.2's.
+
+A translated program cannot take a signal in the middle of EVAL, so the
+profiler samples by count instead: EVAL ticks it once per form and every
+SAMPLE_EVERY ticks it records the mal call stack, weighted by the CPU time
+since the sample before. Each running EVAL has a slot on the stack holding
+the function whose body it runs, if any; a tail call replaces the function
+in its slot, so it shows up in place of its caller. The reader keeps no
+source positions, so frames are labelled by function name only.
+
+When the profiler is off, EVAL only reads `enabled`, which the JIT treats as
+a constant."""
+
+import os, time
+
+SAMPLE_EVERY = 1000
+
+class Profiler(object):
+    _immutable_fields_ = ['enabled?']
+    def __init__(self):
+        self.enabled = False
+        self.stack = []
+        # the function a builtin is about to run through MalFunc.apply,
+        # taken by the EVAL that runs its body
+        self.calling = None
+        self.countdown = SAMPLE_EVERY
+        self.last = 0.0
+        self.samples = {}
+        self.self_times = {}
+        self.total_times = {}
+        self.total = 0.0
+
+    def start(self):
+        self.enabled = True
+        self.last = time.clock()
+
+    def push(self):
+        self.stack.append(self.calling)
+        self.calling = None
+        self.tick()
+
+    def pop(self):
+        self.stack.pop()
+
+    def enter(self, f):
+        self.stack[-1] = f
+        self.tick()
+
+    def tick(self):
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.countdown = SAMPLE_EVERY
+            self.sample()
+
+    def sample(self):
+        now = time.clock()
+        seconds = now - self.last
+        self.last = now
+        names = []
+        for f in self.stack:
+            if f is not None:
+                names.append(function_name(f))
+        stack = u";".join([u"mal"] + names)
+        self.samples[stack] = self.samples.get(stack, 0) + 1
+        if len(names) == 0:
+            names.append(u"(top level)")
+        name = names[-1]
+        self.self_times[name] = self.self_times.get(name, 0.0) + seconds
+        seen = {}
+        for name in names:
+            if name not in seen:
+                seen[name] = True
+                self.total_times[name] = self.total_times.get(name, 0.0) + seconds
+        self.total += seconds
+
+    def table(self, top=20):
+        """Return the `top` functions with the most self time, with their
+        self and total time."""
+        total = self.total
+        if total == 0.0:
+            total = 1.0
+        lines = [u"%s %s %s %s  function" % (_pad(u"self ms", 8), _pad(u"self", 6),
+                                              _pad(u"total ms", 8), _pad(u"total", 6))]
+        left = self.self_times.copy()
+        while len(lines) <= top and len(left) > 0:
+            name = u""
+            seconds = -1.0
+            for k, v in left.items():
+                if v > seconds:
+                    name, seconds = k, v
+            del left[name]
+            total_seconds = self.total_times[name]
+            lines.append(u"%s %s %s %s  %s" % (
+                _pad(_tenths(seconds * 1000), 8),
+                _pad(_tenths(100 * seconds / total) + u"%", 6),
+                _pad(_tenths(total_seconds * 1000), 8),
+                _pad(_tenths(100 * total_seconds / total) + u"%", 6),
+                name))
+        return lines
+
+    def report(self, folded_path):
+        """Write the collapsed stacks, which flamegraph.pl and speedscope
+        read, to `folded_path` and the table to stderr."""
+        fd = os.open(folded_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        for stack, count in self.samples.items():
+            os.write(fd, (u"%s %d\n" % (stack, count)).encode('utf-8'))
+        os.close(fd)
+        for line in self.table():
+            os.write(2, (line + u"\n").encode('utf-8'))
+
+def function_name(f):
+    if f.name is None:
+        return u"(fn*)"
+    return f.name
+
+def _tenths(x):
+    n = int(x * 10 + 0.5)
+    return u"%d.%d" % (n // 10, n % 10)
+
+def _pad(s, width):
+    if len(s) >= width:
+        return s
+    return u" " * (width - len(s)) + s
+
+PROFILER = Profiler()
@@ -7,7 +7,7 @@ else:
     import re
 
 import mal_types as types
-from mal_types import (MalSym, MalInt, MalStr, _keywordu,
+from mal_types import (MalSym, MalStr, _keywordu,
                        _list, _listl, _vectorl, _hash_mapl)
 
 class Blank(Exception): pass
@@ -45,7 +45,7 @@ def read_atom(reader):
         float_re = re.compile('-?[0-9][0-9.]*$')
         str_re = re.compile('"(?:[\\\\].|[^\\\\"])*"')
     token = reader.next()
-    if re.match(int_re, token):     return MalInt(int(token))
+    if re.match(int_re, token):     return types._int(int(token))
 ##    elif re.match(float_re, token): return int(token)
     elif re.match(str_re, token):
         end = len(token)-1
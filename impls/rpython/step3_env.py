@@ -18,16 +18,16 @@ def eval_ast(ast, env):
         return env.get(ast)
     elif types._list_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalList(res)
     elif types._vector_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalVector(res)
     elif types._hash_map_Q(ast):
-        new_dct = {}
+        new_dct = types._new_dct()
         for k in ast.dct.keys():
             new_dct[k] = EVAL(ast.dct[k], env)
         return MalHashMap(new_dct)
@@ -57,9 +57,9 @@ def EVAL(ast, env):
             return EVAL(a2, let_env)
         else:
             el = eval_ast(ast, env)
-            f = el.values[0]
+            f = el[0]
             if isinstance(f, MalFunc):
-                return f.apply(el.values[1:])
+                return f.apply(el.items()[1:])
             else:
                 raise Exception("%s is not callable" % f)
 
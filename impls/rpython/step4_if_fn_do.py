@@ -19,16 +19,16 @@ def eval_ast(ast, env):
         return env.get(ast)
     elif types._list_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalList(res)
     elif types._vector_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalVector(res)
     elif types._hash_map_Q(ast):
-        new_dct = {}
+        new_dct = types._new_dct()
         for k in ast.dct.keys():
             new_dct[k] = EVAL(ast.dct[k], env)
         return MalHashMap(new_dct)
@@ -60,7 +60,7 @@ def EVAL(ast, env):
             return EVAL(a2, let_env)
         elif u"do" == a0sym:
             el = eval_ast(ast.rest(), env)
-            return el.values[-1]
+            return el[-1]
         elif u"if" == a0sym:
             a1, a2 = ast[1], ast[2]
             cond = EVAL(a1, env)
@@ -74,7 +74,7 @@ def EVAL(ast, env):
             return MalFunc(None, a2, env, a1, EVAL)
         else:
             el = eval_ast(ast, env)
-            f = el.values[0]
+            f = el[0]
             if isinstance(f, MalFunc):
                 return f.apply(el.rest())
             else:
@@ -32,9 +32,9 @@ def quasiquote(ast):
             fst = ast[0]
             if isinstance(fst, MalSym) and fst.value == u"unquote":
                 return ast[1]
-        return qq_foldr(ast.values)
+        return qq_foldr(ast.items())
     elif types._vector_Q(ast):
-        return _list(_symbol(u"vec"), qq_foldr(ast.values))
+        return _list(_symbol(u"vec"), qq_foldr(ast.items()))
     elif types._symbol_Q(ast) or types._hash_map_Q(ast):
         return _list(_symbol(u"quote"), ast)
     else:
@@ -46,16 +46,16 @@ def eval_ast(ast, env):
         return env.get(ast)
     elif types._list_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalList(res)
     elif types._vector_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalVector(res)
     elif types._hash_map_Q(ast):
-        new_dct = {}
+        new_dct = types._new_dct()
         for k in ast.dct.keys():
             new_dct[k] = EVAL(ast.dct[k], env)
         return MalHashMap(new_dct)
@@ -97,7 +97,8 @@ def EVAL(ast, env):
             if len(ast) == 0:
                 return nil
             elif len(ast) > 1:
-                eval_ast(ast.slice2(1, len(ast)-1), env)
+                for i in range(1, len(ast)-1):
+                    EVAL(ast[i], env)
             ast = ast[-1] # Continue loop (TCO)
         elif u"if" == a0sym:
             a1, a2 = ast[1], ast[2]
@@ -112,11 +113,11 @@ def EVAL(ast, env):
             return MalFunc(None, a2, env, a1, EVAL)
         else:
             el = eval_ast(ast, env)
-            f = el.values[0]
+            f = el[0]
             if isinstance(f, MalFunc):
                 if f.ast:
                     ast = f.ast
-                    env = f.gen_env(el.rest()) # Continue loop (TCO)
+                    env = f.gen_env(el.items()[1:]) # Continue loop (TCO)
                 else:
                     return f.apply(el.rest())
             else:
@@ -1,4 +1,4 @@
-import sys
+import sys, os
 IS_RPYTHON = sys.argv[0].endswith('rpython')
 
 if IS_RPYTHON:
@@ -12,10 +12,12 @@ import mal_readline
 import mal_types as types
 from mal_types import (MalSym, MalInt, MalStr,
                        nil, true, false, _symbol, _keywordu,
-                       MalList, _list, MalVector, MalHashMap, MalFunc)
+                       MalList, _list, MalVector, MalHashMap, MalFunc,
+                       JitDriver, elidable, promote)
 import reader, printer
 from env import Env
 import core
+from profiler import PROFILER
 
 # read
 def READ(str):
@@ -41,9 +43,9 @@ def quasiquote(ast):
             fst = ast[0]
             if isinstance(fst, MalSym) and fst.value == u"unquote":
                 return ast[1]
-        return qq_foldr(ast.values)
+        return qq_foldr(ast.items())
     elif types._vector_Q(ast):
-        return _list(_symbol(u"vec"), qq_foldr(ast.values))
+        return _list(_symbol(u"vec"), qq_foldr(ast.items()))
     elif types._symbol_Q(ast) or types._hash_map_Q(ast):
         return _list(_symbol(u"quote"), ast)
     else:
@@ -53,8 +55,9 @@ def is_macro_call(ast, env):
     if types._list_Q(ast):
         a0 = ast[0]
         if isinstance(a0, MalSym):
-            if not env.find(a0) is None:
-                return env.get(a0).ismacro
+            f = env.lookup(promote(a0).value)
+            if isinstance(f, MalFunc):
+                return f.ismacro
     return False
 
 def macroexpand(ast, env):
@@ -64,49 +67,101 @@ def macroexpand(ast, env):
         ast = macroexpand(mac.apply(ast.rest()), env)
     return ast
 
+# A macro call is expanded once, while its head names the same macro, so
+# the JIT sees the same expansion each time, as a constant of the trace.
+# Expanding it each time made new forms, and the trace's guards on the form
+# then failed and fell back to the interpreter.
+def expand(ast, env):
+    assert isinstance(ast, MalList)
+    mac = env.get(ast[0])
+    assert isinstance(mac, MalFunc)
+    if ast.expanded_by is not mac:
+        ast.expansion = macroexpand(mac.apply(ast.rest()), env)
+        ast.expanded_by = mac
+    return ast.expansion
+
 def eval_ast(ast, env):
     if types._symbol_Q(ast):
         assert isinstance(ast, MalSym)
         return env.get(ast)
     elif types._list_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalList(res)
     elif types._vector_Q(ast):
         res = []
-        for a in ast.values:
+        for a in ast.items():
             res.append(EVAL(a, env))
         return MalVector(res)
     elif types._hash_map_Q(ast):
-        new_dct = {}
+        new_dct = types._new_dct()
         for k in ast.dct.keys():
             new_dct[k] = EVAL(ast.dct[k], env)
         return MalHashMap(new_dct)
     else:
         return ast  # primitive value, return unchanged
 
+# The JIT traces EVAL's loop, one trace per form that a tail call jumps
+# back to (a function body, mostly). Code is not changed once read, so the
+# form is green: what is read from it is constant in the trace. EVAL calls
+# itself, and the regex engine the reader uses has jitdrivers of its own,
+# so this one is marked recursive.
+def get_printable_location(ast):
+    return printer._pr_str(ast).encode('utf-8')
+
+jitdriver = JitDriver(greens=['ast'], reds=['env'], is_recursive=True,
+                      get_printable_location=get_printable_location)
+
+@elidable
+def form_name(ast):
+    a0 = ast[0]
+    if isinstance(a0, MalSym):
+        return a0.value
+    else:
+        return u"__<*fn*>__"
+
+# Only a list can run a function body, so only lists get a slot on the
+# profiler's stack.
 def EVAL(ast, env):
+    if PROFILER.enabled and types._list_Q(ast):
+        PROFILER.push()
+        try:
+            return eval_form(ast, env)
+        finally:
+            PROFILER.pop()
+    return eval_form(ast, env)
+
+def eval_form(ast, env):
     while True:
+        jitdriver.jit_merge_point(ast=ast, env=env)
         #print("EVAL %s" % printer._pr_str(ast))
+        # symbols and values that evaluate to themselves are done here
+        # rather than in eval_ast, whose loops keep the JIT from tracing
+        # into it
+        if isinstance(ast, MalSym):
+            return env.get(ast)
         if not types._list_Q(ast):
-            return eval_ast(ast, env)
+            if isinstance(ast, MalList) or types._hash_map_Q(ast):
+                return eval_ast(ast, env)
+            return ast
         if len(ast) == 0: return ast
 
-        # apply list
-        ast = macroexpand(ast, env)
-        if not types._list_Q(ast):
-            return eval_ast(ast, env)
-        if len(ast) == 0: return ast
-        a0 = ast[0]
-        if isinstance(a0, MalSym):
-            a0sym = a0.value
-        else:
-            a0sym = u"__<*fn*>__"
+        # apply list. Most lists are not macro calls, and leaving those alone
+        # keeps the form a constant of the trace.
+        if is_macro_call(ast, env):
+            ast = expand(ast, env)
+            if not types._list_Q(ast):
+                return eval_ast(ast, env)
+            if len(ast) == 0: return ast
+        a0sym = form_name(ast)
 
         if u"def!" == a0sym:
             a1, a2 = ast[1], ast[2]
             res = EVAL(a2, env)
+            if isinstance(res, MalFunc) and res.name is None:
+                assert isinstance(a1, MalSym)
+                res.name = a1.value
             return env.set(a1, res)
         elif u"let*" == a0sym:
             a1, a2 = ast[1], ast[2]
@@ -138,18 +193,19 @@ def EVAL(ast, env):
                         return EVAL(a1, env);
                     except types.MalException as exc:
                         exc = exc.object
-                        catch_env = Env(env, _list(a2[1]), _list(exc))
+                        catch_env = Env(env, _list(a2[1]), [exc])
                         return EVAL(a2[2], catch_env)
                     except Exception as exc:
                         exc = MalStr(unicode("%s" % exc))
-                        catch_env = Env(env, _list(a2[1]), _list(exc))
+                        catch_env = Env(env, _list(a2[1]), [exc])
                         return EVAL(a2[2], catch_env)
             return EVAL(a1, env);
         elif u"do" == a0sym:
             if len(ast) == 0:
                 return nil
             elif len(ast) > 1:
-                eval_ast(ast.slice2(1, len(ast)-1), env)
+                for i in range(1, len(ast)-1):
+                    EVAL(ast[i], env)
             ast = ast[-1] # Continue loop (TCO)
         elif u"if" == a0sym:
             a1, a2 = ast[1], ast[2]
@@ -163,14 +219,25 @@ def EVAL(ast, env):
             a1, a2 = ast[1], ast[2]
             return MalFunc(None, a2, env, a1, EVAL)
         else:
-            el = eval_ast(ast, env)
-            f = el.values[0]
+            # evaluate the function and its arguments without making lists
+            # for them, and call builtins of one or two arguments directly
+            f = EVAL(ast[0], env)
+            args = [nil] * (len(ast) - 1)
+            for i in range(len(args)):
+                args[i] = EVAL(ast[i + 1], env)
             if isinstance(f, MalFunc):
                 if f.ast:
+                    if PROFILER.enabled:
+                        PROFILER.enter(f)
                     ast = f.ast
-                    env = f.gen_env(el.rest()) # Continue loop (TCO)
+                    env = f.gen_env(args) # Continue loop (TCO)
+                    jitdriver.can_enter_jit(ast=ast, env=env)
+                elif len(args) == 1:
+                    return f.apply1(args[0])
+                elif len(args) == 2:
+                    return f.apply2(args[0], args[1])
                 else:
-                    return f.apply(el.rest())
+                    return f.apply(MalList(args))
             else:
                 raise Exception("%s is not callable" % f)
 
@@ -190,9 +257,17 @@ def entry_point(argv):
 
     # core.py: defined using python
     for k, v in core.ns.items():
-        repl_env.set(_symbol(unicode(k)), MalFunc(v))
+        repl_env.set(_symbol(unicode(k)),
+                     MalFunc(v, fn1=core.ns1.get(k, None),
+                             fn2=core.ns2.get(k, None)))
     repl_env.set(types._symbol(u'eval'),
                  MalEval(None, env=repl_env, EvalFunc=EVAL))
+    # Profile with MAL_PROFILE=1 or --profile
+    setting = os.environ.get('MAL_PROFILE')
+    profile = setting is not None and setting != '0'
+    if len(argv) >= 2 and argv[1] == '--profile':
+        argv = [argv[0]] + argv[2:]
+        profile = True
     mal_args = []
     if len(argv) >= 3:
         for a in argv[2:]: mal_args.append(MalStr(unicode(a)))
@@ -204,8 +279,15 @@ def entry_point(argv):
     REP("(def! load-file (fn* (f) (eval (read-string (str \"(do \" (slurp f) \"\nnil)\")))))", repl_env)
     REP("(defmacro! cond (fn* (& xs) (if (> (count xs) 0) (list 'if (first xs) (if (> (count xs) 1) (nth xs 1) (throw \"odd number of forms to cond\")) (cons 'cond (rest (rest xs)))))))", repl_env)
 
+    if profile:
+        PROFILER.start()
+
     if len(argv) >= 2:
-        REP('(load-file "' + argv[1] + '")', repl_env)
+        try:
+            REP('(load-file "' + argv[1] + '")', repl_env)
+        finally:
+            if profile:
+                report_profile()
         return 0
 
     REP("(println (str \"Mal [\" *host-language* \"]\"))", repl_env)
@@ -226,8 +308,16 @@ def entry_point(argv):
                 llop.debug_print_traceback(lltype.Void)
             else:
                 print("".join(traceback.format_exception(*sys.exc_info())))
+    if profile:
+        report_profile()
     return 0
 
+def report_profile():
+    path = os.environ.get('MAL_PROFILE_OUT')
+    if path is None:
+        path = 'mal-profile.folded'
+    PROFILER.report(path)
+
 # _____ Define and setup target ___
 def target(*args):
     return entry_point